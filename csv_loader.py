@@ -0,0 +1,96 @@
+# ===========================================
+# Mini-GMAO - Lecture des CSV d'import avec cache
+# ===========================================
+import os
+import threading
+
+import pandas as pd
+
+CSV_CACHE_DIR = "data/csv_cache"
+
+# Colonnes de dates (jour/mois/année) par fichier ; le reste est lu en texte.
+# SUIVI_CURATIF.date_sortie reste du texte : elle peut valoir « En Cours ».
+DATE_COLUMNS = {
+    "VIDANGE.csv": ["date_entretien", "prevision"],
+    "SUIVI_CURATIF.csv": ["date_entree"],
+}
+
+_frames = {}
+_lock = threading.Lock()
+
+
+def _stat_key(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _sidecar_path(path, key, cache_dir):
+    name = os.path.basename(path)
+    return os.path.join(cache_dir, f"{name}-{key[1]}-{key[0]}.parquet")
+
+
+def parse_csv(path):
+    """Lecture complète d'un CSV d'import (cp1252, ';', dates au format jj/mm/aaaa)"""
+    df = pd.read_csv(path, encoding='cp1252', sep=';', dtype=str)
+    for col in DATE_COLUMNS.get(os.path.basename(path), []):
+        if col in df:
+            df[col] = pd.to_datetime(df[col], format='%d/%m/%Y',
+                                     errors='coerce').astype('datetime64[s]')
+    return df
+
+
+def _read_sidecar(path, sidecar):
+    try:
+        df = pd.read_parquet(sidecar)
+    except (OSError, ImportError, ValueError):
+        return None
+    # parquet ne conserve pas l'unité seconde des dates
+    for col in DATE_COLUMNS.get(os.path.basename(path), []):
+        if col in df:
+            df[col] = df[col].astype('datetime64[s]')
+    return df
+
+
+def _write_sidecar(path, sidecar, df):
+    """Copie colonnaire du CSV parsé (remplace celles des versions précédentes)"""
+    cache_dir = os.path.dirname(sidecar)
+    prefix = os.path.basename(path) + "-"
+    tmp_path = f"{sidecar}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, sidecar)
+        for entry in os.scandir(cache_dir):
+            if entry.name.startswith(prefix) and entry.path != sidecar:
+                os.remove(entry.path)
+    except (OSError, ImportError):
+        # pyarrow absent ou dossier en lecture seule : pas de copie colonnaire
+        pass
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_csv(path, cache_dir=CSV_CACHE_DIR):
+    """DataFrame d'un CSV d'import, parsé une seule fois par processus.
+
+    Le cache est indexé sur (chemin, mtime, taille) : le fichier n'est relu
+    que s'il a changé. Au démarrage à froid, la copie parquet écrite à côté
+    évite de reparser le texte cp1252.
+    """
+    path = os.path.abspath(path)
+    key = _stat_key(path)
+    with _lock:
+        cached = _frames.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+    sidecar = _sidecar_path(path, key, cache_dir)
+    df = _read_sidecar(path, sidecar)
+    if df is None:
+        df = parse_csv(path)
+        _write_sidecar(path, sidecar, df)
+
+    with _lock:
+        _frames[path] = (key, df)
+    return df
@@ -2,10 +2,16 @@
 # Mini-GMAO - Dashboard Streamlit
 # ===========================================
 import streamlit as st
+import numpy as np
 import pandas as pd
 import requests
 import os
-from maintenance_scheduler import create_complete_maintenance_schedule
+import re
+from datetime import date
+from csv_loader import load_csv
+from search_index import matricule_index, search_curatif
+from maintenance_scheduler import (NEXT_DUE_COLUMNS, SCHEDULE_COLUMNS, MaintenanceScheduler, NextDueIndex,
+                                   ScheduleCache, group_visits, sort_positions, with_assets)
 
 # Backend API runs on localhost:8000 (same container)
 API = "http://localhost:8000"
@@ -17,12 +23,116 @@ st.title("🚜 Mini-GMAO - Tableau de bord")
 st.sidebar.header("Navigation")
 page = st.sidebar.radio("Choisir une page", [
     "🔎 Recherche globale", 
+    "🔧 Recherche pannes / pièces",
     "📊 Données CSV", 
     "📅 Entretiens programmés",
     "🔔 Alertes", 
     "✅ Actions"
 ])
 
+@st.cache_resource
+def get_schedule_cache():
+    """Cache disque du calendrier partagé par toutes les sessions"""
+    return ScheduleCache()
+
+schedule_cache = get_schedule_cache()
+
+@st.cache_resource
+def get_next_due_index():
+    """Index des prochaines échéances, quand l'API ne répond pas"""
+    return NextDueIndex(schedule_cache)
+
+def fetch_schedule(params):
+    """Une page du calendrier depuis GET /schedule (flux Arrow) : (total, page)"""
+    import pyarrow as pa
+    
+    resp = requests.get(f"{API}/schedule", params={**params, "format": "arrow"}, timeout=30)
+    resp.raise_for_status()
+    page = pa.ipc.open_stream(resp.content).read_pandas()
+    page['date'] = pd.to_datetime(page['date'])
+    return int(resp.headers["X-Total-Count"]), page
+
+def fetch_schedule_all(params):
+    """Toute la sélection, page par page (pour l'export)"""
+    params = {**params, "offset": 0, "limit": 200000}
+    pages = []
+    while True:
+        total, page = fetch_schedule(params)
+        pages.append(page)
+        params["offset"] += len(page)
+        if params["offset"] >= total or page.empty:
+            return pd.concat(pages, ignore_index=True)
+
+def fetch_alerts(fenêtre, matricule):
+    """Prochaines échéances du calendrier (± fenêtre) depuis GET /alerts?source=calendar"""
+    params = {"source": "calendar", "window": fenêtre, "limit": 1000}
+    if matricule:
+        params["matricule"] = matricule
+    items = []
+    while True:
+        resp = requests.get(f"{API}/alerts", params=params, timeout=30)
+        resp.raise_for_status()
+        body = resp.json()
+        items += body["items"]
+        if not body["next"]:
+            break
+        params.update(body["next"])
+    
+    df = pd.DataFrame(items, columns=["series", "matricule", "asset_name", "category", "operation",
+                                      "type", "every_days", "due_dt", "status"])
+    df = df.rename(columns={"series": "série", "asset_name": "engin", "category": "catégorie",
+                            "operation": "opération", "every_days": "intervalle_jours",
+                            "due_dt": "date", "status": "statut"})
+    df['date'] = pd.to_datetime(df['date'])
+    df['année'] = df['date'].dt.year
+    df['type_nom'] = df['type'].map(MaintenanceScheduler.TYPE_MAP)
+    df['jours'] = (df['date'] - pd.Timestamp.today().normalize()).dt.days
+    return df[NEXT_DUE_COLUMNS]
+
+def sorted_page(df, sort_by, descending, offset, limit):
+    """Une page de `df` triée : (total, page)"""
+    positions = sort_positions(df, sort_by, descending)[offset:offset + limit]
+    return len(df), df.iloc[positions]
+
+def paged_table(rows, key, sort_columns, styler=None, page_sizes=(50, 100, 250, 500)):
+    """Tableau paginé côté serveur : seule la page visible part au navigateur.
+
+    `rows` est un DataFrame (trié et découpé ici) ou une fonction
+    `rows(sort_by, descending, offset, limit) → (total, page)` qui ne ramène
+    que la page demandée (depuis l'API par exemple). `styler(page)` reçoit
+    la page triée et renvoie ce qui est affiché (un Styler par exemple) ;
+    elle n'est donc appliquée qu'aux lignes visibles. Renvoie le total.
+    """
+    if isinstance(rows, pd.DataFrame):
+        df = rows
+        rows = lambda *args: sorted_page(df, *args)
+    col1, col2, col3, col4 = st.columns([3, 1, 1, 1])
+    sort_by = col1.selectbox("Trier par", sort_columns, key=f"{key}_sort")
+    descending = col2.checkbox("Décroissant", key=f"{key}_desc")
+    page_size = col3.selectbox("Lignes par page", page_sizes, index=1, key=f"{key}_size")
+    
+    page_no = st.session_state.get(f"{key}_page", 1)
+    total, page = rows(sort_by, descending, (page_no - 1) * page_size, page_size)
+    pages = max(1, -(-total // page_size))
+    # Les filtres ont pu réduire le nombre de pages depuis le dernier affichage
+    if page_no > pages:
+        page_no = st.session_state[f"{key}_page"] = 1
+        total, page = rows(sort_by, descending, 0, page_size)
+    col4.number_input(f"Page (sur {pages})", min_value=1, max_value=pages, step=1, key=f"{key}_page")
+    
+    start = (page_no - 1) * page_size
+    st.dataframe(styler(page) if styler else page, use_container_width=True, hide_index=True)
+    st.caption(f"Lignes {min(start + 1, total):,} à {start + len(page):,} sur {total:,}")
+    return total
+
+# Niveaux d'urgence des alertes et couleur de fond de leurs lignes
+URGENCES = ["Urgent (≤15j)", "Proche (≤30j)", "Planifié (≤90j)"]
+URGENCE_COULEURS = [
+    "background-color: #ffebee",  # rouge clair
+    "background-color: #fff8e1",  # jaune clair
+    "background-color: #e8f5e9",  # vert clair
+]
+
 # CSV files configuration
 csv_files = {
     "MATRICE - Parc d'engins": "import/MATRICE.csv",
@@ -38,32 +148,26 @@ if page == "🔎 Recherche globale":
     search_term = st.text_input("Entrer un matricule (partiel ou complet)")
     
     if search_term:
-        results_found = False
+        # Index des matricules construit une fois par version des fichiers
+        hits = matricule_index(csv_files).search(search_term)
+        results_found = bool(hits)
         
-        for label, file_path in csv_files.items():
+        for label, positions in hits.items():
             try:
-                if os.path.exists(file_path):
-                    df = pd.read_csv(file_path, encoding='cp1252', sep=';')
-                    
-                    # Rechercher dans la colonne matricule si elle existe
-                    if 'matricule' in df.columns:
-                        df_filtered = df[df['matricule'].astype(str).str.contains(search_term, case=False, na=False)]
-                        
-                        if len(df_filtered) > 0:
-                            results_found = True
-                            st.subheader(f"📌 {label}")
-                            st.info(f"{len(df_filtered)} résultat(s)")
-                            st.dataframe(df_filtered, use_container_width=True, height=300)
-                            
-                            # Bouton de téléchargement
-                            csv_export = df_filtered.to_csv(index=False, sep=';', encoding='cp1252')
-                            st.download_button(
-                                label=f"💾 Télécharger {label}",
-                                data=csv_export,
-                                file_name=f"{label.replace(' ', '_')}_resultat.csv",
-                                mime="text/csv",
-                                key=f"download_{label}"
-                            )
+                df_filtered = load_csv(csv_files[label]).iloc[positions]
+                st.subheader(f"📌 {label}")
+                st.info(f"{len(df_filtered)} résultat(s)")
+                st.dataframe(df_filtered, use_container_width=True, height=300)
+                
+                # Bouton de téléchargement
+                csv_export = df_filtered.to_csv(index=False, sep=';', encoding='cp1252', date_format='%d/%m/%Y')
+                st.download_button(
+                    label=f"💾 Télécharger {label}",
+                    data=csv_export,
+                    file_name=f"{label.replace(' ', '_')}_resultat.csv",
+                    mime="text/csv",
+                    key=f"download_{label}"
+                )
             except Exception as e:
                 st.warning(f"⚠️ Erreur avec {label}: {e}")
         
@@ -72,6 +176,32 @@ if page == "🔎 Recherche globale":
     else:
         st.info("💡 Entrez un matricule pour rechercher dans tous les fichiers CSV")
 
+# ==================== PAGE: Recherche pannes / pièces ====================
+elif page == "🔧 Recherche pannes / pièces":
+    st.header("🔧 Recherche dans les pannes et pièces")
+    
+    query = st.text_input("Mots cherchés (accents et majuscules ignorés, début de mot accepté)",
+                          placeholder="ex : fuite huile, filtre gasoil")
+    
+    if query:
+        try:
+            # Index inversé construit une fois par version de SUIVI_CURATIF.csv
+            found = search_curatif(csv_files["SUIVI_CURATIF - Interventions"], query)
+        except FileNotFoundError:
+            st.error("❌ SUIVI_CURATIF.csv non trouvé")
+            found = None
+        
+        if found is not None and found.empty:
+            st.warning(f"❌ Aucune intervention trouvée pour '{query}'")
+        elif found is not None:
+            st.info(f"{len(found)} intervention(s), les plus pertinentes d'abord")
+            columns = [col for col in ["matricule", "designation", "date_entree", "panne_declatee",
+                                       "pieces", "intervenant", "score"] if col in found.columns]
+            st.dataframe(found[columns], use_container_width=True, height=500,
+                         column_config={"score": st.column_config.NumberColumn("Score", format="%.2f")})
+    else:
+        st.info("💡 Cherchez une panne ou une pièce dans l'historique des interventions curatives")
+
 # ==================== PAGE: Données CSV ====================
 elif page == "📊 Données CSV":
     st.header("📊 Visualisation des données CSV")
@@ -83,7 +213,7 @@ elif page == "📊 Données CSV":
     try:
         # Charger le CSV
         if os.path.exists(file_path):
-            df = pd.read_csv(file_path, encoding='cp1252', sep=';')
+            df = load_csv(file_path)
             
             st.success(f"✅ {len(df)} lignes chargées")
             
@@ -103,7 +233,7 @@ elif page == "📊 Données CSV":
                 st.dataframe(df, use_container_width=True, height=500)
             
             # Téléchargement
-            csv_export = df.to_csv(index=False, sep=';', encoding='cp1252')
+            csv_export = df.to_csv(index=False, sep=';', encoding='cp1252', date_format='%d/%m/%Y')
             st.download_button(
                 label="💾 Télécharger le tableau",
                 data=csv_export,
@@ -118,119 +248,136 @@ elif page == "📊 Données CSV":
         st.error(f"❌ Erreur lors du chargement: {e}")
 
 # ==================== PAGE : Entretiens programmés (VERSION TURBO PAR ANNÉE) ====================
-elif page == "Entretiens programmés":
+elif page == "📅 Entretiens programmés":
     st.header("Calendrier des entretiens programmés")
 
-    # Sélection des années (tu peux cocher plusieurs)
+    # Sélection des années (plusieurs possibles), servies page par page par l'API
     années_dispo = list(range(2025, 2031))
-    années_choisies = st.multiselect(
+    années_choisies = sorted(st.multiselect(
         "Sélectionner les années à afficher",
         années_dispo,
         default=[2026, 2027, 2028],
-        help="Cochez les années souhaitées – le calcul se fait à la volée !"
-    )
+        help="Cochez les années souhaitées – seules les années absentes du cache sont calculées"
+    ))
 
     if not années_choisies:
         st.info("Veuillez sélectionner au moins une année.")
     else:
-        with st.spinner(f"Génération du calendrier pour {len(années_choisies)} année(s)..."):
-            # On génère uniquement les années demandées
-            dfs = []
-            for année in années_choisies:
-                df_année = create_complete_maintenance_schedule(
-                    start_year=année,
-                    end_year=année  # ← 1 an à la fois
-                )
-                dfs.append(df_année)
-            schedule_df = pd.concat(dfs, ignore_index=True)
+        première, dernière = années_choisies[0], années_choisies[-1]
 
-        st.success(f"Calendrier généré : {len(schedule_df):,} entretiens pour {len(années_choisies)} année(s)")
-
-        # Filtres classiques
+        # Filtres classiques (appliqués côté API)
         col1, col2 = st.columns(2)
         matricule_filter = col1.text_input("Filtrer par matricule")
         type_filter = col2.multiselect("Filtrer par type", options=["C", "N", "CH"], default=["C", "N", "CH"])
+        par_visite = st.checkbox("Regrouper par visite (toutes les opérations d'un engin le même jour)")
 
-        df = schedule_df[schedule_df['type'].isin(type_filter)]
+        params = {"from": f"{première}-01-01", "to": f"{dernière}-12-31", "year": années_choisies,
+                  "type": type_filter, "visits": par_visite}
         if matricule_filter:
-            df = df[df['matricule'].astype(str).str.contains(matricule_filter, case=False, na=False)]
-
-        # Affichage
-        aff = df[['année', 'date', 'matricule', 'engin', 'opération', 'type_nom', 'catégorie']].copy()
-        aff['date'] = pd.to_datetime(aff['date']).dt.strftime('%d/%m/%Y')
-        aff = aff.sort_values(['année', 'date'])
-
-        st.dataframe(aff, use_container_width=True, hide_index=True)
-
-        # Export
-        csv = aff.to_csv(index=False, sep=';')
-        st.download_button(
-            "Exporter ce calendrier (CSV)",
-            data=csv,
-            file_name=f"calendrier_entretiens_{'_'.join(map(str, sorted(années_choisies)))}.csv",
-            mime="text/csv"
-        )
+            params["matricule"] = matricule_filter
+
+        def local_schedule():
+            """API indisponible : calcul local depuis le cache disque, année par année"""
+            schedule_df = pd.concat([
+                schedule_cache.load(start_year=année, end_year=année, compact=True)
+                for année in années_choisies
+            ], ignore_index=True)
+            df = schedule_df[schedule_df['type'].isin(type_filter)]
+            if matricule_filter:
+                df = df[df['matricule'].astype(str).str.contains(matricule_filter, case=False, na=False, regex=False)]
+            df = with_assets(df, schedule_cache.assets())
+            return group_visits(df) if par_visite else df
+
+        def schedule_rows(sort_by, descending, offset, limit):
+            if not type_filter:
+                return 0, pd.DataFrame(columns=SCHEDULE_COLUMNS + ['nb_opérations', 'opérations'])
+            try:
+                # Calendrier servi par l'API (une seule copie en mémoire pour tous les clients) :
+                # tri et découpage côté API, seule la page est transférée
+                return fetch_schedule({**params, "sort": ("-" if descending else "") + sort_by,
+                                       "offset": offset, "limit": limit})
+            except requests.RequestException:
+                return sorted_page(local_schedule(), sort_by, descending, offset, limit)
+
+        if par_visite:
+            colonnes = ['année', 'date', 'matricule', 'engin', 'nb_opérations', 'opérations', 'type_nom', 'catégorie']
+            sort_columns = ['date', 'matricule', 'engin', 'nb_opérations', 'type_nom', 'catégorie']
+            unité = "visites"
+        else:
+            colonnes = ['année', 'date', 'matricule', 'engin', 'opération', 'type_nom', 'catégorie']
+            sort_columns = ['date', 'matricule', 'engin', 'opération', 'type_nom', 'catégorie']
+            unité = "entretiens"
+
+        résumé = st.empty()
+        with st.spinner("Chargement du calendrier..."):
+            # Dates formatées sur la seule page affichée
+            total = paged_table(schedule_rows, "calendrier_visites" if par_visite else "calendrier", sort_columns,
+                                styler=lambda page: page[colonnes].style.format({'date': '{:%d/%m/%Y}'}))
+        résumé.success(f"Calendrier : {total:,} {unité} pour {len(années_choisies)} année(s)")
+
+        # Export : toute la sélection, chargée seulement à la demande
+        if total and st.button("Préparer l'export CSV"):
+            with st.spinner("Préparation de l'export..."):
+                try:
+                    export = fetch_schedule_all(params)
+                except requests.RequestException:
+                    export = local_schedule()
+            export = export.sort_values('date', kind='stable')[colonnes]
+            csv = export.to_csv(index=False, sep=';', date_format='%d/%m/%Y')
+            st.download_button(
+                "Exporter ce calendrier (CSV)",
+                data=csv,
+                file_name=f"calendrier_entretiens_{'_'.join(map(str, années_choisies))}.csv",
+                mime="text/csv"
+            )
 
-elif page == "Alertes":
+elif page == "🔔 Alertes":
     st.header("Alertes de maintenance")
 
     # Choix de la fenêtre d'alertes
     fenêtre = st.slider("Fenêtre d'alertes (jours dans le futur)", 15, 180, 90)
 
-    with st.spinner("Calcul des alertes en cours..."):
-        # On génère seulement l'année en cours + l'année suivante (suffisant pour les alertes)
-        today = pd.Timestamp.today()
-        année_courante = today.year
-        année_suivante = année_courante + 1
-
-        df = create_complete_maintenance_schedule(
-            start_year=année_courante,
-            end_year=année_suivante
-        )
-        df['date'] = pd.to_datetime(df['date'])
-        today_norm = today.normalize()
-
-        alertes = df[df['date'] >= today_norm].copy()
-        alertes['jours'] = (alertes['date'] - today_norm).dt.days
-        alertes = alertes[alertes['jours'] <= fenêtre].sort_values('jours')
-
-        
-
     # Filtres dans la sidebar
     st.sidebar.subheader("Filtres Alertes")
     filtre_matricule = st.sidebar.text_input("Matricule (partiel ou complet)", "")
     max_jours = st.sidebar.slider("Afficher jusqu'à (jours)", 15, 365, 90, step=15)
 
-    # Application des filtres
-    if filtre_matricule:
-        alertes = alertes[alertes['matricule'].astype(str).str.contains(filtre_matricule, case=False, na=False)]
+    with st.spinner("Calcul des alertes en cours..."):
+        # Prochaine échéance de chaque série, lue dans l'index trié de l'API
+        # (une recherche dichotomique, quelle que soit la taille du parc)
+        today = pd.Timestamp.today()
+        today_norm = today.normalize()
+        try:
+            alertes = fetch_alerts(fenêtre, filtre_matricule)
+        except requests.RequestException:
+            # API indisponible : même index, construit localement
+            _, alertes = get_next_due_index().query(
+                today_norm - pd.Timedelta(days=fenêtre),
+                today_norm + pd.Timedelta(days=fenêtre),
+                matricule=filtre_matricule or None)
+        # Séries d'une même opération échues le même jour : déjà fusionnées par l'index
+        alertes = alertes.sort_values('jours', kind='stable')
 
     alertes = alertes[alertes['jours'] <= max_jours].copy()
 
-    # Ajout de la colonne Urgence avec icônes
-    def niveau_urgence(j):
-        if j <= 15:
-            return "Urgent (≤15j)"
-        elif j <= 30:
-            return "Proche (≤30j)"
-        else:
-            return "Planifié (≤90j)"
-
-    alertes['Urgence'] = alertes['jours'].apply(niveau_urgence)
+    # Urgence et couleur de fond calculées en colonnes (pas de fonction par ligne)
+    jours = alertes['jours'].to_numpy()
+    niveau = np.select([jours <= 15, jours <= 30], [0, 1], 2)
+    alertes['Urgence'] = np.array(URGENCES)[niveau]
+    couleurs = pd.Series(np.array(URGENCE_COULEURS)[niveau], index=alertes.index)
 
     if alertes.empty:
         st.success("Aucune alerte dans la période sélectionnée ! Tout est sous contrôle.")
     else:
         # Stats rapides
         col1, col2, col3, col4 = st.columns(4)
-        col1.metric("Urgent (≤15j)", len(alertes[alertes['jours'] <= 15]))
-        col2.metric("Proche (≤30j)", len(alertes[alertes['jours'] <= 30]))
-        col3.metric("Planifié (≤90j)", len(alertes[alertes['jours'] <= 90]))
+        col1.metric("Urgent (≤15j)", int((jours <= 15).sum()))
+        col2.metric("Proche (≤30j)", int((jours <= 30).sum()))
+        col3.metric("Planifié (≤90j)", int((jours <= 90).sum()))
         col4.metric("Total alertes", len(alertes))
 
         # Préparation du tableau d'affichage
-        aff = alertes[['Urgence', 'jours', 'matricule', 'engin', 'opération', 'type_nom', 'date', 'catégorie']].copy()
-        aff['date'] = aff['date'].dt.strftime('%d/%m/%Y')
+        aff = alertes[['Urgence', 'jours', 'matricule', 'engin', 'opération', 'type_nom', 'date', 'catégorie']]
         aff = aff.rename(columns={
             'jours': 'Jours restants',
             'matricule': 'Matricule',
@@ -241,26 +388,19 @@ elif page == "Alertes":
             'catégorie': 'Catégorie'
         })
 
-        # Couleurs de fond
-        def colore_ligne(row):
-            if "Urgent" in row['Urgence']:
-                return ['background-color: #ffebee'] * len(row)   # rouge clair
-            elif "Proche" in row['Urgence']:
-                return ['background-color: #fff8e1'] * len(row)   # jaune clair
-            else:
-                return ['background-color: #e8f5e9'] * len(row)   # vert clair
+        # Couleurs de fond : une colonne de styles, appliquée à la page visible
+        def style_page(page):
+            css = np.repeat(couleurs.loc[page.index].to_numpy()[:, None], page.shape[1], axis=1)
+            return (page.style.apply(lambda _: css, axis=None)
+                    .format({'Jours restants': '{:.0f}', 'Date prévue': '{:%d/%m/%Y}'}))
 
-        # Affichage final
-        st.dataframe(
-            aff.style.apply(colore_ligne, axis=1).format({'Jours restants': '{:.0f}'}),
-            use_container_width=True,
-            hide_index=True
-        )
+        paged_table(aff, "alertes", ['Jours restants', 'Matricule', 'Engin', 'Opération', 'Type', 'Catégorie'],
+                    styler=style_page)
 
         # Export CSV
-        csv_data = aff.copy()
-        csv_data['Urgence'] = csv_data['Urgence'].str.replace('Urgent (≤15j)', 'Urgent').str.replace('Proche (≤30j)', 'Proche').str.replace('Planifié (≤90j)', 'Planifié')
-        csv = csv_data.to_csv(index=False, sep=';')
+        csv_data = aff.sort_values('Jours restants', kind='stable')
+        csv_data = csv_data.assign(Urgence=csv_data['Urgence'].str.split(' ').str[0])
+        csv = csv_data.to_csv(index=False, sep=';', date_format='%d/%m/%Y')
         st.download_button(
             label="Exporter ces alertes (CSV)",
             data=csv,
@@ -268,20 +408,66 @@ elif page == "Alertes":
             mime="text/csv"
         )
 
-    st.info("Alertes générées automatiquement à partir de Param.csv + exclusions par catégorie. Aucune base de données requise !")
+    # Échéances au compteur : période convertie en jours au rythme de chaque engin
+    with st.expander("⛽ Prévision d'usage (compteurs VIDANGE)"):
+        scheduler = schedule_cache.scheduler()
+        usage = scheduler.usage_due()
+        if not scheduler.usage_periods:
+            st.info("Aucune période au compteur : ajoutez les colonnes every_km / every_hours à Param.csv")
+        elif usage.empty:
+            st.info("Pas assez de relevés de compteur pour estimer un rythme d'usage")
+        else:
+            périodes = ", ".join(
+                f"{op} : " + " / ".join(f"{value:,} {unit}" for unit, value in p.items() if value)
+                for op, p in scheduler.usage_periods.items())
+            st.caption(f"Rythme estimé sur tout l'historique des compteurs ({périodes}) ; "
+                       "l'échéance au compteur remplace celle de Param.csv quand elle tombe plus tôt")
+            usage = usage[usage['matricule'].str.contains(filtre_matricule, case=False, regex=False)]
+            st.dataframe(
+                usage[['matricule', 'opération', 'unité', 'par_jour', 'relevés', 'dernier_relevé',
+                       'dernière_valeur', 'intervalle_jours', 'échéance']]
+                .sort_values('échéance', kind='stable')
+                .style.format({'par_jour': '{:.1f}', 'dernière_valeur': '{:,.0f}',
+                               'dernier_relevé': '{:%d/%m/%Y}', 'échéance': '{:%d/%m/%Y}'}),
+                use_container_width=True, hide_index=True)
+
+    st.info("Alertes générées automatiquement à partir de Param.csv + exclusions par catégorie : "
+            "une ligne par série (engin, opération, périodicité), à sa prochaine échéance. Aucune base de données requise !")
 # ==================== PAGE: Actions ====================
 elif page == "✅ Actions":
     st.header("✅ Actions de maintenance")
     
-    action = st.selectbox("Choisir une action", ["Marquer un job fait", "Ajouter un engin"])
+    action = st.selectbox("Choisir une action", ["Marquer des jobs faits", "Programmer des plans", "Ajouter un engin"])
+    
+    if action == "Marquer des jobs faits":
+        ids_text = st.text_area("IDs des jobs (séparés par des espaces, virgules ou retours à la ligne)")
+        done_dt = st.date_input("Date de réalisation", value=date.today())
+        job_ids = [int(x) for x in re.findall(r'\d+', ids_text)]
+        if st.button(f"✅ Marquer {len(job_ids)} job(s) comme faits", disabled=not job_ids):
+            try:
+                # Un seul appel (et une seule transaction) pour tout le lot
+                resp = requests.post(f"{API}/jobs/done", json={"job_ids": job_ids, "done_dt": done_dt.isoformat()}, timeout=30)
+                if resp.status_code == 200:
+                    results = pd.DataFrame(resp.json())
+                    done = (results['status'] == 'done').sum()
+                    st.success(f"{done} job(s) marqué(s) comme faits ! Prochaines échéances recalculées.")
+                    st.dataframe(results, use_container_width=True)
+                else:
+                    st.error(f"Erreur : {resp.text}")
+            except Exception as e:
+                st.error(f"Erreur de connexion: {e}")
     
-    if action == "Marquer un job fait":
-        job_id = st.number_input("ID du job", min_value=1, step=1)
-        if st.button("✅ Marquer comme fait"):
+    elif action == "Programmer des plans":
+        ids_text = st.text_area("IDs des plans (vide = toute la flotte)")
+        plan_ids = [int(x) for x in re.findall(r'\d+', ids_text)]
+        if st.button("📅 Programmer les jobs"):
             try:
-                resp = requests.put(f"{API}/jobs/{job_id}/done", timeout=5)
+                resp = requests.post(f"{API}/plans/schedule", json={"plan_ids": plan_ids or None}, timeout=30)
                 if resp.status_code == 200:
-                    st.success(f"Job {job_id} marqué comme fait ! Prochaine échéance recalculée.")
+                    results = pd.DataFrame(resp.json())
+                    scheduled = (results['status'] == 'scheduled').sum() if not results.empty else 0
+                    st.success(f"{scheduled} job(s) programmé(s)")
+                    st.dataframe(results, use_container_width=True)
                 else:
                     st.error(f"Erreur : {resp.text}")
             except Exception as e:
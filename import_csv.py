@@ -1,13 +1,20 @@
 #!/usr/bin/env python3
+import argparse
+import hashlib
+import io
 import pandas as pd
 import psycopg2
-from psycopg2.extras import Json
+from psycopg2.extras import Json, execute_values
+from psycopg2.pool import ThreadedConnectionPool
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, timedelta
 import os
 import sys
 import re
 import time
 
+from usage_forecast import forecast_fleet, is_hour_meter, parse_counter
+
 # ===========================================
 # Configuration DB
 # ===========================================
@@ -43,86 +50,234 @@ def wait_for_postgres():
     print("❌ PostgreSQL ne répond pas après 30s")
     sys.exit(1)
 
-wait_for_postgres()
+PRIORITY_MAP = {'CH': 3, 'N': 2, 'C': 1}
 
 # ===========================================
-# Connexion DB
+# Chargement en masse (COPY vers tables temporaires)
 # ===========================================
-try:
-    conn = psycopg2.connect(**DB_CONFIG)
-    cur = conn.cursor()
-    print("✅ Connecté à PostgreSQL")
-except Exception as e:
-    print(f"❌ Erreur de connexion: {e}")
-    sys.exit(1)
+def ensure_import_tables(cur):
+    """Tables de suivi d'import (créées si la base date d'avant leur ajout)"""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS import_rejects (
+            id          SERIAL PRIMARY KEY,
+            file        TEXT NOT NULL,
+            line        INTEGER,
+            reason      TEXT NOT NULL,
+            raw         JSONB,
+            imported_at TIMESTAMP DEFAULT now()
+        );
+        CREATE TABLE IF NOT EXISTS import_files (
+            file        TEXT PRIMARY KEY,
+            checksum    TEXT NOT NULL,
+            imported_at TIMESTAMP DEFAULT now()
+        );
+        CREATE TABLE IF NOT EXISTS import_rows (
+            file        TEXT NOT NULL,
+            row_hash    TEXT NOT NULL,
+            target_id   INTEGER,
+            PRIMARY KEY (file, row_hash)
+        );
+    """)
 
-PRIORITY_MAP = {'CH': 3, 'N': 2, 'C': 1}
+def raw_json(df):
+    """Contenu brut de chaque ligne en JSON (pour la table des rejets)"""
+    if df.empty:
+        return pd.Series([], index=df.index, dtype=object)
+    return pd.Series(
+        df.to_json(orient='records', lines=True, force_ascii=False).splitlines(),
+        index=df.index
+    )
 
-def import_matrice():
-    print("\n📦 Importation MATRICE.csv...")
-    
+def copy_into(cur, table, df):
+    """COPY FROM STDIN d'un DataFrame (colonnes = colonnes de la table)"""
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    cur.copy_expert(
+        f"COPY {table} ({', '.join(df.columns)}) FROM STDIN WITH (FORMAT csv)",
+        buffer
+    )
+
+def reject_rows(cur, file_name, df, reason):
+    """Enregistre des lignes écartées côté Python dans import_rejects"""
+    if df.empty:
+        return 0
+    copy_into(cur, "import_rejects", pd.DataFrame({
+        "file": file_name,
+        "line": df.index,
+        "reason": reason,
+        "raw": raw_json(df),
+    }))
+    return len(df)
+
+# ===========================================
+# Import incrémental (empreintes de fichiers et de lignes)
+# ===========================================
+def file_checksum(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def known_checksums(cur):
+    """Empreinte de chaque fichier lors de son dernier import"""
+    cur.execute("SELECT file, checksum FROM import_files")
+    return dict(cur.fetchall())
+
+def record_file(cur, file_name, checksum):
+    cur.execute("""
+        INSERT INTO import_files (file, checksum) VALUES (%s, %s)
+        ON CONFLICT (file) DO UPDATE SET checksum = EXCLUDED.checksum, imported_at = now();
+    """, (file_name, checksum))
+
+def row_hashes(df):
+    """Empreinte du contenu de chaque ligne (les doublons exacts sont numérotés)"""
+    raw = raw_json(df)
+    occurrence = raw.groupby(raw).cumcount().astype(str)
+    return (raw + '#' + occurrence).map(
+        lambda content: hashlib.sha256(content.encode('utf-8')).hexdigest()
+    )
+
+def read_import_file(file_name, known_checksum=None, **read_kwargs):
+    """Lecture et empreintes d'un CSV, sans accès à la base.
+
+    Retourne None si le fichier est absent, et (checksum, None, None) s'il
+    n'a pas changé depuis le dernier import.
+    """
+    path = os.path.join(CSV_FOLDER, file_name)
     try:
-        df = pd.read_csv(
-            os.path.join(CSV_FOLDER, "MATRICE.csv"),
-            encoding='cp1252',
-            sep=';'
-        )
+        checksum = file_checksum(path)
     except FileNotFoundError:
+        return None
+    if checksum == known_checksum:
+        return checksum, None, None
+    df = pd.read_csv(path, encoding='cp1252', sep=';', **read_kwargs)
+    return checksum, df, row_hashes(df)
+
+def sync_rows(cur, file_name, hashes, incremental):
+    """Lignes à (ré)importer et ids créés par les lignes disparues ou modifiées.
+
+    En mode complet, toutes les lignes sont réimportées et tout ce que le
+    fichier avait créé est remplacé ; en mode incrémental, seules les
+    nouvelles empreintes sont importées.
+    """
+    cur.execute("SELECT row_hash, target_id FROM import_rows WHERE file = %s", (file_name,))
+    known = dict(cur.fetchall())
+    if incremental:
+        pending = ~hashes.isin(known.keys())
+        stale = set(known) - set(hashes)
+    else:
+        pending = pd.Series(True, index=hashes.index)
+        stale = set(known)
+    if stale:
+        cur.execute(
+            "DELETE FROM import_rows WHERE file = %s AND row_hash = ANY(%s)",
+            (file_name, list(stale))
+        )
+    return pending, [known[h] for h in stale if known[h] is not None]
+
+def record_rows(cur, file_name, hashes, target_ids):
+    copy_into(cur, "import_rows", pd.DataFrame({
+        "file": file_name,
+        "row_hash": hashes.to_numpy(),
+        "target_id": list(target_ids),
+    }))
+
+def delete_jobs(cur, job_ids):
+    """Supprime les jobs créés par des lignes disparues (sauf s'ils ont des alertes)"""
+    if job_ids:
+        cur.execute("""
+            DELETE FROM maint_jobs j WHERE j.id = ANY(%s)
+            AND NOT EXISTS (SELECT 1 FROM alerts a WHERE a.job_id = j.id);
+        """, (job_ids,))
+
+def reserve_ids(cur, table, count):
+    """Réserve `count` ids de la séquence de `table` (pour COPY avec id explicite)"""
+    cur.execute(
+        "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+        (table, count)
+    )
+    return [row[0] for row in cur.fetchall()]
+
+def reject_count(cur, file_name):
+    cur.execute("SELECT COUNT(*) FROM import_rejects WHERE file = %s", (file_name,))
+    return cur.fetchone()[0]
+
+def import_matrice(cur, parsed, incremental=False):
+    print("\n📦 Importation MATRICE.csv...")
+    
+    if parsed is None:
         print("❌ MATRICE.csv non trouvé !")
-        return
+        return False
+    checksum, df, hashes = parsed
+    if df is None:
+        print("⏭️  MATRICE.csv inchangé")
+        return False
     
-    for idx, row in df.iterrows():
-        try:
-            matricule = str(row['matricule']).strip()
-            
-            meta_json = Json({
-                "marque": str(row.get('marque', '')),
-                "annee": str(row.get('annee', '')),
-                "pneumatique": str(row.get('pneumatique', '')),
-                "qte_vidange": str(row.get('qte_vidange', ''))
-            })
-            
-            cur.execute("""
-                INSERT INTO assets (id, name, type, reg_number, km, running_h, meta)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (id) DO UPDATE SET
-                    km = EXCLUDED.km,
-                    running_h = EXCLUDED.running_h,
-                    meta = EXCLUDED.meta;
-            """, (
-                matricule,
-                str(row['designation'])[:100],
-                str(row['categorie']),
-                str(row['matricule']),
-                0, 0,
-                meta_json
-            ))
-        except Exception as e:
-            print(f"❌ Ligne {idx}: {e}")
-            continue
+    matricules = df['matricule'].fillna('').str.strip()
+    meta = df.reindex(columns=['marque', 'annee', 'pneumatique', 'qte_vidange']).fillna('')
+    stage = pd.DataFrame({
+        "line": df.index,
+        "reg_number": matricules,
+        "name": df['designation'].fillna('').str.slice(0, 100),
+        "type": df['categorie'],
+        "meta": raw_json(meta),
+        "row_hash": hashes,
+    })
+    missing = matricules == ''
+    duplicated = matricules.duplicated() & ~missing
+    
+    # Un seul INSERT ... ON CONFLICT pour tout le fichier
+    cur.execute("DELETE FROM import_rejects WHERE file = 'MATRICE.csv'")
+    reject_rows(cur, "MATRICE.csv", df[missing], "matricule manquant")
+    reject_rows(cur, "MATRICE.csv", df[duplicated], "matricule en double")
     
-    conn.commit()
-    print(f"✅ {len(df)} engins importés")
+    # Les engins ne sont jamais supprimés : les lignes disparues sont oubliées
+    pending, _ = sync_rows(cur, "MATRICE.csv", stage['row_hash'], incremental)
+    cur.execute("""
+        CREATE TEMP TABLE stage_matrice (
+            line INTEGER, reg_number TEXT, name TEXT, type TEXT, meta JSONB, row_hash TEXT
+        ) ON COMMIT DROP;
+    """)
+    copy_into(cur, "stage_matrice", stage[pending & ~missing & ~duplicated])
+    cur.execute("""
+        WITH upserted AS (
+            INSERT INTO assets (name, type, reg_number, km, running_h, meta)
+            SELECT COALESCE(name, reg_number), type, reg_number, 0, 0, meta FROM stage_matrice
+            ON CONFLICT (reg_number) DO UPDATE SET
+                name = EXCLUDED.name,
+                type = EXCLUDED.type,
+                meta = EXCLUDED.meta
+            RETURNING id, reg_number
+        )
+        INSERT INTO import_rows (file, row_hash, target_id)
+        SELECT 'MATRICE.csv', s.row_hash, u.id
+        FROM stage_matrice s JOIN upserted u USING (reg_number);
+    """)
+    imported = cur.rowcount
+    errors = reject_count(cur, "MATRICE.csv")
+    record_file(cur, "MATRICE.csv", checksum)
+    
+    print(f"✅ {imported} engins importés, {errors} rejets")
+    return imported > 0
 
-def import_param():
+def import_param(cur, parsed, incremental=False):
     print("\n⚙️  Importation Param.csv...")
     
-    try:
-        df = pd.read_csv(
-            os.path.join(CSV_FOLDER, "Param.csv"),
-            encoding='cp1252',
-            sep=';'
-        )
-    except FileNotFoundError:
+    if parsed is None:
         print("❌ Param.csv non trouvé !")
-        return
+        return False
+    checksum, df, hashes = parsed
+    if df is None:
+        print("⏭️  Param.csv inchangé")
+        return False
     
     for op_code in ['C', 'N', 'CH']:
         cur.execute("""
             INSERT INTO maint_types (code, label) VALUES (%s, %s)
             ON CONFLICT (code) DO NOTHING;
         """, (op_code, {'C': 'Contrôle', 'N': 'Nettoyage', 'CH': 'Changement'}[op_code]))
-    conn.commit()
     
     interval_cols = [col for col in df.columns if col.isdigit()]
     operation_cols = [col for col in df.columns if col in ['Contrôler', 'Nettoyage', 'Changement']]
@@ -174,205 +329,443 @@ def import_param():
                     checklist_json
                 ))
     
-    conn.commit()
+    record_file(cur, "Param.csv", checksum)
     print(f"✅ Logique Param.csv importée")
+    return True
+
+def parse_compteur(values):
+    """Compteur km/h en entier (None si illisible ; « 8147,6 » heures → 8147)"""
+    return parse_counter(values).apply(
+        lambda v: None if pd.isna(v) else int(v)
+    ).astype('Int64')
+
+def normalize_label(label):
+    """Libellé d'opération normalisé (casse et espaces ignorés)"""
+    return re.sub(r'\s+', ' ', str(label)).strip().casefold()
+
+def load_asset_map(cur):
+    """matricule → (id, type) pour tout le parc, en une seule requête"""
+    cur.execute("SELECT reg_number, id, type FROM assets WHERE reg_number IS NOT NULL")
+    return {reg: (asset_id, asset_type) for reg, asset_id, asset_type in cur.fetchall()}
 
-def import_vidange():
+def load_plan_index(cur):
+    """Libellé normalisé → id du premier plan C/N/CH dont la checklist le contient"""
+    cur.execute("""
+        SELECT p.id, COALESCE(item->>'item', item #>> '{}')
+        FROM maint_plans p
+        CROSS JOIN LATERAL jsonb_array_elements(
+            CASE WHEN jsonb_typeof(p.checklist_json) = 'array'
+                 THEN p.checklist_json ELSE '[]'::jsonb END
+        ) AS item
+        WHERE p.maint_type_id IN (SELECT id FROM maint_types WHERE code IN ('C','N','CH'))
+        ORDER BY p.id;
+    """)
+    index = {}
+    for plan_id, label in cur.fetchall():
+        if label:
+            index.setdefault(normalize_label(label), plan_id)
+    return index
+
+def resolve_plan(plan_index, label):
+    """Plan exact, sinon premier plan dont un libellé contient `label`"""
+    key = normalize_label(label)
+    if key in plan_index:
+        return plan_index[key]
+    matches = [plan_id for item, plan_id in plan_index.items() if key in item]
+    return min(matches) if matches else None
+
+def import_vidange(cur, parsed, incremental=False):
     print("\n🔧 Importation VIDANGE.csv...")
     
-    try:
-        df = pd.read_csv(
-            os.path.join(CSV_FOLDER, "VIDANGE.csv"),
-            encoding='cp1252',
-            sep=';',
-            parse_dates=['date_entretien'],
-            dayfirst=True
-        )
-    except FileNotFoundError:
+    if parsed is None:
         print("❌ VIDANGE.csv non trouvé !")
-        return
+        return False
+    checksum, df, hashes = parsed
+    if df is None:
+        print("⏭️  VIDANGE.csv inchangé")
+        return False
     
-    for idx, row in df.iterrows():
-        try:
-            matricule = str(row['matricule']).strip()
-            
-            cur.execute("SELECT id, type FROM assets WHERE id = %s", (matricule,))
-            asset = cur.fetchone()
-            if not asset:
-                print(f"⚠️ Asset inconnu: {matricule}")
-                continue
-            
-            compteur = str(row['compteur_km_h']).replace(',', '').strip()
-            km_realise = None
-            heures_realisees = None
-            try:
-                valeur = int(float(compteur))
-                if valeur < 50000 and 'engin' in str(asset[1]).lower():
-                    heures_realisees = valeur
-                else:
-                    km_realise = valeur
-            except:
-                pass
-            
-            entretien = str(row.get('entretien', row.get('obs', 'VIDANGE'))).strip()
-            
-            cur.execute("""
-                SELECT id FROM maint_plans 
-                WHERE maint_type_id IN (SELECT id FROM maint_types WHERE code IN ('C','N','CH'))
-                AND checklist_json::text ILIKE %s
-            """, (f"%{entretien}%",))
-            
-            plan = cur.fetchone()
-            if not plan:
-                cur.execute("""
-                    INSERT INTO maint_plans (asset_id, maint_type_id, every_months, tolerance_days, checklist_json)
-                    VALUES (%s, (SELECT id FROM maint_types WHERE code='C'), 6, 30, %s)
-                    RETURNING id;
-                """, (matricule, Json([{"item": entretien, "type": "C"}])))
-                plan = cur.fetchone()
-            
-            plan_id = plan[0] if plan else None
-            
-            cur.execute("""
-                INSERT INTO maint_jobs (plan_id, due_dt, done_dt, status, note)
-                VALUES (%s, %s, %s, 'done', %s);
-            """, (
-                plan_id,
-                row['date_entretien'].strftime('%Y-%m-%d'),
-                row['date_entretien'].strftime('%Y-%m-%d'),
-                f"{entretien} | Compteur: {compteur} | Obs: {row.get('obs', '')}"
-            ))
-            
-            if km_realise:
-                cur.execute("UPDATE assets SET km = %s WHERE id = %s", (km_realise, matricule))
-            elif heures_realisees:
-                cur.execute("UPDATE assets SET running_h = %s WHERE id = %s", (heures_realisees, matricule))
-            
-        except Exception as e:
-            print(f"❌ Ligne {idx}: {e}")
+    dates = pd.to_datetime(df['date_entretien'], dayfirst=True, errors='coerce')
+    compteur = df['compteur_km_h'].fillna('').str.replace(',', '').str.strip()
+    entretien = df['entretien'].fillna(df['obs']).fillna('VIDANGE').str.strip()
+    matricules = df['matricule'].fillna('').str.strip()
+    valid = dates.notna()
+    
+    pending, stale_jobs = sync_rows(cur, "VIDANGE.csv", hashes, incremental)
+    delete_jobs(cur, stale_jobs)
+    
+    cur.execute("DELETE FROM import_rejects WHERE file = 'VIDANGE.csv'")
+    reject_rows(cur, "VIDANGE.csv", df[pending & ~valid], "date_entretien invalide")
+    
+    # Résolution en mémoire : engins et plans chargés une seule fois
+    asset_map = load_asset_map(cur)
+    known = matricules.isin(asset_map.keys())
+    unknown = pending & valid & ~known
+    for matricule, rows in df[unknown].groupby(matricules[unknown]):
+        reject_rows(cur, "VIDANGE.csv", rows, f"Asset inconnu: {matricule}")
+    keep = pending & valid & known
+    
+    asset_ids = matricules[keep].map(lambda m: asset_map[m][0])
+    plan_index = load_plan_index(cur)
+    labels = entretien[keep]
+    plan_by_key = {}
+    missing = {}
+    for idx, label in labels.items():
+        key = normalize_label(label)
+        if key in plan_by_key or key in missing:
             continue
+        plan_id = resolve_plan(plan_index, label)
+        if plan_id is None:
+            # Nouveau plan rattaché au premier engin qui l'utilise
+            missing[key] = (int(asset_ids[idx]), label)
+        else:
+            plan_by_key[key] = plan_id
+    
+    if missing:
+        created = execute_values(cur, """
+            INSERT INTO maint_plans (asset_id, maint_type_id, every_months, tolerance_days, checklist_json)
+            VALUES %s RETURNING id;
+        """, [
+            (asset_id, 6, 30, Json([{"item": label, "type": "C"}]))
+            for asset_id, label in missing.values()
+        ], template="(%s, (SELECT id FROM maint_types WHERE code='C'), %s, %s, %s)", fetch=True)
+        plan_by_key.update(zip(missing.keys(), (row[0] for row in created)))
     
-    conn.commit()
-    print(f"✅ {len(df)} vidanges importées")
+    jobs = pd.DataFrame({
+        "plan_id": labels.map(lambda label: plan_by_key[normalize_label(label)]),
+        "due_dt": dates[keep].dt.strftime('%Y-%m-%d'),
+        "done_dt": dates[keep].dt.strftime('%Y-%m-%d'),
+        "status": "done",
+        "note": labels + " | Compteur: " + compteur[keep] + " | Obs: " + df['obs'][keep].fillna(''),
+    })
+    jobs.insert(0, "id", reserve_ids(cur, "maint_jobs", len(jobs)))
+    copy_into(cur, "maint_jobs", jobs)
+    record_rows(cur, "VIDANGE.csv", hashes[keep], jobs['id'])
+    imported = len(jobs)
+    
+    # Compteurs : relevé le plus récent de chaque engin (heures pour les engins)
+    current = valid & known
+    readings = pd.DataFrame({
+        "matricule": matricules[current],
+        "date": dates[current],
+        "valeur": parse_compteur(df['compteur_km_h'])[current],
+    })
+    readings = readings[readings['valeur'].notna() & (readings['valeur'] != 0)]
+    latest = readings.sort_values('date', ascending=False, kind='stable').drop_duplicates('matricule')
+    hours = is_hour_meter(latest['valeur'], latest['matricule'].map(lambda m: asset_map[m][1]))
+    updates = [
+        (asset_map[matricule][0], int(valeur), bool(is_hours))
+        for matricule, valeur, is_hours in zip(latest['matricule'], latest['valeur'], hours)
+    ]
+    if updates:
+        execute_values(cur, """
+            UPDATE assets a SET
+                running_h = CASE WHEN v.is_hours THEN v.valeur ELSE a.running_h END,
+                km = CASE WHEN v.is_hours THEN a.km ELSE v.valeur END
+            FROM (VALUES %s) AS v (id, valeur, is_hours)
+            WHERE a.id = v.id;
+        """, updates)
+    errors = reject_count(cur, "VIDANGE.csv")
+    record_file(cur, "VIDANGE.csv", checksum)
+    
+    print(f"✅ {imported} vidanges importées, {errors} rejets")
+    return imported > 0 or bool(stale_jobs)
 
-def import_curatif():
+def import_curatif(cur, parsed, incremental=False):
     print("\n🔨 Importation SUIVI_CURATIF.csv...")
     
-    # 🔥 Debug : afficher les colonnes réelles
-    try:
-        df_preview = pd.read_csv(
-            os.path.join(CSV_FOLDER, "SUIVI_CURATIF.csv"),
-            encoding='cp1252',
-            sep=';',
-            nrows=3
-        )
-        print(f"Colonnes détectées: {list(df_preview.columns)}")
-    except:
-        pass
-    
-    try:
-        df = pd.read_csv(
-            os.path.join(CSV_FOLDER, "SUIVI_CURATIF.csv"),
-            encoding='cp1252',
-            sep=';',
-            parse_dates=['date_entree', 'date_sortie'],
-            dayfirst=True
-        )
-    except FileNotFoundError:
+    if parsed is None:
         print("❌ SUIVI_CURATIF.csv non trouvé !")
-        return
+        return False
+    checksum, df, hashes = parsed
+    if df is None:
+        print("⏭️  SUIVI_CURATIF.csv inchangé")
+        return False
+    
+    date_entree = pd.to_datetime(df['date_entree'], dayfirst=True, errors='coerce')
+    date_sortie = pd.to_datetime(df['date_sortie'], dayfirst=True, errors='coerce')
+    date_effectuee = date_sortie.fillna(date_entree)
+    cout = pd.to_numeric(
+        df.get('cout_total', pd.Series(index=df.index, dtype=str)).str.replace(',', '.'),
+        errors='coerce'
+    ).fillna(0)
+    note = ("Panne: " + df['panne_declatee'].fillna('')
+            + "\nIntervenant: " + df['intervenant'].fillna('')
+            + "\nPieces: " + df['pieces'].fillna(''))
+    valid = date_effectuee.notna()
     
-    # Crée ou récupère le plan curatif
     plan_label = "Intervention curative"
     
+    pending, stale_jobs = sync_rows(cur, "SUIVI_CURATIF.csv", hashes, incremental)
+    delete_jobs(cur, stale_jobs)
+    
+    cur.execute("DELETE FROM import_rejects WHERE file = 'SUIVI_CURATIF.csv'")
+    reject_rows(cur, "SUIVI_CURATIF.csv", df[pending & ~valid], "date manquante")
+    
+    # Un plan curatif par engin : le matricule de chaque job se retrouve par
+    # maint_plans.asset_id (GET /curatif/search). Matricules inconnus : plan sans engin.
+    keep = pending & valid
+    asset_map = load_asset_map(cur)
+    asset_ids = [asset_map[m][0] if m in asset_map else None
+                 for m in df['matricule'][keep].fillna('').str.strip()]
     cur.execute("""
-        SELECT id FROM maint_plans
-        WHERE checklist_json->>0 ILIKE %s;
+        SELECT asset_id, MIN(id) FROM maint_plans
+        WHERE checklist_json->>0 ILIKE %s
+        GROUP BY asset_id;
     """, (f"%{plan_label}%",))
+    plan_by_asset = dict(cur.fetchall())
+    missing = [asset_id for asset_id in dict.fromkeys(asset_ids) if asset_id not in plan_by_asset]
+    if missing:
+        created = execute_values(cur, """
+            INSERT INTO maint_plans (asset_id, maint_type_id, every_months, tolerance_days, checklist_json)
+            VALUES %s RETURNING id;
+        """, [
+            (asset_id, None, 30, Json([{"item": plan_label, "type": "CH"}]))
+            for asset_id in missing
+        ], template="(%s, (SELECT id FROM maint_types WHERE code='CH'), %s, %s, %s)", fetch=True)
+        plan_by_asset.update(zip(missing, (row[0] for row in created)))
+        print(f"✅ {len(missing)} plan(s) curatif(s) créé(s)")
     
-    plan_existing = cur.fetchone()
+    jobs = pd.DataFrame({
+        "id": reserve_ids(cur, "maint_jobs", int(keep.sum())),
+        "plan_id": [plan_by_asset[asset_id] for asset_id in asset_ids],
+        "due_dt": date_effectuee[keep].dt.strftime('%Y-%m-%d').to_numpy(),
+        "done_dt": date_effectuee[keep].dt.strftime('%Y-%m-%d').to_numpy(),
+        "status": "done",
+        "cost_parts": cout[keep].to_numpy(),
+        "note": note[keep].to_numpy(),
+    })
+    copy_into(cur, "maint_jobs", jobs)
+    record_rows(cur, "SUIVI_CURATIF.csv", hashes[keep], jobs['id'])
+    success = len(jobs)
+    errors = reject_count(cur, "SUIVI_CURATIF.csv")
+    record_file(cur, "SUIVI_CURATIF.csv", checksum)
     
-    if plan_existing:
-        plan_id = plan_existing[0]
-        print(f"✅ Plan curatif existant ID: {plan_id}")
-    else:
-        cur.execute("""
-            INSERT INTO maint_plans (maint_type_id, every_months, tolerance_days, checklist_json)
-            VALUES ((SELECT id FROM maint_types WHERE code='CH'), NULL, 30, %s)
-            RETURNING id;
-        """, (Json([{"item": plan_label, "type": "CH"}]),))
-        plan_id = cur.fetchone()[0]
-        conn.commit()
-        print(f"✅ Plan curatif créé ID: {plan_id}")
-    
-    success = 0
-    errors = 0
+    print(f"✅ {success} lignes importées, {errors} erreurs")
+    return success > 0 or bool(stale_jobs)
+
+# ===========================================
+# Import concurrent (graphe de dépendances entre fichiers)
+# ===========================================
+# fichier → (fonction d'import, fichiers prérequis, options de lecture)
+STAGES = {
+    "MATRICE.csv": (import_matrice, [], {"dtype": str}),
+    "Param.csv": (import_param, [], {}),
+    "VIDANGE.csv": (import_vidange, ["MATRICE.csv", "Param.csv"], {"dtype": str}),
+    "SUIVI_CURATIF.csv": (import_curatif, ["MATRICE.csv", "Param.csv"], {"dtype": str}),
+}
+
+def timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    return func(*args, **kwargs), time.perf_counter() - started
+
+def read_stage(file_name, known_checksum, dep_reads, read_kwargs):
+    """Lecture d'un CSV après celle de ses prérequis.
+
+    Un fichier inchangé n'est ignoré que si ses prérequis le sont aussi :
+    sinon ses lignes rejetées (engin ou plan inconnu) peuvent désormais passer.
+    """
+    for dep in dep_reads:
+        parsed, _ = dep.result()
+        if parsed is not None and parsed[1] is not None:
+            known_checksum = None
+    return timed(read_import_file, file_name, known_checksum, **read_kwargs)
+
+def run_stage(pool, file_name, parse_future, dep_futures, incremental):
+    """Attend les prérequis puis importe le fichier sur sa propre connexion.
+
+    Chaque étape est une transaction : en cas d'erreur, seul ce fichier
+    est annulé et les étapes qui en dépendent échouent à leur tour.
+    """
+    func = STAGES[file_name][0]
+    started = time.perf_counter()
+    for dep in dep_futures:
+        dep.result()
+    parsed, parse_time = parse_future.result()
+    waited = time.perf_counter() - started
+    conn = pool.getconn()
+    try:
+        with conn, conn.cursor() as cur:
+            changed, load_time = timed(func, cur, parsed, incremental)
+    finally:
+        pool.putconn(conn)
+    return changed, {"lecture": parse_time, "attente": waited, "écriture": load_time}
+
+def import_all(pool, incremental=False, workers=2):
+    """Lit tous les CSV en parallèle et les importe dans l'ordre du graphe"""
+    conn = pool.getconn()
+    try:
+        with conn, conn.cursor() as cur:
+            ensure_import_tables(cur)
+            checksums = known_checksums(cur) if incremental else {}
+    finally:
+        pool.putconn(conn)
     
-    for idx, row in df.iterrows():
-        try:
-            date_effectuee = row.get('date_sortie')
-            if pd.isna(date_effectuee):
-                date_effectuee = row.get('date_entree')
-            
-            if pd.isna(date_effectuee):
-                print(f"⚠️ Ligne {idx}: date manquante")
-                errors += 1
-                continue
-            
-            cout = row.get('cout_total', 0)
-            if pd.isna(cout):
-                cout = 0
-            
+    # La lecture des CSV ne touche pas la base : elle recouvre les écritures
+    with ThreadPoolExecutor(max_workers=len(STAGES)) as readers, \
+         ThreadPoolExecutor(max_workers=workers) as writers:
+        # STAGES est dans l'ordre topologique : un prérequis est toujours soumis avant
+        parsed = {}
+        for file_name, (_, deps, read_kwargs) in STAGES.items():
+            parsed[file_name] = readers.submit(
+                read_stage, file_name, checksums.get(file_name),
+                [parsed[dep] for dep in deps], read_kwargs
+            )
+        stages = {}
+        for file_name, (_, deps, _) in STAGES.items():
+            stages[file_name] = writers.submit(
+                run_stage, pool, file_name, parsed[file_name],
+                [stages[dep] for dep in deps], incremental
+            )
+        return {file_name: future.result() for file_name, future in stages.items()}
+
+def repair_next_due(pool):
+    """Recalcul complet des prochaines échéances (après une modification hors triggers)"""
+    print("\n📅 Recalcul de toutes les prochaines échéances...")
+    conn = pool.getconn()
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute("SELECT refresh_next_due(NULL)")
+            print(f"✅ {cur.fetchone()[0]} plans mis à jour")
+    finally:
+        pool.putconn(conn)
+
+def forecast_usage(pool):
+    """Rythme d'usage de tout le parc depuis l'historique complet de VIDANGE.csv.
+
+    Une seule passe : pente des relevés de compteur par engin, écrite dans
+    assets.km_per_day / hours_per_day, puis recalcul des échéances des plans
+    à intervalle en km ou en heures (refresh_next_due convertit au rythme).
+    """
+    path = os.path.join(CSV_FOLDER, "VIDANGE.csv")
+    if not os.path.exists(path):
+        return
+    vidange = pd.read_csv(path, encoding='cp1252', sep=';', dtype=str)
+    conn = pool.getconn()
+    try:
+        with conn, conn.cursor() as cur:
+            asset_map = load_asset_map(cur)
+            forecast = forecast_fleet(vidange, {reg: asset_type for reg, (_, asset_type) in asset_map.items()})
+            forecast = forecast[forecast['matricule'].isin(asset_map.keys())]
+            rates = [
+                (asset_map[matricule][0],
+                 rate if unit == 'km' else None,
+                 rate if unit == 'h' else None)
+                for matricule, unit, rate in zip(forecast['matricule'], forecast['unité'],
+                                                 forecast['par_jour'].astype(float))
+            ]
+            # Les engins sans rythme estimable repassent à NULL
             cur.execute("""
-                INSERT INTO maint_jobs (plan_id, due_dt, done_dt, status, cost_parts, note)
-                VALUES (%s, %s, %s, 'done', %s, %s);
-            """, (
-                plan_id,
-                date_effectuee.strftime('%Y-%m-%d'),
-                date_effectuee.strftime('%Y-%m-%d'),
-                cout,
-                f"Panne: {row.get('panne_declatee','')}\nIntervenant: {row.get('intervenant','')}\nPieces: {row.get('pieces','')}"
-            ))
-            conn.commit()
-            success += 1
-            
-        except Exception as e:
-            print(f"❌ Ligne {idx}: {e}")
-            conn.rollback()
-            errors += 1
-            continue
-    
-    print(f"✅ {success} lignes importées, {errors} erreurs")
+                UPDATE assets SET km_per_day = NULL, hours_per_day = NULL
+                WHERE km_per_day IS NOT NULL OR hours_per_day IS NOT NULL
+            """)
+            if rates:
+                execute_values(cur, """
+                    UPDATE assets a SET km_per_day = v.km_per_day, hours_per_day = v.hours_per_day
+                    FROM (VALUES %s) AS v (id, km_per_day, hours_per_day)
+                    WHERE a.id = v.id;
+                """, rates, template="(%s, %s::REAL, %s::REAL)")
+            cur.execute("""
+                SELECT refresh_next_due(ARRAY(
+                    SELECT id FROM maint_plans WHERE every_km IS NOT NULL OR every_hours IS NOT NULL))
+            """)
+            plans = cur.fetchone()[0]
+    finally:
+        pool.putconn(conn)
+    print(f"\n📈 Rythme d'usage estimé pour {len(rates)} engins, {plans} plan(s) km/heures recalculé(s)")
+
+def split_job_partitions(pool):
+    """Range dans leur partition annuelle les jobs tombés dans la partition par défaut"""
+    conn = pool.getconn()
+    try:
+        with conn, conn.cursor() as cur:
+            year = date.today().year
+            cur.execute("SELECT create_job_partitions(%s, %s)", (year, year + 1))
+            created = cur.fetchone()[0]
+    finally:
+        pool.putconn(conn)
+    if created:
+        print(f"\n🗂️  {created} partition(s) annuelle(s) de maint_jobs créée(s)")
+
+def archive_job_partitions(pool, before_year):
+    """Détache les partitions des années < before_year (historique clos)"""
+    conn = pool.getconn()
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute("""
+                SELECT substring(c.relname FROM 'maint_jobs_(\\d{4})$')::INTEGER
+                FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = 'maint_jobs'::regclass
+            """)
+            years = sorted(y for (y,) in cur.fetchall() if y is not None and y < before_year)
+            for year in years:
+                cur.execute("SELECT archive_job_partition(%s)", (year,))
+                print(f"📦 Jobs {year} archivés dans {cur.fetchone()[0]}")
+    finally:
+        pool.putconn(conn)
+
+def print_timings(results, total):
+    print("\n⏱️  Durées par étape (s)")
+    print(f"   {'fichier':<20}{'lecture':>10}{'attente':>10}{'écriture':>10}")
+    for file_name, (_, timings) in results.items():
+        print(f"   {file_name:<20}" + "".join(f"{value:>10.2f}" for value in timings.values()))
+    print(f"   {'total':<20}{total:>30.2f}")
 
 # ==================== MAIN ====================
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import des CSV dans PostgreSQL")
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="ignore les fichiers inchangés et n'importe que les lignes nouvelles ou modifiées"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=2,
+        help="nombre de fichiers importés simultanément (une connexion chacun)"
+    )
+    parser.add_argument(
+        "--repair-next-due", action="store_true",
+        help="recalcule la prochaine échéance de tous les plans, sans rien importer"
+    )
+    parser.add_argument(
+        "--archive-before", type=int, metavar="ANNÉE",
+        help="détache les partitions de maint_jobs des années antérieures, sans rien importer"
+    )
+    args = parser.parse_args()
     os.makedirs(FILES_FOLDER, exist_ok=True)
     
+    wait_for_postgres()
+    try:
+        pool = ThreadedConnectionPool(1, max(args.workers, 1), **DB_CONFIG)
+        print("✅ Connecté à PostgreSQL")
+    except Exception as e:
+        print(f"❌ Erreur de connexion: {e}")
+        sys.exit(1)
+    
     try:
-        import_matrice()
-        import_param()
-        import_vidange()
-        import_curatif()
+        if args.repair_next_due:
+            repair_next_due(pool)
+            sys.exit(0)
+        if args.archive_before:
+            archive_job_partitions(pool, args.archive_before)
+            sys.exit(0)
         
-        print("\n📅 Recalcul des prochaines échéances...")
-        cur.execute("""
-            UPDATE maint_plans p
-            SET next_due_dt = (
-                SELECT MAX(j.done_dt) + INTERVAL '1 day' * (p.every_months * 30)
-                FROM maint_jobs j
-                WHERE j.plan_id = p.id AND j.done_dt IS NOT NULL
-            )
-            WHERE p.every_months IS NOT NULL;
-        """)
-        conn.commit()
+        started = time.perf_counter()
+        results = import_all(pool, args.incremental, max(args.workers, 1))
+        split_job_partitions(pool)
+        forecast_usage(pool)
+        print_timings(results, time.perf_counter() - started)
+        
+        if args.incremental and not any(changed for changed, _ in results.values()):
+            print("\n✅ Aucun changement depuis le dernier import")
+            sys.exit(0)
         
+        # Les prochaines échéances des plans touchés sont tenues à jour par les
+        # triggers de maint_jobs (schema.sql) : pas de recalcul global ici
         print("\n✅✅✅ IMPORT TOTAL TERMINÉ AVEC SUCCÈS !")
         
     except Exception as e:
         print(f"\n❌ ERREUR FATALE: {e}")
         import traceback
         traceback.print_exc()
-        conn.rollback()
     finally:
-        cur.close()
-        conn.close()
\ No newline at end of file
+        pool.closeall()
@@ -1,7 +1,44 @@
 # maintenance_scheduler.py → VERSION FINALE AVEC EXCLUSIONS PAR CATÉGORIE
+import functools
+import hashlib
+import io
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 
+from usage_forecast import FORECAST_COLUMNS, forecast_fleet, project_due
+
+# Colonnes du calendrier généré (ordre conservé pour l'affichage et les exports)
+SCHEDULE_COLUMNS = [
+    'matricule', 'engin', 'catégorie', 'date', 'année', 'opération', 'type',
+    'type_nom', 'intervalle_jours'
+]
+
+# Forme compacte : les attributs d'engin sont dans une table annexe
+COMPACT_COLUMNS = [
+    'matricule', 'date', 'année', 'opération', 'type', 'type_nom',
+    'intervalle_jours'
+]
+ASSET_COLUMNS = ['matricule', 'engin', 'catégorie']
+# Visites (group_visits) : une ligne par engin et par jour
+VISIT_COLUMNS = [
+    'matricule', 'engin', 'catégorie', 'date', 'année', 'type', 'type_nom',
+    'opérations', 'nb_opérations'
+]
+# Échéances de NextDueIndex : colonnes du calendrier + série, jours restants, statut
+NEXT_DUE_COLUMNS = SCHEDULE_COLUMNS + ['série', 'jours', 'statut']
+
+SCHEDULE_CACHE_DIR = "data/schedule_cache"
+# À incrémenter dès que le contenu ou le format du calendrier change
+SCHEDULE_FORMAT_VERSION = 5
+
 
 class MaintenanceScheduler:
     # === Liste officielle des 22 opérations (ordre respecté) ===
@@ -63,28 +100,100 @@ class MaintenanceScheduler:
     TYPE_MAP = {'C': 'Contrôle', 'N': 'Nettoyage', 'CH': 'Changement'}
     PRIORITY = {'CH': 3, 'N': 2, 'C': 1}
 
-    def __init__(self, param_csv="import/Param.csv"):
+    # === Colonnes facultatives de Param.csv (comme maint_plans) : période au
+    # compteur d'une opération, en km, ou en heures pour un compteur horaire ===
+    USAGE_COLUMNS = {'km': 'every_km', 'h': 'every_hours'}
+
+    def __init__(self,
+                 param_csv="import/Param.csv",
+                 matrice_csv="import/MATRICE.csv",
+                 vidange_csv=None):
+        self.matrice_csv = matrice_csv
+        self.vidange_csv = vidange_csv
+        self._assets = None
+        self._usage = None
         self.param_df = pd.read_csv(param_csv,
                                     encoding='cp1252',
                                     sep=';',
                                     dtype=str).fillna('')
         self.rules = self._extract_rules()
+        self.usage_periods = self._extract_usage_periods()
+        self._compile_exclusions()
+
+    @property
+    def assets(self):
+        """Parc d'engins (MATRICE.csv), chargé à la première utilisation"""
+        if self._assets is None:
+            self._assets = pd.read_csv(self.matrice_csv,
+                                       encoding='cp1252',
+                                       sep=';')
+        return self._assets
+
+    @property
+    def usage(self):
+        """Rythme d'usage de chaque engin (usage_forecast), vide sans VIDANGE.csv"""
+        if self._usage is None:
+            if self.vidange_csv and os.path.exists(self.vidange_csv):
+                vidange = pd.read_csv(self.vidange_csv,
+                                      encoding='cp1252',
+                                      sep=';',
+                                      dtype=str)
+                asset_types = dict(
+                    zip(self._clean_column(self.assets, 'matricule'),
+                        self._clean_column(self.assets, 'categorie')))
+                self._usage = forecast_fleet(vidange, asset_types)
+            else:
+                self._usage = pd.DataFrame(columns=FORECAST_COLUMNS)
+        return self._usage
+
+    def usage_due(self):
+        """Échéances au compteur projetées, par engin et opération de `usage_periods`"""
+        frames = [
+            project_due(self.usage, periods['km'],
+                        periods['h']).assign(opération=operation)
+            for operation, periods in self.usage_periods.items()
+        ]
+        if not frames:
+            return pd.DataFrame(columns=FORECAST_COLUMNS +
+                                ['intervalle_jours', 'échéance', 'opération'])
+        return pd.concat(frames, ignore_index=True)
+
+    def _match_operation(self, row):
+        """Opération officielle (ALL_OPERATIONS) d'une ligne de Param.csv, ou None"""
+        operation_raw = str(row.get('Opération « poste intervention »',
+                                    '')).strip()
+        if not operation_raw:
+            return None
+        operation_clean = operation_raw.split(' (')[0].strip().lower()
+        return next((
+            op for op in self.ALL_OPERATIONS
+            if op.lower() in operation_clean or operation_clean in op.lower()),
+                    None)
+
+    def _extract_usage_periods(self):
+        """Périodes au compteur par opération (colonnes every_km / every_hours).
+
+        Au rythme estimé de l'engin (usage_forecast), la période remplace
+        l'intervalle de Param.csv quand elle tombe plus tôt. Sans ces
+        colonnes, le calendrier ne suit que les intervalles.
+        """
+        periods = {}
+        for _, row in self.param_df.iterrows():
+            operation = self._match_operation(row)
+            values = {}
+            for unit, col in self.USAGE_COLUMNS.items():
+                value = pd.to_numeric(str(row.get(col, '')).strip(),
+                                      errors='coerce')
+                values[unit] = int(value) if value > 0 else None
+            if operation and any(values.values()):
+                periods[operation] = values
+        return periods
 
     def _extract_rules(self):
         rules = []
         for _, row in self.param_df.iterrows():
-            operation_raw = str(row.get('Opération « poste intervention »',
-                                        '')).strip()
-            if not operation_raw:
-                continue
-
-            operation_clean = operation_raw.split(' (')[0].strip().lower()
-
             # Trouver l'opération officielle correspondante
-            matched_op = next(
-                (op
-                 for op in self.ALL_OPERATIONS if op.lower() in operation_clean
-                 or operation_clean in op.lower()), None)
+            matched_op = self._match_operation(row)
             if not matched_op:
                 continue
 
@@ -114,12 +223,64 @@ class MaintenanceScheduler:
                         })
         return rules
 
+    @staticmethod
+    def _normalize_category(categorie):
+        return str(categorie).strip().lower()
+
+    def _compile_exclusions(self):
+        """Pré-calcule la matrice clé d'exclusion × opération (une fois)"""
+        self.operations = list(
+            dict.fromkeys(self.ALL_OPERATIONS +
+                          [r['operation'] for r in self.rules]))
+        self._op_index = {op: i for i, op in enumerate(self.operations)}
+        self._exclusion_keys = list(self.EXCLUSIONS)
+        self.exclusion_matrix = pd.DataFrame([[
+            any(ex.lower() in op.lower() for ex in excluded_ops)
+            for op in self.operations
+        ] for excluded_ops in self.EXCLUSIONS.values()],
+                                             index=self._exclusion_keys,
+                                             columns=self.operations,
+                                             dtype=bool)
+        self._category_masks = {}
+
+    def _category_mask(self, categorie):
+        """Vecteur booléen des opérations applicables pour une catégorie"""
+        cat_lower = self._normalize_category(categorie)
+        mask = self._category_masks.get(cat_lower)
+        if mask is None:
+            keys = [key in cat_lower for key in self._exclusion_keys]
+            excluded = self.exclusion_matrix.to_numpy()[keys].any(axis=0)
+            mask = ~excluded
+            self._category_masks[cat_lower] = mask
+        return mask
+
+    def applicability_mask(self, categories):
+        """Matrice catégorie normalisée × opération (True = applicable)"""
+        normalized = list(
+            dict.fromkeys(self._normalize_category(c) for c in categories))
+        return pd.DataFrame([self._category_mask(c) for c in normalized],
+                            index=pd.Index(normalized, name='catégorie'),
+                            columns=self.operations,
+                            dtype=bool)
+
+    def unmatched_categories(self, categories):
+        """Catégories du parc qui ne correspondent à aucune clé d'exclusion"""
+        unmatched = {
+            str(c).strip()
+            for c in categories if not any(key in self._normalize_category(c)
+                                           for key in self._exclusion_keys)
+        }
+        return sorted(unmatched)
+
     def _is_excluded(self, operation, categorie):
         """Retourne True si l'opération est exclue pour cette catégorie"""
         if not categorie:
             return False
-        cat_lower = categorie.strip().lower()
+        op_idx = self._op_index.get(operation)
+        if op_idx is not None:
+            return not self._category_mask(categorie)[op_idx]
 
+        cat_lower = self._normalize_category(categorie)
         for key, excluded_ops in self.EXCLUSIONS.items():
             if key in cat_lower:
                 if any(ex.lower() in operation.lower() for ex in excluded_ops):
@@ -130,68 +291,1140 @@ class MaintenanceScheduler:
                                     asset_row,
                                     start_year=2026,
                                     end_year=2028):
-        start_date = datetime(start_year, 1, 1)
-        end_date = datetime(end_year, 12, 31)
-        results = []
-        categorie = str(asset_row.get('categorie', '')).strip()
+        asset_df = pd.DataFrame([dict(asset_row)])
+        schedule = self.generate_schedule(asset_df, start_year, end_year)
+        schedule['date'] = schedule['date'].dt.date
+        return schedule.astype(object).to_dict('records')
 
-        for rule in self.rules:
-            operation = rule['operation']
+    def generate_schedule(self,
+                          matrice_df,
+                          start_year=2026,
+                          end_year=2028,
+                          anchor_year=None,
+                          compact=False,
+                          merge=True):
+        """Calendrier de tout le parc en un seul passage vectorisé.
 
-            # EXCLUSION PAR CATÉGORIE
-            if self._is_excluded(operation, categorie):
-                continue  # On saute cette opération pour cet engin
+        Croise les engins avec les règles applicables puis construit toutes
+        les séries de dates d'un coup (datetime64) au lieu d'une boucle par
+        engin, par règle et par occurrence. Les séries partent du 1er janvier
+        de `anchor_year` (par défaut `start_year`).
 
-            current = start_date
-            delta = timedelta(days=rule['interval_days'])
+        Avec `compact=True`, renvoie la forme compacte (COMPACT_COLUMNS) à
+        joindre au besoin avec `asset_table()` via `with_assets()`. Avec
+        `merge=False`, les occurrences du même jour ne sont pas fusionnées
+        (une ligne par série, voir merge_same_day).
+        """
+        start_date = np.datetime64(f'{start_year:04d}-01-01', 'D')
+        end_date = np.datetime64(f'{end_year:04d}-12-31', 'D')
+        anchor_date = start_date if anchor_year is None else np.datetime64(
+            f'{anchor_year:04d}-01-01', 'D')
+        schedule = self._expand(matrice_df,
+                                start_date,
+                                end_date,
+                                anchor_date,
+                                merge=merge)
+        if compact:
+            return schedule
+        return with_assets(schedule, self.asset_table(matrice_df))
 
-            while current <= end_date:
-                results.append({
-                    'matricule':
-                    str(asset_row.get('matricule', '')).strip(),
-                    'engin':
-                    str(asset_row.get('designation', '')).strip(),
-                    'catégorie':
-                    categorie,
-                    'date':
-                    current.date(),
-                    'année':
-                    current.year,
-                    'opération':
-                    operation,
-                    'type':
-                    rule['type'],
-                    'type_nom':
-                    rule['type_name'],
-                    'intervalle_jours':
-                    rule['interval_days']
-                })
-                current += delta
+    def generate_schedule_parallel(self,
+                                   matrice_df,
+                                   start_year=2026,
+                                   end_year=2028,
+                                   anchor_year=None,
+                                   compact=False,
+                                   workers=None,
+                                   shard_size=None,
+                                   merge=True):
+        """Comme generate_schedule, réparti sur plusieurs processus.
+
+        Le parc est découpé en lots d'engins consécutifs générés dans un
+        ProcessPoolExecutor de `workers` processus (par défaut un par cœur),
+        puis concaténés dans l'ordre des lots : le résultat est identique à
+        la génération sur un seul cœur.
+        """
+        workers = workers or os.cpu_count() or 1
+        if shard_size is None:
+            shard_size = max(-(-len(matrice_df) // (workers * 4)), 1)
+        shards = [
+            matrice_df.iloc[i:i + shard_size]
+            for i in range(0, len(matrice_df), shard_size)
+        ]
+        if workers <= 1 or len(shards) <= 1:
+            return self.generate_schedule(matrice_df, start_year, end_year,
+                                          anchor_year, compact, merge)
+        # Rythmes d'usage estimés une fois ici, copiés avec l'ordonnanceur
+        self.usage
+
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=_init_worker,
+                                 initargs=(self, )) as pool:
+            frames = list(
+                pool.map(_generate_shard, shards,
+                         [(start_year, end_year, anchor_year, merge)] *
+                         len(shards)))
+
+        schedule = pd.concat([f.drop(columns='matricule') for f in frames],
+                             ignore_index=True)
+        schedule.insert(
+            0, 'matricule',
+            pd.api.types.union_categoricals([f['matricule'] for f in frames]))
+        if compact:
+            return schedule
+        return with_assets(schedule, self.asset_table(matrice_df))
+
+    def occurrences_between(self,
+                            start,
+                            end,
+                            matricules=None,
+                            types=None,
+                            anchor_year=None,
+                            matrice_df=None,
+                            compact=False,
+                            merge=True,
+                            series=None):
+        """Occurrences comprises dans [start, end] (bornes incluses).
+
+        Chaque règle étant une série à pas fixe depuis le 1er janvier de
+        `anchor_year` (par défaut l'année de `start`), les occurrences de la
+        fenêtre sont calculées directement : le coût dépend de la taille de
+        la fenêtre et non du nombre d'années couvertes. `series` (résultat de
+        `series()` sur `matrice_df`, éventuellement restreint par
+        take_series) évite de recalculer les séries à chaque appel.
+        """
+        start_date = np.datetime64(pd.Timestamp(start).date(), 'D')
+        end_date = np.datetime64(pd.Timestamp(end).date(), 'D')
+        if anchor_year is None:
+            anchor_year = pd.Timestamp(start).year
+        anchor_date = np.datetime64(f'{anchor_year:04d}-01-01', 'D')
+        if matrice_df is None:
+            matrice_df = self.assets
+        schedule = self._expand(matrice_df, start_date, end_date, anchor_date,
+                                matricules, types, merge, series)
+        if compact:
+            return schedule
+        return with_assets(schedule, self.asset_table(matrice_df))
+
+    @staticmethod
+    def _clean_column(matrice_df, col):
+        values = matrice_df[col] if col in matrice_df else pd.Series(
+            [''] * len(matrice_df), dtype=object)
+        return np.array([str(v).strip() for v in values], dtype=object)
+
+    def asset_table(self, matrice_df=None):
+        """Table annexe des attributs d'engin (une ligne par matricule)"""
+        if matrice_df is None:
+            matrice_df = self.assets
+        assets = pd.DataFrame(
+            {
+                'matricule': self._clean_column(matrice_df, 'matricule'),
+                'engin': self._clean_column(matrice_df, 'designation'),
+                'catégorie': self._clean_column(matrice_df, 'categorie'),
+            },
+            columns=ASSET_COLUMNS)
+        return assets.drop_duplicates('matricule').reset_index(drop=True)
+
+    def series(self, matrice_df, matricules=None, types=None):
+        """Séries (engin, règle) applicables, et tables des règles en tableaux.
+
+        `asset_idx` / `rule_idx` donnent, pour chaque série, la ligne de
+        l'engin dans `matrice_df` et le numéro de la règle dans `self.rules`.
+        """
+        asset_matricules = self._clean_column(matrice_df, 'matricule')
+        categories = self._clean_column(matrice_df, 'categorie')
+        mat_codes, mat_uniques = pd.factorize(
+            pd.Series(asset_matricules, dtype=object))
+
+        operations = np.array([r['operation'] for r in self.rules],
+                              dtype=object)
+        rule_cols = np.array([self._op_index[op] for op in operations],
+                             dtype=np.int64)
+        rule_types = np.array([r['type'] for r in self.rules], dtype=object)
+        type_codes = np.array(
+            [list(self.TYPE_MAP).index(t) for t in rule_types], dtype=np.int8)
+        intervals = np.array([r['interval_days'] for r in self.rules],
+                             dtype=np.int64)
+
+        # Engins × règles : masque d'applicabilité par catégorie
+        cat_codes, cat_uniques = pd.factorize(
+            pd.Series([self._normalize_category(c) for c in categories],
+                      dtype=object))
+        cat_masks = np.array([self._category_mask(c) for c in cat_uniques],
+                             dtype=bool).reshape(len(cat_uniques),
+                                                 len(self.operations))
+        mask = cat_masks[cat_codes][:, rule_cols]
+        if matricules is not None:
+            mask &= np.isin(asset_matricules, list(matricules))[:, None]
+        if types is not None:
+            mask &= np.isin(rule_types, list(types))[None, :]
+        asset_idx, rule_idx = np.nonzero(mask)
+
+        # Séries au compteur : intervalle au rythme de l'engin s'il est plus
+        # court, à partir de son dernier relevé (NaT pour les autres séries)
+        series_intervals = intervals[rule_idx]
+        usage_anchor = np.full(len(rule_idx),
+                               np.datetime64('NaT'),
+                               dtype='datetime64[D]')
+        usage = self.usage_due()
+        if len(usage) and len(rule_idx):
+            per_series = usage.set_index(['matricule', 'opération']).reindex(
+                pd.MultiIndex.from_arrays([
+                    np.asarray(mat_uniques,
+                               dtype=object)[mat_codes[asset_idx]],
+                    operations[rule_idx]
+                ]))
+            days = per_series['intervalle_jours'].to_numpy(dtype=float)
+            override = days < series_intervals
+            series_intervals = np.where(override, days,
+                                        series_intervals).astype(np.int64)
+            usage_anchor[override] = per_series['dernier_relevé'].to_numpy(
+                dtype='datetime64[D]')[override]
+        return {
+            'mat_codes': mat_codes,
+            'mat_uniques': mat_uniques,
+            'rule_cols': rule_cols,
+            'type_codes': type_codes,
+            'intervals': intervals,
+            'asset_idx': asset_idx,
+            'rule_idx': rule_idx,
+            'series_intervals': series_intervals,
+            'usage_anchor': usage_anchor,
+        }
 
-        return results
+    def _expand(self,
+                matrice_df,
+                start_date,
+                end_date,
+                anchor_date,
+                matricules=None,
+                types=None,
+                merge=True,
+                series=None):
+        """Développe les séries (engin, règle) applicables sur [start, end].
+
+        Renvoie la forme compacte : textes répétés en colonnes catégorielles,
+        dates en datetime64 à la journée, entiers sur 16 bits. Avec `merge`,
+        les occurrences d'une même opération tombant le même jour sur un engin
+        sont fusionnées (voir merge_same_day), avant le filtre sur `types` :
+        une occurrence absorbée par un type plus prioritaire ne réapparaît pas
+        avec un filtre. Sans fusion, le filtre porte directement sur les séries.
+        """
+        if series is None:
+            series = self.series(matrice_df, matricules,
+                                 None if merge else types)
+        mat_codes, mat_uniques = series['mat_codes'], series['mat_uniques']
+        rule_cols, type_codes = series['rule_cols'], series['type_codes']
+        intervals = series['series_intervals']
+        asset_idx, rule_idx = series['asset_idx'], series['rule_idx']
+
+        # Ancre de chaque série : le 1er janvier d'ancrage, ou le dernier
+        # relevé d'une série au compteur (occurrences après ce relevé seulement)
+        usage = ~np.isnat(series['usage_anchor'])
+        anchors = np.where(usage, series['usage_anchor'],
+                           anchor_date).astype(np.int64)
+
+        # Nombre d'occurrences de chaque série dans la période
+        step = np.maximum(intervals, 1)
+        lead = start_date.astype(np.int64) - anchors
+        first = np.maximum(-(-lead // step), usage.astype(np.int64))
+        last = (end_date.astype(np.int64) - anchors) // step
+        counts = np.maximum(last - first + 1, 0)
+
+        row_series = np.repeat(np.arange(len(counts)), counts)
+        row_asset = asset_idx[row_series]
+        row_rule = rule_idx[row_series]
+        first_row = np.repeat(np.cumsum(counts) - counts, counts)
+        offsets = np.arange(len(row_series), dtype=np.int64) - first_row
+        dates = (anchors[row_series] + (first[row_series] + offsets) *
+                 intervals[row_series]).astype('datetime64[D]')
+
+        schedule = pd.DataFrame(
+            {
+                'matricule':
+                pd.Categorical.from_codes(mat_codes[row_asset],
+                                          categories=list(mat_uniques)),
+                'date':
+                dates,
+                'année':
+                (dates.astype('datetime64[Y]').astype(np.int64) + 1970).astype(
+                    np.int16),
+                'opération':
+                pd.Categorical.from_codes(rule_cols[row_rule],
+                                          categories=self.operations),
+                'type':
+                pd.Categorical.from_codes(type_codes[row_rule],
+                                          categories=list(self.TYPE_MAP)),
+                'type_nom':
+                pd.Categorical.from_codes(type_codes[row_rule],
+                                          categories=list(
+                                              self.TYPE_MAP.values())),
+                'intervalle_jours':
+                intervals[row_series].astype(np.int16),
+            },
+            columns=COMPACT_COLUMNS)
+        if not merge:
+            return schedule
+        schedule = merge_same_day(schedule)
+        if types is not None:
+            schedule = schedule[schedule['type'].isin(
+                list(types))].reset_index(drop=True)
+        return schedule
+
+
+# Ordonnanceur propre à chaque processus de génération parallèle
+_WORKER_SCHEDULER = None
+
+
+def _init_worker(scheduler):
+    global _WORKER_SCHEDULER
+    _WORKER_SCHEDULER = scheduler
+
+
+def _generate_shard(matrice_chunk, options):
+    start_year, end_year, anchor_year, merge = options
+    return _WORKER_SCHEDULER.generate_schedule(matrice_chunk,
+                                               start_year,
+                                               end_year,
+                                               anchor_year,
+                                               compact=True,
+                                               merge=merge)
+
+
+def take_series(series, positions):
+    """Séries restreintes aux positions données (tables des règles gardées)"""
+    return {
+        **series,
+        **{
+            key: series[key][positions]
+            for key in ('asset_idx', 'rule_idx', 'series_intervals', 'usage_anchor')
+        }
+    }
+
+
+def with_assets(schedule, assets):
+    """Joint les attributs d'engin (engin, catégorie) à un calendrier compact"""
+    lookup = assets.drop_duplicates('matricule').set_index('matricule')
+    matricules = schedule['matricule'].astype('category')
+    codes = matricules.cat.codes.to_numpy()
+    per_category = lookup.reindex(matricules.cat.categories)
+
+    joined = {}
+    for col in ASSET_COLUMNS[1:]:
+        col_codes, col_uniques = pd.factorize(per_category[col])
+        joined[col] = pd.Categorical.from_codes(np.where(
+            codes >= 0, col_codes[codes], -1),
+                                                categories=col_uniques)
+
+    out = schedule.assign(**joined)
+    return out[SCHEDULE_COLUMNS]
+
+
+def sort_positions(df, column, descending=False):
+    """Positions des lignes de `df` triées sur `column` (tri stable).
+
+    Une colonne catégorielle est triée sur ses libellés et non sur ses codes,
+    dont l'ordre suit celui des CSV ; les valeurs manquantes sont à la fin.
+    """
+    values = df[column]
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        labels = np.asarray(values.cat.categories.astype(str), dtype=str)
+        rank = np.empty(len(labels))
+        rank[np.argsort(labels, kind='stable')] = np.arange(len(labels))
+        codes = values.cat.codes.to_numpy()
+        values = np.where(codes >= 0, rank[codes], np.nan)
+    keys = pd.Series(np.asarray(values))
+    return keys.sort_values(ascending=not descending,
+                            kind='stable',
+                            na_position='last').index.to_numpy()
+
+
+def _priorities(types):
+    """Priorité (MaintenanceScheduler.PRIORITY) de chaque ligne, 0 si type inconnu"""
+    types = pd.Categorical(types)
+    by_code = np.array(
+        [MaintenanceScheduler.PRIORITY.get(t, 0)
+         for t in types.categories] + [0],
+        dtype=np.int64)
+    return by_code[types.codes]
+
+
+def _codes(values):
+    return pd.Categorical(values).codes.astype(np.int64)
+
+
+def _group_starts(sorted_keys):
+    """Masque des premières lignes de chaque groupe, clés déjà triées"""
+    starts = np.ones(len(sorted_keys[0]), dtype=bool)
+    if len(starts):
+        starts[1:] = np.any([key[1:] != key[:-1] for key in sorted_keys],
+                            axis=0)
+    return starts
+
+
+def merge_same_day(schedule):
+    """Une ligne par (engin, opération, jour) : les occurrences simultanées fusionnent.
+
+    La ligne gardée est celle du type le plus prioritaire (CH > N > C), puis
+    de l'intervalle le plus long : l'entretien le plus complet couvre les
+    contrôles plus fréquents du même jour. L'ordre des lignes est conservé.
+    """
+    if schedule.empty:
+        return schedule
+    kept = _same_day_kept(schedule)
+    if len(kept) == len(schedule):
+        return schedule
+    return schedule.iloc[kept].reset_index(drop=True)
+
+
+def _same_day_kept(schedule):
+    """Positions (croissantes) des lignes gardées par merge_same_day"""
+    keys = [
+        _codes(schedule['matricule']),
+        schedule['date'].to_numpy().astype('datetime64[D]').astype(np.int64),
+        _codes(schedule['opération'])
+    ]
+    order = np.lexsort((-schedule['intervalle_jours'].to_numpy(dtype=np.int64),
+                        -_priorities(schedule['type'])) +
+                       tuple(reversed(keys)))
+    return np.sort(order[_group_starts([key[order] for key in keys])])
+
+
+def group_visits(schedule):
+    """Une visite par engin et par jour, regroupant toutes ses opérations.
+
+    Le type de la visite est le plus prioritaire de ses opérations ; les
+    opérations sont listées dans `opérations` (la plus prioritaire d'abord)
+    et comptées dans `nb_opérations`. Les visites sont triées par date.
+    """
+    columns = [
+        col for col in VISIT_COLUMNS
+        if col in schedule or col in ('opérations', 'nb_opérations')
+    ]
+    if schedule.empty:
+        return pd.DataFrame(columns=columns)
+    keys = [
+        schedule['date'].to_numpy().astype('datetime64[D]').astype(np.int64),
+        _codes(schedule['matricule'])
+    ]
+    order = np.lexsort((-_priorities(schedule['type']), ) +
+                       tuple(reversed(keys)))
+    starts = _group_starts([key[order] for key in keys])
+    first = order[starts]
+
+    # Seule boucle Python : la liste des opérations de chaque visite
+    operations = pd.Categorical(schedule['opération'])
+    operations = np.asarray(operations.categories.astype(str),
+                            dtype=object)[operations.codes[order]].tolist()
+    bounds = np.flatnonzero(starts)
+    ends = np.append(bounds, len(order))
+    labels = [
+        ', '.join(operations[start:end])
+        for start, end in zip(ends[:-1].tolist(), ends[1:].tolist())
+    ]
+
+    visits = schedule.iloc[first][[col for col in columns if col in schedule]]
+    visits = visits.assign(opérations=labels, nb_opérations=np.diff(ends))
+    return visits[columns].reset_index(drop=True)
 
 
 def create_complete_maintenance_schedule(matrice_csv="import/MATRICE.csv",
                                          param_csv="import/Param.csv",
                                          start_year=2026,
-                                         end_year=2028):
+                                         end_year=2028,
+                                         workers=1,
+                                         vidange_csv="import/VIDANGE.csv",
+                                         merge=True):
     matrice_df = pd.read_csv(matrice_csv, encoding='cp1252', sep=';')
-    scheduler = MaintenanceScheduler(param_csv)
+    scheduler = MaintenanceScheduler(param_csv, matrice_csv, vidange_csv)
 
     print(f"{len(scheduler.rules)} règles de base détectées")
-    all_results = []
-
-    for _, asset in matrice_df.iterrows():
-        all_results.extend(
-            scheduler.generate_schedule_for_asset(asset, start_year, end_year))
-
-    df = pd.DataFrame(all_results)
+    unmatched = scheduler.unmatched_categories(
+        matrice_df.get('categorie', pd.Series(dtype=object)).dropna())
+    if unmatched:
+        print(f"Catégories sans exclusion : {', '.join(unmatched)}")
+    if workers == 1:
+        df = scheduler.generate_schedule(matrice_df,
+                                         start_year,
+                                         end_year,
+                                         merge=merge)
+    else:
+        df = scheduler.generate_schedule_parallel(matrice_df,
+                                                  start_year,
+                                                  end_year,
+                                                  workers=workers,
+                                                  merge=merge)
     print(
         f"Calendrier final généré : {len(df):,} entretiens programmés (exclusions appliquées)"
     )
     return df
 
 
+@functools.lru_cache(maxsize=32)
+def _hash_file(path, mtime_ns, size):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _file_digest(path):
+    """Empreinte du contenu, recalculée seulement si mtime/taille changent"""
+    stat = os.stat(path)
+    return _hash_file(os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+class ScheduleCache:
+    """Cache disque du calendrier, partitionné par année (parquet).
+
+    La clé est une empreinte de Param.csv, MATRICE.csv, VIDANGE.csv (rythmes
+    d'usage), des tables de règles (EXCLUSIONS, opérations, types, colonnes
+    des périodes au compteur), de la fusion des occurrences du même jour
+    (`merge`, voir merge_same_day) et de l'année d'ancrage des séries : toute
+    modification invalide automatiquement le cache. Les versions périmées et
+    les partitions les moins récemment utilisées sont évincées (LRU).
+
+    Arborescence : <cache_dir>/<empreinte>/<ancrage>_<année>.parquet
+    """
+
+    def __init__(self,
+                 cache_dir=SCHEDULE_CACHE_DIR,
+                 matrice_csv="import/MATRICE.csv",
+                 param_csv="import/Param.csv",
+                 max_versions=3,
+                 max_partitions=64,
+                 workers=1,
+                 vidange_csv="import/VIDANGE.csv",
+                 merge=True):
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.merge = merge
+        self.matrice_csv = matrice_csv
+        self.param_csv = param_csv
+        self.vidange_csv = vidange_csv
+        self.max_versions = max_versions
+        self.max_partitions = max_partitions
+        self._scheduler = None
+        self._scheduler_digest = None
+
+    def digest(self):
+        h = hashlib.sha256()
+        h.update(str(SCHEDULE_FORMAT_VERSION).encode())
+        h.update(_file_digest(self.param_csv).encode())
+        h.update(_file_digest(self.matrice_csv).encode())
+        if self.vidange_csv and os.path.exists(self.vidange_csv):
+            h.update(_file_digest(self.vidange_csv).encode())
+        h.update(
+            json.dumps(
+                {
+                    'exclusions': MaintenanceScheduler.EXCLUSIONS,
+                    'operations': MaintenanceScheduler.ALL_OPERATIONS,
+                    'types': MaintenanceScheduler.TYPE_MAP,
+                    'usage': MaintenanceScheduler.USAGE_COLUMNS,
+                    'merge': self.merge,
+                },
+                sort_keys=True,
+                ensure_ascii=False).encode())
+        return h.hexdigest()[:16]
+
+    def _partition_path(self, digest, anchor_year, year):
+        return os.path.join(self.cache_dir, digest,
+                            f"{anchor_year}_{year}.parquet")
+
+    def load(self,
+             start_year=2026,
+             end_year=2028,
+             anchor_year=None,
+             compact=False):
+        """Calendrier [start_year, end_year], ne générant que les années absentes.
+
+        Les partitions sont stockées sous forme compacte ; avec `compact=False`
+        les attributs d'engin sont joints au moment du chargement.
+        """
+        anchor_year = start_year if anchor_year is None else anchor_year
+        digest = self.digest()
+        years = list(range(start_year, end_year + 1))
+
+        frames = {}
+        missing = []
+        for year in years:
+            path = self._partition_path(digest, anchor_year, year)
+            try:
+                part = pd.read_parquet(path)
+                part['date'] = part['date'].astype('datetime64[s]')
+                frames[year] = part
+                os.utime(path)
+            except (OSError, ImportError, ValueError):
+                missing.append(year)
+
+        if missing:
+            generated = self._generate(digest, min(missing), max(missing),
+                                       anchor_year)
+            for year in missing:
+                part = generated[generated['année'] == year].reset_index(
+                    drop=True)
+                frames[year] = part
+                self._store(self._partition_path(digest, anchor_year, year),
+                            part)
+            self._evict(digest)
+        elif os.path.isdir(os.path.join(self.cache_dir, digest)):
+            os.utime(os.path.join(self.cache_dir, digest))
+
+        if years:
+            schedule = pd.concat([frames[year] for year in years],
+                                 ignore_index=True)
+        else:
+            schedule = pd.DataFrame(columns=COMPACT_COLUMNS)
+        if compact:
+            return schedule
+        return with_assets(schedule, self.assets())
+
+    def assets(self):
+        """Table annexe des attributs d'engin (voir with_assets)"""
+        return self.scheduler().asset_table()
+
+    def scheduler(self, digest=None):
+        """MaintenanceScheduler à jour des fichiers CSV courants"""
+        digest = self.digest() if digest is None else digest
+        if self._scheduler is None or self._scheduler_digest != digest:
+            self._scheduler = MaintenanceScheduler(self.param_csv,
+                                                   self.matrice_csv,
+                                                   self.vidange_csv)
+            self._scheduler_digest = digest
+        return self._scheduler
+
+    def _generate(self, digest, start_year, end_year, anchor_year):
+        scheduler = self.scheduler(digest)
+        if self.workers == 1:
+            return scheduler.generate_schedule(scheduler.assets,
+                                               start_year,
+                                               end_year,
+                                               anchor_year,
+                                               compact=True,
+                                               merge=self.merge)
+        return scheduler.generate_schedule_parallel(scheduler.assets,
+                                                    start_year,
+                                                    end_year,
+                                                    anchor_year,
+                                                    compact=True,
+                                                    workers=self.workers,
+                                                    merge=self.merge)
+
+    def _store(self, path, df):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+        except (OSError, ImportError):
+            # pyarrow absent, dossier en lecture seule ou plein : le calendrier
+            # reste servi depuis la mémoire, sans cache disque
+            pass
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _evict(self, current):
+        """Supprime les versions périmées puis les partitions les plus anciennes"""
+        if not os.path.isdir(self.cache_dir):
+            return
+        by_lru = lambda entry: entry.stat().st_mtime_ns
+        stale = sorted((entry for entry in os.scandir(self.cache_dir)
+                        if entry.is_dir() and entry.name != current),
+                       key=by_lru,
+                       reverse=True)
+        for entry in stale[max(self.max_versions - 1, 0):]:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+        current_dir = os.path.join(self.cache_dir, current)
+        if not os.path.isdir(current_dir):
+            return
+        partitions = sorted((entry for entry in os.scandir(current_dir)
+                             if entry.name.endswith('.parquet')),
+                            key=by_lru,
+                            reverse=True)
+        for entry in partitions[self.max_partitions:]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+def load_maintenance_schedule(matrice_csv="import/MATRICE.csv",
+                              param_csv="import/Param.csv",
+                              start_year=2026,
+                              end_year=2028,
+                              anchor_year=None,
+                              cache_dir=SCHEDULE_CACHE_DIR,
+                              vidange_csv="import/VIDANGE.csv",
+                              merge=True):
+    """Comme create_complete_maintenance_schedule, via le cache disque"""
+    cache = ScheduleCache(cache_dir,
+                          matrice_csv,
+                          param_csv,
+                          vidange_csv=vidange_csv,
+                          merge=merge)
+    return cache.load(start_year, end_year, anchor_year)
+
+
+class ScheduleIndex:
+    """Calendrier pluriannuel gardé une seule fois en mémoire (process de l'API).
+
+    Chaque année est lue depuis le ScheduleCache (ancrée au 1er janvier de
+    l'année, comme dans le dashboard), puis l'ensemble est trié par date :
+    une fenêtre [start, end] se trouve par recherche dichotomique et les
+    filtres matricule / catégorie portent sur la table des engins, pas sur
+    chaque ligne. L'index est reconstruit si les CSV changent. Au plus
+    `max_years` années sont gardées : au-delà, les moins récemment demandées
+    sont évincées (LRU), jamais celles de la requête en cours.
+    """
+
+    def __init__(self, cache, years=range(2025, 2031), max_years=12):
+        self.cache = cache
+        self.default_years = list(years)
+        self.max_years = max_years
+        self._lock = threading.Lock()
+        self._digest = None
+        self._frames = OrderedDict()
+        self._schedule = None
+        self._dates = None
+        self._assets = None
+
+    def _ensure(self, years):
+        digest = self.cache.digest()
+        with self._lock:
+            if digest != self._digest:
+                self._digest = digest
+                self._frames = OrderedDict()
+                self._schedule = None
+            missing = [year for year in years if year not in self._frames]
+            for year in missing:
+                self._frames[year] = self.cache.load(year, year, compact=True)
+            for year in years:
+                self._frames.move_to_end(year)
+            evicted = max(
+                len(self._frames) - max(self.max_years, len(years)), 0)
+            for _ in range(evicted):
+                self._frames.popitem(last=False)
+            if missing or evicted or self._schedule is None:
+                schedule = pd.concat(
+                    [self._frames[year] for year in sorted(self._frames)],
+                    ignore_index=True)
+                schedule = schedule.sort_values(
+                    ['date', 'matricule', 'opération'],
+                    kind='stable').reset_index(drop=True)
+                self._schedule = schedule
+                self._dates = schedule['date'].to_numpy()
+                self._assets = self.cache.assets()
+            return self._schedule, self._dates, self._assets
+
+    def warm(self):
+        """Charge les années par défaut (à appeler au démarrage)"""
+        self._ensure(self.default_years)
+
+    def query(self,
+              start,
+              end,
+              matricule=None,
+              types=None,
+              categories=None,
+              offset=0,
+              limit=None,
+              sort='date',
+              descending=False,
+              years=None):
+        """Occurrences de [start, end] filtrées : (total, page avec attributs d'engin).
+
+        `matricule` est une recherche partielle insensible à la casse,
+        `types`, `categories` et `years` des listes de valeurs exactes (seules
+        les années demandées sont chargées). La page est découpée après le tri
+        sur la colonne `sort` (SCHEDULE_COLUMNS).
+        """
+        start = pd.Timestamp(start).normalize()
+        end = pd.Timestamp(end).normalize()
+        span = range(start.year, end.year + 1)
+        if years is not None:
+            span = sorted(set(span).intersection(years))
+        schedule, dates, assets = self._ensure(span)
+
+        first = np.searchsorted(dates, np.datetime64(start, 's'), side='left')
+        last = np.searchsorted(dates, np.datetime64(end, 's'), side='right')
+        window = schedule.iloc[first:last]
+
+        mask = np.ones(len(window), dtype=bool)
+        if matricule or categories:
+            per_code = assets.set_index('matricule').reindex(
+                window['matricule'].cat.categories)
+            selected = np.ones(len(per_code), dtype=bool)
+            if matricule:
+                selected &= per_code.index.str.contains(matricule,
+                                                        case=False,
+                                                        regex=False)
+            if categories:
+                selected &= per_code['catégorie'].isin(categories).to_numpy()
+            codes = window['matricule'].cat.codes.to_numpy()
+            mask &= (codes >= 0) & selected[codes]
+        if types:
+            mask &= window['type'].isin(types).to_numpy()
+        if years is not None:
+            mask &= window['année'].isin(span).to_numpy()
+
+        filtered = window[mask]
+        stop = None if limit is None else offset + limit
+        if sort == 'date' and not descending:
+            # Ordre de l'index : rien à trier
+            page = with_assets(filtered.iloc[offset:stop], assets)
+        elif sort in ASSET_COLUMNS[1:]:
+            filtered = with_assets(filtered, assets)
+            page = filtered.iloc[sort_positions(filtered, sort,
+                                                descending)[offset:stop]]
+        else:
+            page = with_assets(
+                filtered.iloc[sort_positions(filtered, sort,
+                                             descending)[offset:stop]], assets)
+        return len(filtered), page.reset_index(drop=True)
+
+
+class NextDueIndex:
+    """Prochaine échéance de chaque série (engin, règle), triée par date.
+
+    Les séries sont ancrées au 1er janvier de l'année en cours (au dernier
+    relevé pour une série au compteur, voir `usage_periods`). Chaque série
+    n'a qu'une entrée : sa prochaine occurrence à partir d'aujourd'hui, ou
+    `fait le + intervalle` si une réalisation a été enregistrée (éventuellement
+    passée, donc en retard). Les entrées sont rangées dans un tableau trié
+    sur la clé (jour, numéro de série) : une fenêtre ou une reprise après un
+    curseur est une recherche dichotomique, quel que soit le nombre de séries.
+
+    `mark_done` n'avance que les entrées concernées. L'index est reconstruit
+    au changement de jour ou des CSV ; les réalisations enregistrées sont
+    gardées (en mémoire seulement). Si le cache fusionne les occurrences du
+    même jour (`cache.merge`), les requêtes aussi : les séries d'une même
+    opération échues le même jour sur un engin ne donnent qu'une entrée,
+    comme dans le calendrier.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self._lock = threading.Lock()
+        self._version = None
+        self._state = None
+        # (matricule, opération, type) → date : l'intervalle d'une série au
+        # compteur change avec VIDANGE.csv, la réalisation reste valable
+        self._done = {}
+
+    @staticmethod
+    def _today():
+        return np.datetime64(datetime.now().date(), 'D')
+
+    def _build(self, digest, today):
+        scheduler = self.cache.scheduler(digest)
+        series = scheduler.series(scheduler.assets)
+        rule_idx = series['rule_idx']
+        matricules = np.asarray(
+            series['mat_uniques'],
+            dtype=object)[series['mat_codes'][series['asset_idx']]]
+        operations = np.array(scheduler.operations,
+                              dtype=object)[series['rule_cols'][rule_idx]]
+        types = np.array(list(scheduler.TYPE_MAP),
+                         dtype=object)[series['type_codes'][rule_idx]]
+        intervals = series['series_intervals']
+
+        anchor = np.datetime64(f'{today.astype(object).year:04d}-01-01', 'D')
+        step = np.maximum(intervals, 1)
+        lead = (today - anchor).astype(np.int64)
+        due = anchor.astype(np.int64) + -(-lead // step) * intervals
+        # Série au compteur : son dernier relevé vaut réalisation
+        usage = ~np.isnat(series['usage_anchor'])
+        due[usage] = series['usage_anchor'][usage].astype(
+            np.int64) + intervals[usage]
+        keys = list(zip(matricules, operations, types, intervals.tolist()))
+        lookup = {}
+        for position, key in enumerate(keys):
+            lookup.setdefault(key[:3], []).append(position)
+            done = self._done.get(key[:3])
+            if done is not None:
+                due[position] = done.astype(np.int64) + key[3]
+
+        # Attributs de chaque série, joints une fois ici plutôt qu'à chaque requête
+        assets = self.cache.assets().drop_duplicates('matricule').set_index(
+            'matricule').reindex(matricules)
+        columns = {
+            'matricule':
+            pd.Categorical(matricules),
+            'engin':
+            pd.Categorical(assets['engin']),
+            'catégorie':
+            pd.Categorical(assets['catégorie']),
+            'opération':
+            pd.Categorical.from_codes(series['rule_cols'][rule_idx],
+                                      categories=scheduler.operations),
+            'type':
+            pd.Categorical(types, categories=list(scheduler.TYPE_MAP)),
+            'type_nom':
+            pd.Categorical.from_codes(series['type_codes'][rule_idx],
+                                      categories=list(
+                                          scheduler.TYPE_MAP.values())),
+            'intervalle_jours':
+            intervals.astype(np.int16),
+        }
+        return {
+            'columns': columns,
+            'keys': keys,
+            'lookup': lookup,
+            'due': due,
+            'sorted': np.sort(due * len(keys) + np.arange(len(keys))),
+        }
+
+    def _ensure(self):
+        version = (self.cache.digest(), self._today())
+        with self._lock:
+            if version != self._version:
+                self._state = self._build(*version)
+                self._version = version
+            return self._state, version[1]
+
+    def warm(self):
+        self._ensure()
+
+    def query(self,
+              start,
+              end,
+              matricule=None,
+              types=None,
+              after=None,
+              limit=None):
+        """Échéances de [start, end] : (total, page triée par date puis série).
+
+        `after` = (date, série) du dernier élément reçu : la page reprend
+        juste après. La page a les colonnes du calendrier plus `série`,
+        `jours` (depuis aujourd'hui) et `statut` (overdue / planned).
+        """
+        state, today = self._ensure()
+        size = len(state['keys'])
+        day = lambda value: np.datetime64(pd.Timestamp(value).date(), 'D'
+                                          ).astype(np.int64)
+        keys = state['sorted']
+        first = np.searchsorted(keys, day(start) * size, side='left')
+        last = np.searchsorted(keys, (day(end) + 1) * size, side='left')
+        window = keys[first:last] % max(size, 1)
+
+        columns = state['columns']
+        if self.cache.merge and len(window):
+            # Fusion avant les filtres, comme MaintenanceScheduler._expand
+            window = window[_same_day_kept(
+                pd.DataFrame({
+                    'matricule':
+                    columns['matricule'].codes[window],
+                    'date':
+                    state['due'][window].astype('datetime64[D]'),
+                    'opération':
+                    columns['opération'].codes[window],
+                    'type':
+                    columns['type'].take(window),
+                    'intervalle_jours':
+                    columns['intervalle_jours'][window],
+                }))]
+        mask = np.ones(len(window), dtype=bool)
+        if matricule:
+            selected = columns['matricule'].categories.str.contains(
+                matricule, case=False, regex=False)
+            mask &= selected[columns['matricule'].codes[window]]
+        if types:
+            allowed = columns['type'].categories.isin(types)
+            mask &= allowed[columns['type'].codes[window]]
+        window = window[mask]
+        total = len(window)
+
+        if after is not None:
+            cursor = day(after[0]) * size + int(after[1])
+            positions = state['due'][window] * size + window
+            window = window[np.searchsorted(positions, cursor, side='right'):]
+        window = window[:limit]
+
+        due = state['due'][window]
+        dates = due.astype('datetime64[D]')
+        jours = due - today.astype(np.int64)
+        page = {col: values.take(window) for col, values in columns.items()}
+        page.update(date=dates.astype('datetime64[s]'),
+                    année=(dates.astype('datetime64[Y]').astype(np.int64) +
+                           1970).astype(np.int16),
+                    série=window,
+                    jours=jours,
+                    statut=np.where(jours < 0, 'overdue', 'planned'))
+        return total, pd.DataFrame(page, columns=NEXT_DUE_COLUMNS)
+
+    def mark_done(self, matricule, operation, done_dt, type=None):
+        """Enregistre une réalisation : n'avance que les séries concernées.
+
+        Renvoie les nouvelles échéances [(type, intervalle, date)], vide si
+        aucune série ne correspond.
+        """
+        self._ensure()
+        done = np.datetime64(pd.Timestamp(done_dt).date(), 'D')
+        types = [type] if type else list(MaintenanceScheduler.TYPE_MAP)
+        with self._lock:
+            state = self._state
+            positions = [
+                position for t in types
+                for position in state['lookup'].get((matricule, operation,
+                                                     t), [])
+            ]
+            if not positions:
+                return []
+            size = len(state['keys'])
+            positions = np.array(positions, dtype=np.int64)
+            intervals = np.array([state['keys'][p][3] for p in positions],
+                                 dtype=np.int64)
+            due = state['due'].copy()
+            old = due[positions] * size + positions
+            due[positions] = done.astype(np.int64) + intervals
+            new = np.sort(due[positions] * size + positions)
+            # Une suppression et une insertion groupées, quel que soit le nombre de séries
+            keys = np.delete(state['sorted'],
+                             np.searchsorted(state['sorted'], old))
+            keys = np.insert(keys, np.searchsorted(keys, new), new)
+            for position in positions.tolist():
+                self._done[state['keys'][position][:3]] = done
+            # Nouvel état publié d'un coup : les lectures en cours gardent l'ancien
+            self._state = dict(state, due=due, sorted=keys)
+        return [(state['keys'][p][2], state['keys'][p][3],
+                 due[p].astype('datetime64[D]').astype(object))
+                for p in positions.tolist()]
+
+
+def iter_schedule_chunks(cache,
+                         start_year=2026,
+                         end_year=2028,
+                         anchor_year=None,
+                         batch_size=None):
+    """Calendrier année par année (et par lots d'engins si `batch_size`)"""
+    anchor_year = start_year if anchor_year is None else anchor_year
+    assets = cache.assets()
+    for year in range(start_year, end_year + 1):
+        part = cache.load(year, year, anchor_year, compact=True)
+        if batch_size is None:
+            yield with_assets(part, assets)
+            continue
+        codes = part['matricule'].cat.codes.to_numpy()
+        n_matricules = len(part['matricule'].cat.categories)
+        for first in range(0, n_matricules, batch_size):
+            batch = part[(codes >= first) & (codes < first + batch_size)]
+            if len(batch):
+                yield with_assets(batch, assets)
+
+
+def iter_window_chunks(scheduler,
+                       start,
+                       end,
+                       types=None,
+                       batch_size=200,
+                       merge=True):
+    """Occurrences de la fenêtre [start, end], par lots d'engins
+
+    Les séries du parc sont calculées une fois, puis découpées par lot.
+    """
+    series = scheduler.series(scheduler.assets, types=None if merge else types)
+    assets = scheduler.asset_table()
+    codes = series['mat_codes'][series['asset_idx']]
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(
+        codes[order], np.arange(0,
+                                len(assets) + batch_size, batch_size))
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        if lo == hi:
+            continue
+        chunk = scheduler.occurrences_between(start,
+                                              end,
+                                              types=types,
+                                              compact=True,
+                                              merge=merge,
+                                              series=take_series(
+                                                  series, order[lo:hi]))
+        if len(chunk):
+            yield with_assets(chunk, assets)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Flux d'écriture qui accumule les octets jusqu'au prochain drain()"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_export(chunks,
+                  fmt='csv',
+                  sep=';',
+                  encoding='utf-8',
+                  date_format='%Y-%m-%d'):
+    """Sérialise une suite de DataFrames en morceaux d'octets (CSV ou Parquet).
+
+    Un seul morceau est en mémoire à la fois : un export pluriannuel d'un
+    grand parc se fait en mémoire constante (voir iter_schedule_chunks).
+    """
+    if fmt == 'csv':
+        header = True
+        for chunk in chunks:
+            yield chunk.to_csv(index=False,
+                               header=header,
+                               sep=sep,
+                               date_format=date_format).encode(encoding)
+            header = False
+        if header:
+            yield sep.join(SCHEDULE_COLUMNS).encode(encoding) + b'\n'
+    elif fmt == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        sink = _ChunkSink()
+        writer = None
+        for chunk in chunks:
+            text_cols = chunk.select_dtypes('category').columns
+            table = pa.Table.from_pandas(chunk.astype(
+                {col: str
+                 for col in text_cols}),
+                                         preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(sink, table.schema)
+            else:
+                table = table.cast(writer.schema)
+            writer.write_table(table)
+            yield sink.drain()
+        if writer is None:
+            # Aucun morceau : un fichier valide, vide, au schéma du calendrier
+            types = {
+                'date': pa.timestamp('s'),
+                'année': pa.int16(),
+                'intervalle_jours': pa.int16()
+            }
+            schema = pa.schema([(col, types.get(col, pa.large_string()))
+                                for col in SCHEDULE_COLUMNS])
+            writer = pq.ParquetWriter(sink, schema)
+        writer.close()
+        yield sink.drain()
+    else:
+        raise ValueError(f"Format d'export inconnu : {fmt}")
+
+
 # Test rapide
 if __name__ == "__main__":
     df = create_complete_maintenance_schedule()
@@ -0,0 +1,198 @@
+-- ===========================================
+-- Mini-GMAO - Migration de maint_jobs vers la table partitionnée
+-- ===========================================
+-- Pour une base créée avant le partitionnement (les nouvelles bases l'ont
+-- directement via schema.sql). À lancer depuis le dossier du projet :
+--   psql $DATABASE_URL -f migrate_maint_jobs.sql
+-- Seuls maint_jobs et ses objets (partitions, registre des ids, triggers,
+-- index, clé étrangère de alerts) sont recréés ; les autres tables ne sont pas
+-- touchées. Les fonctions de prochaine échéance (refresh_next_due) doivent
+-- déjà exister. Les objets ajoutés depuis (recherche plein texte...) viennent
+-- ensuite de schema.sql, qui se relance sans risque.
+-- Tout se fait dans une seule transaction : à la moindre erreur, rien n'est
+-- modifié et l'ancienne table reste en place.
+\set ON_ERROR_STOP on
+
+BEGIN;
+
+DO $$ BEGIN
+    IF to_regprocedure('refresh_next_due(integer[])') IS NULL THEN
+        RAISE EXCEPTION 'refresh_next_due() absente : base trop ancienne pour cette migration';
+    END IF;
+END $$;
+
+-- Copie de l'historique dans une table ordinaire, supprimée seulement une fois
+-- le rechargement vérifié
+CREATE TABLE maint_jobs_migration AS SELECT * FROM maint_jobs;
+
+DO $$
+DECLARE
+    source_rows BIGINT := (SELECT COUNT(*) FROM maint_jobs);
+    copied_rows BIGINT := (SELECT COUNT(*) FROM maint_jobs_migration);
+BEGIN
+    IF copied_rows <> source_rows THEN
+        RAISE EXCEPTION 'Copie incomplète de maint_jobs : % lignes sur %', copied_rows, source_rows;
+    END IF;
+END $$;
+
+-- La clé étrangère alerts.job_id vise l'ancienne table : elle est retirée
+-- explicitement (puis recréée sur le registre des ids). Sans CASCADE, toute
+-- autre dépendance fait échouer la migration au lieu d'être supprimée.
+ALTER TABLE alerts DROP CONSTRAINT IF EXISTS alerts_job_id_fkey;
+DROP TABLE maint_jobs;
+
+-- Même définition que schema.sql
+CREATE TABLE maint_jobs (
+    id            SERIAL,
+    plan_id       INTEGER REFERENCES maint_plans(id),
+    due_dt        DATE NOT NULL,
+    done_dt       DATE,               -- NULL tant que pas fait
+    status        TEXT CHECK (status IN ('planned','done','overdue')),
+    cost_labour   NUMERIC(8,2) DEFAULT 0,
+    cost_parts    NUMERIC(8,2) DEFAULT 0,
+    note          TEXT,
+    pdf_report    TEXT,               -- chemin vers le PDF signé
+    PRIMARY KEY (id, due_dt)          -- la clé de partition fait partie de la clé primaire
+) PARTITION BY RANGE (due_dt);
+CREATE TABLE maint_jobs_default PARTITION OF maint_jobs DEFAULT;
+
+CREATE OR REPLACE FUNCTION create_job_partitions(first_year INTEGER, last_year INTEGER) RETURNS INTEGER AS $$
+DECLARE
+    y       INTEGER;
+    part    TEXT;
+    created INTEGER := 0;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('maint_jobs_partitions'));
+    FOR y IN
+        SELECT generate_series(first_year, last_year)
+        UNION
+        SELECT DISTINCT EXTRACT(YEAR FROM due_dt)::INTEGER FROM maint_jobs_default
+    LOOP
+        part := 'maint_jobs_' || y;
+        CONTINUE WHEN to_regclass(part) IS NOT NULL;
+        EXECUTE format('CREATE TABLE %I (LIKE maint_jobs INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', part);
+        EXECUTE format(
+            'WITH moved AS (DELETE FROM maint_jobs_default WHERE due_dt >= %L AND due_dt < %L RETURNING *) '
+            'INSERT INTO %I SELECT * FROM moved',
+            make_date(y, 1, 1), make_date(y + 1, 1, 1), part);
+        EXECUTE format('ALTER TABLE maint_jobs ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                       part, make_date(y, 1, 1), make_date(y + 1, 1, 1));
+        created := created + 1;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION archive_job_partition(y INTEGER) RETURNS TEXT AS $$
+DECLARE
+    part    TEXT := 'maint_jobs_' || y;
+    archive TEXT := 'maint_jobs_archive_' || y;
+BEGIN
+    IF to_regclass(part) IS NULL THEN
+        RETURN NULL;
+    END IF;
+    IF EXISTS (SELECT 1 FROM maint_jobs WHERE due_dt >= make_date(y, 1, 1)
+               AND due_dt < make_date(y + 1, 1, 1) AND done_dt IS NULL) THEN
+        RAISE EXCEPTION 'Jobs encore ouverts en %, partition non archivée', y;
+    END IF;
+    EXECUTE format('ALTER TABLE maint_jobs DETACH PARTITION %I', part);
+    EXECUTE format('ALTER TABLE %I RENAME TO %I', part, archive);
+    RETURN archive;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Une partition par année présente dans l'historique (et autour d'aujourd'hui),
+-- avant le rechargement
+SELECT create_job_partitions(
+    LEAST(EXTRACT(YEAR FROM CURRENT_DATE)::INTEGER - 1,
+          (SELECT MIN(EXTRACT(YEAR FROM due_dt))::INTEGER FROM maint_jobs_migration)),
+    GREATEST(EXTRACT(YEAR FROM CURRENT_DATE)::INTEGER + 1,
+             (SELECT MAX(EXTRACT(YEAR FROM due_dt))::INTEGER FROM maint_jobs_migration))
+);
+
+-- Rechargement avant les triggers et les index : les données ne changent pas,
+-- les prochaines échéances des plans restent valables
+INSERT INTO maint_jobs (id, plan_id, due_dt, done_dt, status, cost_labour, cost_parts, note, pdf_report)
+SELECT id, plan_id, due_dt, done_dt, status, cost_labour, cost_parts, note, pdf_report
+FROM maint_jobs_migration;
+
+DO $$
+DECLARE
+    copied_rows   BIGINT := (SELECT COUNT(*) FROM maint_jobs_migration);
+    reloaded_rows BIGINT := (SELECT COUNT(*) FROM maint_jobs);
+BEGIN
+    IF reloaded_rows <> copied_rows THEN
+        RAISE EXCEPTION 'Rechargement incomplet de maint_jobs : % lignes sur %', reloaded_rows, copied_rows;
+    END IF;
+END $$;
+
+-- Registre des ids (voir schema.sql), cible de la clé étrangère de alerts
+CREATE TABLE IF NOT EXISTS maint_job_ids (
+    id INTEGER PRIMARY KEY
+);
+INSERT INTO maint_job_ids (id) SELECT id FROM maint_jobs ON CONFLICT DO NOTHING;
+ALTER TABLE alerts ADD CONSTRAINT alerts_job_id_fkey FOREIGN KEY (job_id) REFERENCES maint_job_ids(id);
+
+CREATE OR REPLACE FUNCTION jobs_register_ids() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO maint_job_ids (id) SELECT id FROM new_jobs;
+    ELSIF TG_OP = 'UPDATE' THEN
+        DELETE FROM maint_job_ids WHERE id IN (SELECT id FROM old_jobs EXCEPT SELECT id FROM new_jobs);
+        INSERT INTO maint_job_ids (id) SELECT id FROM new_jobs EXCEPT ALL SELECT id FROM old_jobs;
+    ELSE
+        DELETE FROM maint_job_ids WHERE id IN (SELECT id FROM old_jobs);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION jobs_refresh_next_due() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refresh_next_due(ARRAY(
+            SELECT DISTINCT plan_id FROM new_jobs WHERE done_dt IS NOT NULL));
+    ELSIF TG_OP = 'UPDATE' THEN
+        PERFORM refresh_next_due(ARRAY(
+            SELECT unnest(ARRAY[n.plan_id, o.plan_id])
+            FROM new_jobs n JOIN old_jobs o USING (id)
+            WHERE n.done_dt IS DISTINCT FROM o.done_dt OR n.plan_id IS DISTINCT FROM o.plan_id));
+    ELSE
+        PERFORM refresh_next_due(ARRAY(
+            SELECT DISTINCT plan_id FROM old_jobs WHERE done_dt IS NOT NULL));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER jobs_next_due_insert AFTER INSERT ON maint_jobs
+    REFERENCING NEW TABLE AS new_jobs
+    FOR EACH STATEMENT EXECUTE FUNCTION jobs_refresh_next_due();
+CREATE TRIGGER jobs_next_due_update AFTER UPDATE ON maint_jobs
+    REFERENCING OLD TABLE AS old_jobs NEW TABLE AS new_jobs
+    FOR EACH STATEMENT EXECUTE FUNCTION jobs_refresh_next_due();
+CREATE TRIGGER jobs_next_due_delete AFTER DELETE ON maint_jobs
+    REFERENCING OLD TABLE AS old_jobs
+    FOR EACH STATEMENT EXECUTE FUNCTION jobs_refresh_next_due();
+CREATE TRIGGER jobs_ids_insert AFTER INSERT ON maint_jobs
+    REFERENCING NEW TABLE AS new_jobs
+    FOR EACH STATEMENT EXECUTE FUNCTION jobs_register_ids();
+CREATE TRIGGER jobs_ids_update AFTER UPDATE ON maint_jobs
+    REFERENCING OLD TABLE AS old_jobs NEW TABLE AS new_jobs
+    FOR EACH STATEMENT EXECUTE FUNCTION jobs_register_ids();
+CREATE TRIGGER jobs_ids_delete AFTER DELETE ON maint_jobs
+    REFERENCING OLD TABLE AS old_jobs
+    FOR EACH STATEMENT EXECUTE FUNCTION jobs_register_ids();
+
+CREATE INDEX idx_jobs_status ON maint_jobs(status);
+CREATE INDEX idx_jobs_due_dt ON maint_jobs(due_dt);
+CREATE INDEX idx_jobs_plan_done ON maint_jobs(plan_id, done_dt);
+CREATE INDEX idx_jobs_open_due ON maint_jobs(due_dt, id) WHERE done_dt IS NULL;
+CREATE INDEX idx_jobs_open_plan ON maint_jobs(plan_id) WHERE done_dt IS NULL;
+
+-- Les nouveaux jobs reprennent après le plus grand id existant
+SELECT setval(pg_get_serial_sequence('maint_jobs', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM maint_jobs;
+
+DROP TABLE maint_jobs_migration;
+
+COMMIT;
@@ -18,8 +18,13 @@ CREATE TABLE IF NOT EXISTS assets (
     purchase_dt DATE,
     km          INTEGER DEFAULT 0,
     running_h   INTEGER DEFAULT 0,
+    km_per_day    REAL,             -- rythme d'usage estimé (usage_forecast.py), NULL si inconnu
+    hours_per_day REAL,
     meta        JSONB               -- données supplémentaires flexible
 );
+-- Bases créées avant la prévision d'usage
+ALTER TABLE assets ADD COLUMN IF NOT EXISTS km_per_day REAL;
+ALTER TABLE assets ADD COLUMN IF NOT EXISTS hours_per_day REAL;
 
 -- Programme d'entretien (le "quoi ?" et "quand ?")
 CREATE TABLE IF NOT EXISTS maint_plans (
@@ -34,9 +39,10 @@ CREATE TABLE IF NOT EXISTS maint_plans (
     next_due_dt     DATE               -- prochaine échéance calculée
 );
 
--- Interventions réalisées (le "fait")
+-- Interventions réalisées (le "fait"), partitionnées par année d'échéance :
+-- l'historique s'archive par partition sans ralentir le travail en cours
 CREATE TABLE IF NOT EXISTS maint_jobs (
-    id            SERIAL PRIMARY KEY,
+    id            SERIAL,
     plan_id       INTEGER REFERENCES maint_plans(id),
     due_dt        DATE NOT NULL,
     done_dt       DATE,               -- NULL tant que pas fait
@@ -44,19 +50,249 @@ CREATE TABLE IF NOT EXISTS maint_jobs (
     cost_labour   NUMERIC(8,2) DEFAULT 0,
     cost_parts    NUMERIC(8,2) DEFAULT 0,
     note          TEXT,
-    pdf_report    TEXT                -- chemin vers le PDF signé
+    pdf_report    TEXT,               -- chemin vers le PDF signé
+    PRIMARY KEY (id, due_dt)          -- la clé de partition fait partie de la clé primaire
+) PARTITION BY RANGE (due_dt);
+CREATE TABLE IF NOT EXISTS maint_jobs_default PARTITION OF maint_jobs DEFAULT;
+
+-- Registre des ids de maint_jobs. La clé primaire (id, due_dt) n'empêche pas
+-- deux jobs de même id dans des années différentes, et une clé étrangère ne
+-- peut pas viser id seul sur la table partitionnée : les triggers plus bas
+-- inscrivent ici chaque id (unicité globale), cible de alerts.job_id.
+-- Les ids des partitions archivées y restent.
+CREATE TABLE IF NOT EXISTS maint_job_ids (
+    id INTEGER PRIMARY KEY
 );
+-- Bases partitionnées avant le registre
+INSERT INTO maint_job_ids (id) SELECT id FROM maint_jobs ON CONFLICT DO NOTHING;
+
+-- Crée les partitions annuelles [first_year, last_year], plus celles des années
+-- déjà présentes dans la partition par défaut (leurs lignes y sont déplacées)
+CREATE OR REPLACE FUNCTION create_job_partitions(first_year INTEGER, last_year INTEGER) RETURNS INTEGER AS $$
+DECLARE
+    y       INTEGER;
+    part    TEXT;
+    created INTEGER := 0;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('maint_jobs_partitions'));
+    FOR y IN
+        SELECT generate_series(first_year, last_year)
+        UNION
+        SELECT DISTINCT EXTRACT(YEAR FROM due_dt)::INTEGER FROM maint_jobs_default
+    LOOP
+        part := 'maint_jobs_' || y;
+        CONTINUE WHEN to_regclass(part) IS NOT NULL;
+        EXECUTE format('CREATE TABLE %I (LIKE maint_jobs INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', part);
+        EXECUTE format(
+            'WITH moved AS (DELETE FROM maint_jobs_default WHERE due_dt >= %L AND due_dt < %L RETURNING *) '
+            'INSERT INTO %I SELECT * FROM moved',
+            make_date(y, 1, 1), make_date(y + 1, 1, 1), part);
+        EXECUTE format('ALTER TABLE maint_jobs ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                       part, make_date(y, 1, 1), make_date(y + 1, 1, 1));
+        created := created + 1;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Détache la partition d'une année close (renommée maint_jobs_archive_<année>)
+CREATE OR REPLACE FUNCTION archive_job_partition(y INTEGER) RETURNS TEXT AS $$
+DECLARE
+    part    TEXT := 'maint_jobs_' || y;
+    archive TEXT := 'maint_jobs_archive_' || y;
+BEGIN
+    IF to_regclass(part) IS NULL THEN
+        RETURN NULL;
+    END IF;
+    IF EXISTS (SELECT 1 FROM maint_jobs WHERE due_dt >= make_date(y, 1, 1)
+               AND due_dt < make_date(y + 1, 1, 1) AND done_dt IS NULL) THEN
+        RAISE EXCEPTION 'Jobs encore ouverts en %, partition non archivée', y;
+    END IF;
+    EXECUTE format('ALTER TABLE maint_jobs DETACH PARTITION %I', part);
+    EXECUTE format('ALTER TABLE %I RENAME TO %I', part, archive);
+    RETURN archive;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$ BEGIN
+    PERFORM create_job_partitions(EXTRACT(YEAR FROM CURRENT_DATE)::INTEGER - 1,
+                                  EXTRACT(YEAR FROM CURRENT_DATE)::INTEGER + 1);
+END $$;
 
 -- Table des alertes (historique des notifications)
 CREATE TABLE IF NOT EXISTS alerts (
     id          SERIAL PRIMARY KEY,
-    job_id      INTEGER REFERENCES maint_jobs(id),
+    job_id      INTEGER REFERENCES maint_job_ids(id),  -- maint_jobs.id, via le registre
     alert_dt    DATE NOT NULL,
     ack         BOOLEAN DEFAULT FALSE,
     sent_to     TEXT                 -- email ou notification id
 );
+-- Bases dont alerts a perdu sa clé étrangère au partitionnement : les alertes
+-- existantes (jobs archivés compris) ne sont pas revérifiées
+DO $$ BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conrelid = 'alerts'::regclass AND contype = 'f') THEN
+        ALTER TABLE alerts ADD CONSTRAINT alerts_job_id_fkey
+            FOREIGN KEY (job_id) REFERENCES maint_job_ids(id) NOT VALID;
+    END IF;
+END $$;
+
+-- Lignes rejetées lors de l'import CSV (import_csv.py)
+CREATE TABLE IF NOT EXISTS import_rejects (
+    id          SERIAL PRIMARY KEY,
+    file        TEXT NOT NULL,       -- 'MATRICE.csv' | 'VIDANGE.csv' | ...
+    line        INTEGER,             -- index de la ligne dans le fichier (0 = 1re ligne de données)
+    reason      TEXT NOT NULL,
+    raw         JSONB,               -- contenu brut de la ligne
+    imported_at TIMESTAMP DEFAULT now()
+);
+
+-- Suivi de l'import incrémental : empreinte de chaque fichier...
+CREATE TABLE IF NOT EXISTS import_files (
+    file        TEXT PRIMARY KEY,
+    checksum    TEXT NOT NULL,       -- sha256 du fichier au dernier import
+    imported_at TIMESTAMP DEFAULT now()
+);
+
+-- ... et de chaque ligne importée, avec la ligne créée en base
+CREATE TABLE IF NOT EXISTS import_rows (
+    file        TEXT NOT NULL,
+    row_hash    TEXT NOT NULL,       -- sha256 du contenu de la ligne
+    target_id   INTEGER,             -- assets.id ou maint_jobs.id
+    PRIMARY KEY (file, row_hash)
+);
+
+-- Compteur de version par table, incrémenté à chaque écriture (ETag de GET /assets)
+CREATE TABLE IF NOT EXISTS table_versions (
+    name    TEXT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+INSERT INTO table_versions (name) VALUES ('assets') ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE name = TG_TABLE_NAME;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS assets_version ON assets;
+CREATE TRIGGER assets_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON assets
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+
+-- Prochaine échéance incrémentale : dernier entretien fait + période du plan.
+-- Périodes en km / heures converties en jours au rythme d'usage de l'engin
+-- (import_csv.py) ; avec plusieurs périodes, la plus proche l'emporte.
+-- plan_ids NULL = tous les plans (réparation complète, voir import_csv.py --repair-next-due)
+CREATE OR REPLACE FUNCTION refresh_next_due(plan_ids INTEGER[]) RETURNS INTEGER AS $$
+    WITH updated AS (
+        UPDATE maint_plans p
+        SET next_due_dt = COALESCE(
+            LEAST(
+                d.last_done + p.every_months * 30,
+                d.last_done + CEIL(p.every_km / NULLIF(d.km_per_day, 0))::INTEGER,
+                d.last_done + CASE WHEN d.hours_per_day > 0 THEN CEIL(p.every_hours / d.hours_per_day)::INTEGER
+                                   ELSE p.every_hours / 24 END
+            ),
+            p.next_due_dt)
+        FROM (
+            SELECT p2.id, (SELECT MAX(j.done_dt) FROM maint_jobs j WHERE j.plan_id = p2.id) AS last_done,
+                   a.km_per_day, a.hours_per_day
+            FROM maint_plans p2
+            LEFT JOIN assets a ON a.id = p2.asset_id
+            WHERE plan_ids IS NULL OR p2.id = ANY(plan_ids)
+        ) d
+        WHERE p.id = d.id AND d.last_done IS NOT NULL
+          AND (p.every_months IS NOT NULL OR p.every_hours IS NOT NULL OR p.every_km IS NOT NULL)
+        RETURNING p.id
+    )
+    SELECT COUNT(*)::INTEGER FROM updated;
+$$ LANGUAGE sql;
+
+-- Une seule mise à jour par instruction (COPY, UPDATE groupé...), limitée aux plans touchés
+CREATE OR REPLACE FUNCTION jobs_refresh_next_due() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refresh_next_due(ARRAY(
+            SELECT DISTINCT plan_id FROM new_jobs WHERE done_dt IS NOT NULL));
+    ELSIF TG_OP = 'UPDATE' THEN
+        PERFORM refresh_next_due(ARRAY(
+            SELECT unnest(ARRAY[n.plan_id, o.plan_id])
+            FROM new_jobs n JOIN old_jobs o USING (id)
+            WHERE n.done_dt IS DISTINCT FROM o.done_dt OR n.plan_id IS DISTINCT FROM o.plan_id));
+    ELSE
+        PERFORM refresh_next_due(ARRAY(
+            SELECT DISTINCT plan_id FROM old_jobs WHERE done_dt IS NOT NULL));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS jobs_next_due_insert ON maint_jobs;
+CREATE TRIGGER jobs_next_due_insert AFTER INSERT ON maint_jobs
+    REFERENCING NEW TABLE AS new_jobs
+    FOR EACH STATEMENT EXECUTE FUNCTION jobs_refresh_next_due();
+DROP TRIGGER IF EXISTS jobs_next_due_update ON maint_jobs;
+CREATE TRIGGER jobs_next_due_update AFTER UPDATE ON maint_jobs
+    REFERENCING OLD TABLE AS old_jobs NEW TABLE AS new_jobs
+    FOR EACH STATEMENT EXECUTE FUNCTION jobs_refresh_next_due();
+DROP TRIGGER IF EXISTS jobs_next_due_delete ON maint_jobs;
+CREATE TRIGGER jobs_next_due_delete AFTER DELETE ON maint_jobs
+    REFERENCING OLD TABLE AS old_jobs
+    FOR EACH STATEMENT EXECUTE FUNCTION jobs_refresh_next_due();
+
+-- Tient maint_job_ids à jour : un id déjà pris fait échouer l'instruction,
+-- un id encore visé par une alerte ne peut pas disparaître
+CREATE OR REPLACE FUNCTION jobs_register_ids() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO maint_job_ids (id) SELECT id FROM new_jobs;
+    ELSIF TG_OP = 'UPDATE' THEN
+        DELETE FROM maint_job_ids WHERE id IN (SELECT id FROM old_jobs EXCEPT SELECT id FROM new_jobs);
+        INSERT INTO maint_job_ids (id) SELECT id FROM new_jobs EXCEPT ALL SELECT id FROM old_jobs;
+    ELSE
+        DELETE FROM maint_job_ids WHERE id IN (SELECT id FROM old_jobs);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS jobs_ids_insert ON maint_jobs;
+CREATE TRIGGER jobs_ids_insert AFTER INSERT ON maint_jobs
+    REFERENCING NEW TABLE AS new_jobs
+    FOR EACH STATEMENT EXECUTE FUNCTION jobs_register_ids();
+DROP TRIGGER IF EXISTS jobs_ids_update ON maint_jobs;
+CREATE TRIGGER jobs_ids_update AFTER UPDATE ON maint_jobs
+    REFERENCING OLD TABLE AS old_jobs NEW TABLE AS new_jobs
+    FOR EACH STATEMENT EXECUTE FUNCTION jobs_register_ids();
+DROP TRIGGER IF EXISTS jobs_ids_delete ON maint_jobs;
+CREATE TRIGGER jobs_ids_delete AFTER DELETE ON maint_jobs
+    REFERENCING OLD TABLE AS old_jobs
+    FOR EACH STATEMENT EXECUTE FUNCTION jobs_register_ids();
+
+-- Recherche plein texte dans les interventions curatives (GET /curatif/search).
+-- Même découpage que search_index.py : minuscules sans accents, sans
+-- racinisation ; seuls la panne et les pièces de la note sont indexées.
+CREATE OR REPLACE FUNCTION fold_accents(txt TEXT) RETURNS TEXT AS $$
+    SELECT translate(replace(replace(lower(txt), 'œ', 'oe'), 'æ', 'ae'),
+                     'àâäáãåçéèêëíìîïñóòôöõúùûüýÿ',
+                     'aaaaaaceeeeiiiinooooouuuuyy');
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION curatif_tsvector(note TEXT) RETURNS tsvector AS $$
+    SELECT to_tsvector('simple'::regconfig, fold_accents(
+        regexp_replace(note, '^Panne: |\nIntervenant: [^\n]*|\nPieces: ', ' ', 'g')));
+$$ LANGUAGE sql IMMUTABLE;
 
 -- Index pour les performances
 CREATE INDEX IF NOT EXISTS idx_jobs_status ON maint_jobs(status);
 CREATE INDEX IF NOT EXISTS idx_jobs_due_dt ON maint_jobs(due_dt);
+CREATE INDEX IF NOT EXISTS idx_jobs_plan_done ON maint_jobs(plan_id, done_dt);  -- dernier entretien par plan
+CREATE INDEX IF NOT EXISTS idx_jobs_open_due ON maint_jobs(due_dt, id) WHERE done_dt IS NULL;  -- /alerts
+CREATE INDEX IF NOT EXISTS idx_jobs_open_plan ON maint_jobs(plan_id) WHERE done_dt IS NULL;     -- job en cours d'un plan
+CREATE INDEX IF NOT EXISTS idx_jobs_curatif_text ON maint_jobs
+    USING gin (curatif_tsvector(note)) WHERE note LIKE 'Panne: %';                          -- /curatif/search
+CREATE INDEX IF NOT EXISTS idx_alerts_job ON alerts(job_id);
+CREATE INDEX IF NOT EXISTS idx_assets_type ON assets(type);
+CREATE INDEX IF NOT EXISTS idx_assets_reg_prefix ON assets(reg_number text_pattern_ops);  -- filtre par préfixe
+CREATE INDEX IF NOT EXISTS idx_plans_asset ON maint_plans(asset_id);
 CREATE INDEX IF NOT EXISTS idx_plans_next_due ON maint_plans(next_due_dt);
@@ -0,0 +1,215 @@
+# ===========================================
+# Mini-GMAO - Index de recherche sur les CSV d'import
+# ===========================================
+import bisect
+import math
+import os
+import re
+import threading
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from csv_loader import load_csv
+
+# Colonnes de texte libre indexées pour la recherche dans les interventions
+CURATIF_TEXT_COLUMNS = ['panne_declatee', 'pieces']
+
+_indexes = {}
+_lock = threading.Lock()
+_word = re.compile(r'[a-z0-9]+')
+
+
+def normalize_matricule(value):
+    return str(value).strip().casefold()
+
+
+def fold_text(value):
+    """Minuscules sans accents : « Défectueuse » → « defectueuse »"""
+    text = str(value).casefold().replace('œ', 'oe').replace('æ', 'ae')
+    return ''.join(char for char in unicodedata.normalize('NFKD', text)
+                   if not unicodedata.combining(char))
+
+
+def tokenize(value):
+    """Mots d'un texte libre (les lettres isolées, comme le « d » de « d'huile », sont ignorées)"""
+    return [word for word in _word.findall(fold_text(value))
+            if len(word) > 1 or word.isdigit()]
+
+
+def _prefix_range(sorted_values, query):
+    first = bisect.bisect_left(sorted_values, query)
+    last = bisect.bisect_left(sorted_values, query + '\U0010ffff', first)
+    return first, last
+
+
+class MatriculeIndex:
+    """Recherche de matricules (préfixe ou sous-chaîne) dans plusieurs fichiers.
+
+    Chaque matricule distinct reçoit un numéro ; on garde, par fichier, les
+    positions de ses lignes. Les suffixes de tous les matricules sont triés :
+    une sous-chaîne est le préfixe d'un suffixe, donc une plage trouvée par
+    deux recherches dichotomiques, quelle que soit la taille des fichiers.
+    """
+
+    def __init__(self, frames):
+        keys = {}
+        self.positions = {}
+        for label, df in frames.items():
+            if 'matricule' not in df.columns:
+                continue
+            values = df['matricule']
+            rows = {}
+            for position, value in enumerate(values):
+                if value is None or value != value:  # NaN
+                    continue
+                key_id = keys.setdefault(normalize_matricule(value), len(keys))
+                rows.setdefault(key_id, []).append(position)
+            self.positions[label] = {
+                key_id: np.array(found, dtype=np.int64)
+                for key_id, found in rows.items()
+            }
+
+        self.keys = list(keys)
+        self._sorted_keys = sorted((key, key_id) for key, key_id in keys.items())
+        self._prefixes = [key for key, _ in self._sorted_keys]
+        suffixes = sorted((key[start:], key_id)
+                          for key, key_id in keys.items()
+                          for start in range(len(key)))
+        self._suffixes = [suffix for suffix, _ in suffixes]
+        self._suffix_ids = [key_id for _, key_id in suffixes]
+
+    def matching_ids(self, query, prefix=False):
+        """Numéros des matricules qui commencent par / contiennent `query`"""
+        query = normalize_matricule(query)
+        if not query:
+            return set()
+        if prefix:
+            first, last = _prefix_range(self._prefixes, query)
+            return {key_id for _, key_id in self._sorted_keys[first:last]}
+        first, last = _prefix_range(self._suffixes, query)
+        return set(self._suffix_ids[first:last])
+
+    def search(self, query, prefix=False):
+        """Positions des lignes trouvées, groupées par fichier (ordre du fichier)"""
+        ids = self.matching_ids(query, prefix)
+        hits = {}
+        for label, rows in self.positions.items():
+            found = [rows[key_id] for key_id in ids if key_id in rows]
+            if found:
+                hits[label] = np.sort(np.concatenate(found))
+        return hits
+
+
+class FullTextIndex:
+    """Recherche plein texte classée (BM25) dans des colonnes de texte libre.
+
+    Index inversé construit une fois : pour chaque mot (sans accents ni
+    majuscules), les lignes qui le contiennent et leur poids BM25, calculé
+    d'avance. Chaque mot de la requête peut n'être qu'un début de mot
+    (« filt » trouve « filtre », « filtres ») ; une ligne doit contenir
+    tous les mots de la requête.
+    """
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self, df, columns):
+        columns = [col for col in columns if col in df.columns]
+        self.size = len(df)
+        counts = {}
+        lengths = np.zeros(self.size, dtype=np.float64)
+        for position, values in enumerate(zip(*(df[col] for col in columns))):
+            for value in values:
+                if value is None or value != value:  # NaN
+                    continue
+                for word in tokenize(value):
+                    rows = counts.setdefault(word, {})
+                    rows[position] = rows.get(position, 0) + 1
+                    lengths[position] += 1
+
+        norm = self.k1 * (1 - self.b + self.b * lengths / max(lengths.mean(), 1.0)) if self.size else lengths
+        self._postings = {}
+        for word, rows in counts.items():
+            positions = np.fromiter(rows.keys(), dtype=np.int64, count=len(rows))
+            freqs = np.fromiter(rows.values(), dtype=np.float64, count=len(rows))
+            idf = math.log(1 + (self.size - len(rows) + 0.5) / (len(rows) + 0.5))
+            self._postings[word] = (positions, idf * freqs * (self.k1 + 1) / (freqs + norm[positions]))
+        self._words = sorted(self._postings)
+
+    def search(self, query, limit=None):
+        """(positions, scores) des lignes trouvées, meilleur score d'abord"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        empty = np.array([], dtype=np.int64), np.array([], dtype=np.float64)
+        if not terms:
+            return empty
+        scores = np.zeros(self.size, dtype=np.float64)
+        matched = np.zeros(self.size, dtype=np.int64)
+        for term in terms:
+            first, last = _prefix_range(self._words, term)
+            if first == last:
+                return empty
+            found = np.zeros(self.size, dtype=bool)
+            for word in self._words[first:last]:
+                positions, weights = self._postings[word]
+                scores[positions] += weights
+                found[positions] = True
+            matched += found
+        positions = np.flatnonzero(matched == len(terms))
+        order = np.lexsort((positions, -scores[positions]))[:limit]
+        return positions[order], scores[positions[order]]
+
+
+def _data_version(files):
+    """(libellé, chemin, mtime, taille) des fichiers présents"""
+    version = []
+    for label, path in files.items():
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        version.append((label, os.path.abspath(path), stat.st_mtime_ns, stat.st_size))
+    return tuple(version)
+
+
+def _cached_index(name, files, build):
+    version = _data_version(files)
+    with _lock:
+        cached = _indexes.get(name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+    index = build({label: load_csv(path) for label, path, _, _ in version})
+    with _lock:
+        _indexes[name] = (version, index)
+    return index
+
+
+def matricule_index(files):
+    """Index des fichiers {libellé: chemin}, reconstruit seulement s'ils changent"""
+    return _cached_index('matricule', files, MatriculeIndex)
+
+
+def curatif_index(path):
+    """Index plein texte des pannes et pièces de SUIVI_CURATIF.csv.
+
+    Lève FileNotFoundError si le fichier est absent : « pas de fichier »
+    ne doit pas se confondre avec « aucun résultat ».
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+
+    def build(frames):
+        return FullTextIndex(frames.get('curatif', pd.DataFrame()), CURATIF_TEXT_COLUMNS)
+    return _cached_index('curatif', {'curatif': path}, build)
+
+
+def search_curatif(path, query, limit=None):
+    """Lignes de SUIVI_CURATIF.csv trouvées, classées, avec leur colonne `score`.
+
+    Lève FileNotFoundError si le fichier est absent.
+    """
+    positions, scores = curatif_index(path).search(query, limit)
+    if not len(positions):
+        return pd.DataFrame(columns=CURATIF_TEXT_COLUMNS + ['score'])
+    return load_csv(path).iloc[positions].assign(score=scores)
@@ -3,7 +3,7 @@ echo "Mini-GMAO - Démarrage en mode autonome (SANS Docker ni PostgreSQL)"
 
 # 1. Installation des dépendances (une seule fois)
 echo "Installation des dépendances..."
-pip install pandas streamlit fastapi uvicorn sqlmodel psycopg2-binary --quiet
+pip install pandas streamlit fastapi uvicorn sqlmodel psycopg2-binary asyncpg aiosqlite --quiet
 
 # 2. Vérification que les fichiers CSV sont bien là
 if [ ! -f "import/MATRICE.csv" ] || [ ! -f "import/Param.csv" ]; then
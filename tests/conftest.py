@@ -0,0 +1,13 @@
+# ===========================================
+# Mini-GMAO - Configuration des tests
+# ===========================================
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Avant tout import de database.py : l'API démarre sur la base SQLite en mémoire
+os.environ["GMAO_TEST_DB"] = "1"
+sys.path.insert(0, ROOT)
+# Les chemins des CSV (import/...) sont relatifs au dossier du projet
+os.chdir(ROOT)
@@ -0,0 +1,308 @@
+# ===========================================
+# Mini-GMAO - Tests de l'API
+# ===========================================
+import io
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import main
+from database import engine
+from maintenance_scheduler import SCHEDULE_COLUMNS
+
+
+@pytest.fixture(scope="module")
+def client(tmp_path_factory):
+    # Cache disque du calendrier hors du dossier du projet
+    main.schedule_cache.cache_dir = str(tmp_path_factory.mktemp("schedule_cache"))
+    with TestClient(main.app) as client:
+        yield client
+
+
+def add_rows(client, *rows):
+    """Insère des lignes (modèles SQLModel) dans la boucle de l'application, renvoie leurs ids"""
+    async def insert():
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            session.add_all(rows)
+            await session.commit()
+            return [row.id for row in rows]
+    return client.portal.call(insert)
+
+
+def plan_next_due(client, plan_id):
+    """next_due_dt d'un plan, relu dans la base"""
+    async def read():
+        async with AsyncSession(engine) as session:
+            return (await session.get(main.MaintPlan, plan_id)).next_due_dt
+    return client.portal.call(read)
+
+
+@pytest.fixture(scope="module")
+def plan(client):
+    """Un engin, un type d'entretien et un plan semestriel"""
+    asset_id, = add_rows(client, main.Asset(name="Chargeuse", type="ENGIN", reg_number="PLAN-01"))
+    type_id, = add_rows(client, main.MaintType(code="VID", label="Vidange"))
+    plan_id, = add_rows(client, main.MaintPlan(asset_id=asset_id, maint_type_id=type_id, every_months=6))
+    return {"asset_id": asset_id, "plan_id": plan_id}
+
+
+# ==================== Assets ====================
+def test_assets_pagination_and_filters(client):
+    for number in range(3):
+        response = client.post("/assets", json={"name": f"Camion {number}", "type": "CAMION",
+                                                "reg_number": f"CAM-{number:02d}"})
+        assert response.status_code == 200
+
+    first = client.get("/assets", params={"type": "CAMION", "limit": 2}).json()
+    assert [item["reg_number"] for item in first["items"]] == ["CAM-00", "CAM-01"]
+    assert "meta" not in first["items"][0]
+    second = client.get("/assets", params={"type": "CAMION", "limit": 2, "after_id": first["next"]}).json()
+    assert [item["reg_number"] for item in second["items"]] == ["CAM-02"]
+    assert second["next"] is None
+
+    found = client.get("/assets", params={"reg_number": "CAM-0", "fields": "name"}).json()["items"]
+    assert all(set(item) == {"id", "name"} for item in found)
+    assert len(found) == 3
+
+
+def test_assets_unknown_field(client):
+    response = client.get("/assets", params={"fields": "name,couleur"})
+    assert response.status_code == 400
+
+
+def test_assets_etag(client):
+    response = client.get("/assets")
+    etag = response.headers["ETag"]
+    assert client.get("/assets", headers={"If-None-Match": etag}).status_code == 304
+
+    client.post("/assets", json={"name": "Pelle", "reg_number": "PEL-01"})
+    response = client.get("/assets", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_assets_etag_depends_on_query(client):
+    etag = client.get("/assets", params={"limit": 2}).headers["ETag"]
+    for params in ({"limit": 3}, {"limit": 2, "after_id": 1}, {"limit": 2, "fields": "name"},
+                   {"limit": 2, "type": "CAMION"}, {"limit": 2, "reg_number": "CAM"}):
+        response = client.get("/assets", params=params, headers={"If-None-Match": etag})
+        assert response.status_code == 200, params
+        assert response.headers["ETag"] != etag
+    assert client.get("/assets", params={"limit": 2}, headers={"If-None-Match": etag}).status_code == 304
+
+
+# ==================== Jobs ====================
+def test_schedule_plans_then_mark_done(client, plan):
+    scheduled = client.post("/plans/schedule", json={"plan_ids": [plan["plan_id"], 999999]}).json()
+    assert scheduled[0]["status"] == "scheduled"
+    assert scheduled[1] == {"plan_id": 999999, "status": "not_found"}
+    again = client.post("/plans/schedule", json={"plan_ids": [plan["plan_id"]]}).json()
+    assert again[0]["status"] == "already_scheduled"
+
+    job_id = scheduled[0]["job_id"]
+    done = client.post("/jobs/done", json={"job_ids": [job_id, job_id, 999999], "done_dt": "2026-01-10"}).json()
+    assert done == [
+        {"job_id": job_id, "status": "done", "plan_id": plan["plan_id"], "next_due_dt": "2026-07-09"},
+        {"job_id": 999999, "status": "not_found"},
+    ]
+
+
+def test_jobs_done_requires_ids(client):
+    assert client.post("/jobs/done", json={"job_ids": []}).status_code == 422
+
+
+def test_next_due_follows_direct_job_changes(client):
+    # Les triggers recalculent next_due_dt sans passer par les endpoints (import, SQL)
+    asset_id, = add_rows(client, main.Asset(name="Niveleuse", reg_number="TRIG-01"))
+    type_id, = add_rows(client, main.MaintType(code="GRA", label="Graissage"))
+    plan_id, = add_rows(client, main.MaintPlan(asset_id=asset_id, maint_type_id=type_id, every_hours=240,
+                                               next_due_dt=date(2026, 1, 1)))
+    add_rows(client, main.MaintJob(plan_id=plan_id, due_dt=date(2026, 1, 1), status="planned"))
+    assert plan_next_due(client, plan_id) == date(2026, 1, 1)
+
+    _, last = add_rows(client, *[
+        main.MaintJob(plan_id=plan_id, due_dt=day, done_dt=day, status="done")
+        for day in (date(2026, 2, 1), date(2026, 3, 1))
+    ])
+    assert plan_next_due(client, plan_id) == date(2026, 3, 11)
+
+    async def delete_last():
+        async with AsyncSession(engine) as session:
+            await session.delete(await session.get(main.MaintJob, last))
+            await session.commit()
+    client.portal.call(delete_last)
+    assert plan_next_due(client, plan_id) == date(2026, 2, 11)
+
+
+# ==================== Alertes ====================
+def test_alerts_keyset_pagination(client, plan):
+    today = date.today()
+    add_rows(client, *[
+        main.MaintJob(plan_id=plan["plan_id"], due_dt=today + timedelta(days=offset), status="planned")
+        for offset in (-5, -5, 3, 10)
+    ] + [main.MaintJob(plan_id=plan["plan_id"], due_dt=today, done_dt=today, status="done")])
+    params = {"asset_id": plan["asset_id"], "limit": 3}
+    first = client.get("/alerts", params=params).json()
+    assert first["total"] == 4
+    assert [item["status"] for item in first["items"]] == ["overdue", "overdue", "planned"]
+    assert first["items"][0]["type"] == "VID"
+    assert first["next"] is not None
+
+    second = client.get("/alerts", params={**params, **first["next"]}).json()
+    assert second["total"] == 4
+    assert len(second["items"]) == 1
+    assert second["next"] is None
+    keys = [(item["due_dt"], item["job_id"]) for item in first["items"] + second["items"]]
+    assert keys == sorted(keys)
+
+    overdue = client.get("/alerts", params={"asset_id": plan["asset_id"], "status": "overdue"}).json()
+    assert overdue["total"] == 2
+    assert client.get("/alerts", params={"asset_id": plan["asset_id"], "type": "C"}).json()["total"] == 0
+
+
+def test_alerts_cursor_needs_both_fields(client):
+    assert client.get("/alerts", params={"after_id": 1}).status_code == 400
+
+
+def test_calendar_alerts_pages_and_done(client):
+    params = {"source": "calendar", "window": 15, "limit": 20}
+    first = client.get("/alerts", params=params).json()
+    assert first["total"] > 20
+    second = client.get("/alerts", params={**params, **first["next"]}).json()
+    assert first["items"][-1]["series"] not in [item["series"] for item in second["items"]]
+
+    item = first["items"][0]
+    response = client.post("/alerts/calendar/done", json={
+        "matricule": item["matricule"], "operation": item["operation"], "type": item["type"],
+        "done_dt": date.today().isoformat()})
+    assert response.status_code == 200
+    assert all(due["due_dt"] > date.today().isoformat() for due in response.json()["next"])
+
+    missing = client.post("/alerts/calendar/done", json={"matricule": "inconnu", "operation": "Frein"})
+    assert missing.status_code == 404
+
+
+def test_calendar_alerts_are_merged_like_the_schedule(client):
+    # Sur un an, les séries d'une opération tombent ensemble au 1er janvier : une seule alerte
+    params = {"source": "calendar", "window": 366, "matricule": "041-01", "limit": 1000}
+    items = client.get("/alerts", params=params).json()["items"]
+    keys = [(item["matricule"], item["operation"], item["due_dt"]) for item in items]
+    assert keys and len(keys) == len(set(keys))
+
+
+# ==================== Calendrier ====================
+def test_schedule_page(client):
+    params = {"from": "2026-01-01", "to": "2026-03-31", "limit": 200}
+    body = client.get("/schedule", params=params).json()
+    assert len(body["items"]) == 200
+    assert body["total"] > 200
+    assert body["next_offset"] == 200
+    dates = [item["date"] for item in body["items"]]
+    assert dates == sorted(dates)
+    assert "2026-01-01" <= dates[0] and dates[-1] <= "2026-03-31"
+
+    matricule = body["items"][0]["matricule"]
+    found = client.get("/schedule", params={**params, "matricule": matricule.lower(), "type": "C"}).json()
+    assert found["total"] > 0
+    assert all(matricule.lower() in item["matricule"].lower() and item["type"] == "C"
+               for item in found["items"])
+
+
+def test_schedule_sorted_page(client):
+    params = {"from": "2026-01-01", "to": "2026-03-31", "limit": 200}
+    body = client.get("/schedule", params={**params, "sort": "engin"}).json()
+    engins = [item["engin"] for item in body["items"]]
+    assert engins == sorted(engins)
+    assert body["next_offset"] == 200
+
+    body = client.get("/schedule", params={**params, "sort": "-date"}).json()
+    dates = [item["date"] for item in body["items"]]
+    assert dates == sorted(dates, reverse=True)
+    last = client.get("/schedule", params={**params, "offset": body["total"] - 1, "limit": 1}).json()
+    assert dates[0] == last["items"][0]["date"]
+
+
+def test_schedule_selected_years(client):
+    def total(start, end, **params):
+        return client.get("/schedule", params={"from": start, "to": end, "limit": 1, **params}).json()["total"]
+
+    body = client.get("/schedule", params={"from": "2026-01-01", "to": "2028-12-31", "year": [2026, 2028],
+                                           "sort": "-date", "limit": 1}).json()
+    assert body["total"] == total("2026-01-01", "2026-12-31") + total("2028-01-01", "2028-12-31")
+    assert body["items"][0]["date"].startswith("2028-")
+    assert total("2026-01-01", "2026-12-31", year=2027) == 0
+
+
+def test_schedule_visits(client):
+    body = client.get("/schedule", params={"from": "2026-02-01", "to": "2026-02-28", "visits": True,
+                                           "sort": "-nb_opérations", "limit": 50}).json()
+    counts = [item["nb_opérations"] for item in body["items"]]
+    assert counts == sorted(counts, reverse=True)
+    assert all(len(item["opérations"].split(", ")) == item["nb_opérations"] for item in body["items"])
+    visits = [(item["matricule"], item["date"]) for item in body["items"]]
+    assert len(set(visits)) == len(visits)
+
+
+def test_schedule_arrow(client):
+    pa = pytest.importorskip("pyarrow")
+    response = client.get("/schedule", params={"from": "2026-01-01", "to": "2026-01-31", "format": "arrow",
+                                               "limit": 10})
+    assert response.status_code == 200
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.num_rows == 10
+    assert int(response.headers["X-Total-Count"]) > 10
+    assert response.headers["X-Next-Offset"] == "10"
+
+
+def test_schedule_rejects_bad_requests(client):
+    assert client.get("/schedule", params={"sort": "couleur"}).status_code == 400
+    assert client.get("/schedule", params={"from": "2026-02-01", "to": "2026-01-01"}).status_code == 400
+    assert client.get("/schedule", params={"from": "2026-01-01", "to": "2040-01-01"}).status_code == 422
+    assert client.get("/schedule/export", params={"start_year": 2026, "end_year": 2040}).status_code == 422
+    assert client.get("/schedule/alerts/export", params={"days": 100000}).status_code == 422
+
+
+# ==================== Exports du calendrier ====================
+def test_schedule_export_csv(client):
+    response = client.get("/schedule/export", params={"start_year": 2026, "end_year": 2026, "batch_size": 50})
+    assert response.status_code == 200
+    assert 'filename="calendrier_entretiens_2026_2026.csv"' in response.headers["Content-Disposition"]
+    lines = response.text.splitlines()
+    assert lines[0] == ";".join(SCHEDULE_COLUMNS)
+    assert sum(line == lines[0] for line in lines) == 1
+    assert len(lines) - 1 == len(main.schedule_cache.load(2026, 2026))
+
+
+def test_schedule_export_rejects_reversed_years(client):
+    response = client.get("/schedule/export", params={"start_year": 2027, "end_year": 2026})
+    assert response.status_code == 400
+
+
+def test_schedule_alerts_export_parquet(client):
+    pq = pytest.importorskip("pyarrow.parquet")
+    response = client.get("/schedule/alerts/export", params={"days": 30, "format": "parquet"})
+    assert response.status_code == 200
+    table = pq.read_table(io.BytesIO(response.content))
+    assert table.column_names == SCHEDULE_COLUMNS
+    assert table.num_rows > 0
+
+
+# ==================== Recherche ====================
+def test_curatif_search_csv(client):
+    body = client.get("/curatif/search", params={"q": "fuite", "limit": 5}).json()
+    assert body["source"] == "csv"
+    assert 0 < len(body["items"]) <= 5
+    scores = [item["score"] for item in body["items"]]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_curatif_search_without_words(client):
+    assert client.get("/curatif/search", params={"q": "'"}).status_code == 400
+
+
+def test_curatif_search_missing_csv(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(main, "CURATIF_CSV", str(tmp_path / "SUIVI_CURATIF.csv"))
+    response = client.get("/curatif/search", params={"q": "fuite"})
+    assert response.status_code == 503
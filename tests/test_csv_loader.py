@@ -0,0 +1,63 @@
+# ===========================================
+# Mini-GMAO - Tests du chargement des CSV d'import (csv_loader.py)
+# ===========================================
+import os
+
+import pandas as pd
+import pytest
+
+import csv_loader
+
+
+@pytest.fixture
+def vidange(tmp_path, monkeypatch):
+    monkeypatch.setattr(csv_loader, "_frames", {})
+    path = tmp_path / "VIDANGE.csv"
+    path.write_bytes("matricule;date_entretien;compteur_km_h\nA;31/01/2025;8147,6\nB;pas de date;\n".encode("cp1252"))
+    return path
+
+
+def test_parse_csv_dates_day_first_and_text(vidange):
+    df = csv_loader.parse_csv(str(vidange))
+    assert df["date_entretien"].iloc[0] == pd.Timestamp("2025-01-31")
+    assert pd.isna(df["date_entretien"].iloc[1])
+    assert df["compteur_km_h"].iloc[0] == "8147,6"
+
+
+def test_load_csv_parses_once_per_version(vidange, tmp_path, monkeypatch):
+    calls = []
+    parse = csv_loader.parse_csv
+    monkeypatch.setattr(csv_loader, "parse_csv", lambda path: calls.append(path) or parse(path))
+    cache_dir = str(tmp_path / "cache")
+
+    first = csv_loader.load_csv(str(vidange), cache_dir=cache_dir)
+    assert csv_loader.load_csv(str(vidange), cache_dir=cache_dir) is first
+    assert len(calls) == 1
+
+    with open(vidange, "ab") as f:
+        f.write(b"C;01/02/2025;10\n")
+    assert len(csv_loader.load_csv(str(vidange), cache_dir=cache_dir)) == 3
+    assert len(calls) == 2
+
+
+def test_load_csv_cold_start_reads_sidecar(vidange, tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    cache_dir = str(tmp_path / "cache")
+    expected = csv_loader.load_csv(str(vidange), cache_dir=cache_dir)
+    assert len(os.listdir(cache_dir)) == 1
+
+    # Nouveau processus : cache mémoire vide, la copie parquet suffit
+    monkeypatch.setattr(csv_loader, "_frames", {})
+    monkeypatch.setattr(csv_loader, "parse_csv", lambda path: pytest.fail("CSV reparsé"))
+    df = csv_loader.load_csv(str(vidange), cache_dir=cache_dir)
+    pd.testing.assert_frame_equal(df, expected)
+
+
+def test_load_csv_keeps_only_the_latest_sidecar(vidange, tmp_path):
+    pytest.importorskip("pyarrow")
+    cache_dir = str(tmp_path / "cache")
+    csv_loader.load_csv(str(vidange), cache_dir=cache_dir)
+    with open(vidange, "ab") as f:
+        f.write(b"C;01/02/2025;10\n")
+    csv_loader.load_csv(str(vidange), cache_dir=cache_dir)
+    assert len(os.listdir(cache_dir)) == 1
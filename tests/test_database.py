@@ -0,0 +1,113 @@
+# ===========================================
+# Mini-GMAO - Tests du moteur asynchrone (database.py)
+# ===========================================
+import os
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel
+
+import database
+import main  # noqa: F401  (modèles SQLModel de la base de test)
+
+
+def test_async_url():
+    assert database.async_url("postgresql://u:p@h:5432/db") == "postgresql+asyncpg://u:p@h:5432/db"
+    assert database.async_url("postgres://u:p@h/db") == "postgresql+asyncpg://u:p@h/db"
+    assert database.async_url("postgresql+psycopg2://u:p@h/db") == "postgresql+asyncpg://u:p@h/db"
+    assert database.async_url("sqlite:///gmao.db") == "sqlite+aiosqlite:///gmao.db"
+
+
+def test_pool_settings_from_environment(monkeypatch):
+    for name, value in {"DB_POOL_SIZE": "4", "DB_MAX_OVERFLOW": "2", "DB_POOL_TIMEOUT": "5",
+                        "DB_POOL_RECYCLE": "60", "DB_POOL_PRE_PING": "0"}.items():
+        monkeypatch.setenv(name, value)
+    engine = database.create_engine_from_env("postgresql+asyncpg://u:p@localhost/db")
+    pool = engine.sync_engine.pool
+    assert (pool.size(), pool._max_overflow, pool._timeout, pool._recycle, pool._pre_ping) == (4, 2, 5, 60, False)
+
+
+def test_test_database_shares_one_connection(monkeypatch):
+    monkeypatch.setenv("GMAO_TEST_DB", "1")
+    assert database.database_url() == database.TEST_DATABASE_URL
+    assert isinstance(database.create_engine_from_env().sync_engine.pool, StaticPool)
+
+
+# ==================== Triggers de prochaine échéance ====================
+# Même scénario sur la base de test SQLite (database.TEST_TRIGGERS) et sur
+# PostgreSQL (schema.sql, refresh_next_due) : les next_due_dt doivent concorder.
+NEXT_DUE_SETUP = [
+    "INSERT INTO maint_types (id, code, label) VALUES (1, 'C', 'Contrôle')",
+    """INSERT INTO assets (id, name, km, running_h, km_per_day, hours_per_day) VALUES
+        (1, 'Camion', 0, 0, 100, NULL), (2, 'Chargeuse', 0, 0, 0, 7), (3, 'Groupe', 0, 0, NULL, NULL)""",
+    """INSERT INTO maint_plans (id, asset_id, maint_type_id, every_km, every_months, every_hours, tolerance_days)
+       VALUES (1, 1, 1, NULL, 6, NULL, 30), (2, 1, 1, 10000, 6, NULL, 30), (3, 2, 1, 5000, NULL, 250, 30),
+              (4, 3, 1, NULL, NULL, 250, 30), (5, 3, 1, NULL, NULL, NULL, 30), (6, 2, 1, NULL, 1, NULL, 30)""",
+]
+NEXT_DUE_STEPS = [
+    """INSERT INTO maint_jobs (id, plan_id, due_dt, done_dt, status) VALUES
+        (1, 1, '2026-01-01', '2026-01-03', 'done'), (2, 2, '2026-01-01', '2026-01-05', 'done'),
+        (3, 3, '2026-02-01', '2026-02-02', 'done'), (4, 4, '2026-02-01', '2026-02-10', 'done'),
+        (5, 5, '2026-03-01', '2026-03-01', 'done'), (6, 1, '2026-07-01', NULL, 'planned'),
+        (7, 6, '2026-02-01', '2026-02-15', 'done'), (8, 2, '2026-04-01', NULL, 'planned')""",
+    "UPDATE maint_jobs SET done_dt = '2026-07-04', status = 'done' WHERE id IN (6, 8)",
+    "UPDATE maint_jobs SET plan_id = 6 WHERE id = 6",
+    "UPDATE maint_jobs SET done_dt = '2026-03-01' WHERE id = 3",
+    "DELETE FROM maint_jobs WHERE id IN (7, 8)",
+]
+
+
+def next_due_by_step(engine):
+    with engine.begin() as conn:
+        for statement in NEXT_DUE_SETUP:
+            conn.execute(text(statement))
+    states = []
+    for statement in NEXT_DUE_STEPS:
+        with engine.begin() as conn:
+            conn.execute(text(statement))
+            rows = conn.execute(text("SELECT id, next_due_dt FROM maint_plans ORDER BY id")).all()
+        states.append([(plan_id, None if due is None else str(due)) for plan_id, due in rows])
+    return states
+
+
+def sqlite_next_due():
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for trigger in database.TEST_TRIGGERS:
+            conn.execute(text(trigger))
+    return next_due_by_step(engine)
+
+
+@pytest.fixture
+def pg_engine():
+    url = os.getenv("DATABASE_URL", "")
+    scheme, _, rest = url.partition("://")
+    if scheme.split("+")[0] not in ("postgresql", "postgres"):
+        pytest.skip("DATABASE_URL ne désigne pas une base PostgreSQL")
+    test_schema = "gmao_next_due_test"
+    engine = create_engine(f"postgresql+psycopg2://{rest}",
+                           connect_args={"options": f"-csearch_path={test_schema}"})
+    try:
+        raw = engine.raw_connection()
+    except Exception as exc:
+        pytest.skip(f"PostgreSQL indisponible : {exc}")
+    try:
+        with raw.cursor() as cur, open("schema.sql", encoding="utf-8") as f:
+            cur.execute(f"DROP SCHEMA IF EXISTS {test_schema} CASCADE; CREATE SCHEMA {test_schema}")
+            cur.execute(f.read())
+        raw.commit()
+        yield engine
+    finally:
+        with raw.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {test_schema} CASCADE")
+        raw.commit()
+        raw.close()
+        engine.dispose()
+
+
+def test_sqlite_next_due_triggers_match_postgresql(pg_engine):
+    expected = next_due_by_step(pg_engine)
+    assert expected[0][1] == (2, "2026-04-15")  # 10 000 km à 100 km/j, avant les 6 mois
+    assert sqlite_next_due() == expected
@@ -0,0 +1,113 @@
+# ===========================================
+# Mini-GMAO - Tests de l'import des CSV (import_csv.py, sans base)
+# ===========================================
+import shutil
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+import import_csv
+
+
+class FakeCursor:
+    def execute(self, *args):
+        pass
+
+    def fetchall(self):
+        return []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeConnection(FakeCursor):
+    def cursor(self):
+        return FakeCursor()
+
+
+class FakePool:
+    """Pool de connexions factice : les étapes d'import sont remplacées dans le test"""
+
+    def getconn(self):
+        return FakeConnection()
+
+    def putconn(self, conn):
+        pass
+
+
+@pytest.fixture
+def import_dir(tmp_path, monkeypatch):
+    for name in import_csv.STAGES:
+        shutil.copy(f"import/{name}", tmp_path / name)
+    monkeypatch.setattr(import_csv, "CSV_FOLDER", str(tmp_path))
+    return tmp_path
+
+
+def test_stages_are_in_dependency_order():
+    seen = set()
+    for file_name, (_, deps, _) in import_csv.STAGES.items():
+        assert set(deps) <= seen, file_name
+        seen.add(file_name)
+
+
+def test_read_import_file(import_dir):
+    checksum, df, hashes = import_csv.read_import_file("MATRICE.csv", dtype=str)
+    assert len(df) == len(hashes) > 0
+    assert hashes.is_unique
+    assert import_csv.read_import_file("MATRICE.csv", checksum) == (checksum, None, None)
+    assert import_csv.read_import_file("ABSENT.csv") is None
+
+    with open(import_dir / "MATRICE.csv", "ab") as f:
+        f.write(b"\n")
+    changed, df, _ = import_csv.read_import_file("MATRICE.csv", checksum, dtype=str)
+    assert changed != checksum
+    assert df is not None
+
+
+def read_result(parsed):
+    future = Future()
+    future.set_result((parsed, 0.0))
+    return future
+
+
+def test_unchanged_file_is_reread_when_a_prerequisite_changed(import_dir):
+    checksum, _, _ = import_csv.read_import_file("VIDANGE.csv")
+    skipped = read_result(("x", None, None))
+    parsed, _ = import_csv.read_stage("VIDANGE.csv", checksum, [skipped], {})
+    assert parsed == (checksum, None, None)
+
+    changed = read_result(("y", object(), object()))
+    parsed, _ = import_csv.read_stage("VIDANGE.csv", checksum, [skipped, changed], {})
+    assert parsed[1] is not None
+
+
+def test_import_all_waits_for_prerequisites(import_dir, monkeypatch):
+    events = []
+    lock = threading.Lock()
+
+    def stage(file_name):
+        def run(cur, parsed, incremental):
+            with lock:
+                events.append((file_name, "start"))
+            time.sleep(0.05)
+            with lock:
+                events.append((file_name, "end"))
+            return parsed[1] is not None
+        return run
+
+    stages = {name: (stage(name), deps, kwargs) for name, (_, deps, kwargs) in import_csv.STAGES.items()}
+    monkeypatch.setattr(import_csv, "STAGES", stages)
+    results = import_csv.import_all(FakePool(), workers=2)
+
+    assert list(results) == list(stages)
+    for file_name, (_, deps, _) in stages.items():
+        started = events.index((file_name, "start"))
+        assert all(events.index((dep, "end")) < started for dep in deps), file_name
+        changed, timings = results[file_name]
+        assert changed
+        assert set(timings) == {"lecture", "attente", "écriture"}
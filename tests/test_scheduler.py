@@ -0,0 +1,563 @@
+# ===========================================
+# Mini-GMAO - Tests du calendrier (maintenance_scheduler.py)
+# ===========================================
+import io
+import os
+import shutil
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from maintenance_scheduler import (COMPACT_COLUMNS, SCHEDULE_COLUMNS, VISIT_COLUMNS, MaintenanceScheduler,
+                                   create_complete_maintenance_schedule, load_maintenance_schedule,
+                                   NextDueIndex, ScheduleCache, ScheduleIndex, group_visits, iter_schedule_chunks,
+                                   iter_window_chunks, merge_same_day, sort_positions, stream_export,
+                                   with_assets)
+
+TYPE_NAMES = {'C': 'Contrôle', 'N': 'Nettoyage', 'CH': 'Changement'}
+
+
+@pytest.fixture(scope="module")
+def scheduler():
+    return MaintenanceScheduler()
+
+
+@pytest.fixture(scope="module")
+def matrice():
+    return pd.read_csv("import/MATRICE.csv", encoding='cp1252', sep=';')
+
+
+@pytest.fixture
+def csv_dir(tmp_path):
+    """Copie de MATRICE.csv et Param.csv, modifiable par le test"""
+    for name in ("MATRICE.csv", "Param.csv"):
+        shutil.copy(os.path.join("import", name), tmp_path / name)
+    return tmp_path
+
+
+@pytest.fixture
+def today(monkeypatch):
+    day = np.datetime64('2026-03-15', 'D')
+    monkeypatch.setattr(NextDueIndex, '_today', staticmethod(lambda: day))
+    return day
+
+
+def csv_cache(csv_dir, **options):
+    # Sans VIDANGE.csv : intervalles de Param.csv seulement, comme le fixture `scheduler`
+    options.setdefault("vidange_csv", None)
+    return ScheduleCache(str(csv_dir / "cache"), str(csv_dir / "MATRICE.csv"), str(csv_dir / "Param.csv"),
+                         **options)
+
+
+def keys(schedule):
+    """(matricule, date, opération, type, intervalle) de chaque ligne, triés"""
+    dates = pd.to_datetime(schedule['date']).dt.strftime('%Y-%m-%d')
+    return sorted(zip(schedule['matricule'], dates, schedule['opération'], schedule['type'],
+                      schedule['intervalle_jours'].astype(int)))
+
+
+def occurrences(rows):
+    """Calendrier à partir de tuples (matricule, date, opération, type, intervalle)"""
+    df = pd.DataFrame(rows, columns=['matricule', 'date', 'opération', 'type', 'intervalle_jours'])
+    df['date'] = pd.to_datetime(df['date']).astype('datetime64[s]')
+    return df.assign(engin='Engin ' + df['matricule'], catégorie='CAT',
+                     année=df['date'].dt.year.astype(np.int16),
+                     type_nom=df['type'].map(TYPE_NAMES),
+                     intervalle_jours=df['intervalle_jours'].astype(np.int16))[SCHEDULE_COLUMNS]
+
+
+def reference_schedule(scheduler, matrice_df, start_year, end_year):
+    """Calendrier calculé comme à l'origine : engin par engin, règle par règle, date par date"""
+    rows = []
+    for _, asset in matrice_df.iterrows():
+        categorie = str(asset.get('categorie', '')).strip().lower()
+        for rule in scheduler.rules:
+            excluded = any(key in categorie and any(ex.lower() in rule['operation'].lower() for ex in ops)
+                           for key, ops in scheduler.EXCLUSIONS.items())
+            if excluded:
+                continue
+            current = datetime(start_year, 1, 1)
+            while current <= datetime(end_year, 12, 31):
+                rows.append({'matricule': str(asset.get('matricule', '')).strip(), 'date': current,
+                             'opération': rule['operation'], 'type': rule['type'],
+                             'intervalle_jours': rule['interval_days']})
+                current += timedelta(days=rule['interval_days'])
+    return pd.DataFrame(rows)
+
+
+# ==================== Génération vectorisée ====================
+def test_generate_schedule_matches_per_asset_loop(scheduler, matrice):
+    assets = matrice.iloc[:30]
+    reference = reference_schedule(scheduler, assets, 2026, 2027)
+    schedule = scheduler.generate_schedule(assets, 2026, 2027, merge=False)
+    assert list(schedule.columns) == SCHEDULE_COLUMNS
+    assert keys(schedule) == keys(reference)
+    # Par défaut, les occurrences du même jour (engin, opération) sont fusionnées
+    merged = scheduler.generate_schedule(assets, 2026, 2027)
+    assert keys(merged) == keys(merge_same_day(reference))
+    assert len(merged) < len(schedule)
+
+
+def test_generate_schedule_without_assets(scheduler, matrice):
+    schedule = scheduler.generate_schedule(matrice.iloc[:0], 2026, 2026)
+    assert schedule.empty
+    assert list(schedule.columns) == SCHEDULE_COLUMNS
+
+
+# ==================== Matrice d'exclusion ====================
+def test_applicability_mask_matches_substring_rules(scheduler, matrice):
+    categories = matrice['categorie'].dropna().unique()
+    mask = scheduler.applicability_mask(categories)
+    for categorie, row in mask.iterrows():
+        for operation, applicable in row.items():
+            excluded = any(key in categorie and any(ex.lower() in operation.lower() for ex in ops)
+                           for key, ops in scheduler.EXCLUSIONS.items())
+            assert applicable == (not excluded), (categorie, operation)
+            assert scheduler._is_excluded(operation, categorie) == excluded
+
+
+def test_unmatched_categories(scheduler):
+    assert scheduler.unmatched_categories([' GEG 100 KVA ', 'Inconnue', 'inconnue ']) == ['Inconnue', 'inconnue']
+
+
+# ==================== Cache disque ====================
+def test_schedule_cache_generates_missing_years_only(csv_dir, monkeypatch):
+    cache = csv_cache(csv_dir)
+    generated = []
+    generate = cache._generate
+    monkeypatch.setattr(cache, '_generate', lambda digest, start, end, anchor:
+                        generated.append((start, end)) or generate(digest, start, end, anchor))
+
+    first = cache.load(2026, 2026)
+    both = cache.load(2026, 2027)
+    assert generated == [(2026, 2026), (2027, 2027)]
+    assert keys(both[both['année'] == 2026]) == keys(first)
+
+    again = cache.load(2026, 2027)
+    assert generated == [(2026, 2026), (2027, 2027)]
+    assert keys(again) == keys(both)
+
+
+def test_schedule_cache_matches_direct_generation(csv_dir, scheduler, matrice):
+    schedule = csv_cache(csv_dir).load(2026, 2027)
+    assert keys(schedule) == keys(scheduler.generate_schedule(matrice, 2026, 2027))
+
+
+def test_schedule_cache_merge_is_part_of_the_key(csv_dir, scheduler, matrice):
+    merged, unmerged = csv_cache(csv_dir), csv_cache(csv_dir, merge=False)
+    assert merged.digest() != unmerged.digest()
+    assert keys(unmerged.load(2026, 2026)) == keys(scheduler.generate_schedule(matrice, 2026, 2026, merge=False))
+    assert len(merged.load(2026, 2026)) < len(unmerged.load(2026, 2026))
+
+
+def test_schedule_cache_invalidated_when_csv_changes(csv_dir):
+    cache = csv_cache(csv_dir, max_versions=1)
+    digest = cache.digest()
+    before = cache.load(2026, 2026)
+
+    matrice = pd.read_csv(csv_dir / "MATRICE.csv", encoding='cp1252', sep=';')
+    matrice.iloc[:10].to_csv(csv_dir / "MATRICE.csv", encoding='cp1252', sep=';', index=False)
+    assert cache.digest() != digest
+    after = cache.load(2026, 2026)
+    assert set(after['matricule']) == set(matrice['matricule'].iloc[:10].astype(str).str.strip())
+    assert len(after) < len(before)
+    # Version périmée évincée
+    assert os.listdir(csv_dir / "cache") == [cache.digest()]
+
+
+def test_schedule_cache_evicts_least_recently_used_partitions(csv_dir):
+    cache = csv_cache(csv_dir, max_partitions=2)
+    for year in (2026, 2027, 2028):
+        cache.load(year, year, anchor_year=2026)
+    partitions = sorted(os.listdir(csv_dir / "cache" / cache.digest()))
+    assert partitions == ["2026_2027.parquet", "2026_2028.parquet"]
+
+
+def test_schedule_cache_without_writable_directory(csv_dir):
+    # Dossier de cache impossible à créer (un fichier occupe son parent)
+    (csv_dir / "data").write_text("")
+    cache = ScheduleCache(str(csv_dir / "data" / "cache"), str(csv_dir / "MATRICE.csv"),
+                          str(csv_dir / "Param.csv"), vidange_csv=None)
+    assert len(cache.load(2026, 2026)) == len(csv_cache(csv_dir).load(2026, 2026))
+
+
+# ==================== Fenêtres ====================
+def window(schedule, start, end):
+    dates = pd.to_datetime(schedule['date'])
+    return schedule[(dates >= start) & (dates <= end)]
+
+
+def test_occurrences_between_matches_filtered_generation(scheduler, matrice):
+    full = scheduler.generate_schedule(matrice, 2026, 2027, anchor_year=2026)
+    found = scheduler.occurrences_between('2026-11-15', '2027-02-10', anchor_year=2026, matrice_df=matrice)
+    assert keys(found) == keys(window(full, '2026-11-15', '2027-02-10'))
+
+
+def test_occurrences_between_filters(scheduler, matrice):
+    matricules = matrice['matricule'].astype(str).str.strip().iloc[:3].tolist()
+    full = scheduler.generate_schedule(matrice, 2026, 2026)
+    found = scheduler.occurrences_between('2026-03-01', '2026-03-31', matricules=matricules, types=['N'],
+                                          matrice_df=matrice)
+    expected = window(full, '2026-03-01', '2026-03-31')
+    expected = expected[expected['matricule'].isin(matricules) & (expected['type'] == 'N')]
+    assert len(found) > 0
+    assert keys(found) == keys(expected)
+
+
+def test_type_filter_applies_after_same_day_merge(matrice):
+    # Changement ajouté sur l'opération d'un contrôle : le contrôle du même jour disparaît
+    scheduler = MaintenanceScheduler()
+    control = next(rule for rule in scheduler.rules if rule['type'] == 'C')
+    scheduler.rules.append({**control, 'type': 'CH', 'type_name': 'Changement', 'interval_days': 30,
+                            'priority': scheduler.PRIORITY['CH']})
+    assets = matrice.iloc[:20]
+
+    def controls(merge):
+        full = scheduler.generate_schedule(assets, 2026, 2026, merge=merge)
+        found = scheduler.occurrences_between('2026-01-01', '2026-06-30', types=['C'], matrice_df=assets,
+                                              merge=merge)
+        expected = window(full, '2026-01-01', '2026-06-30')
+        assert keys(found) == keys(expected[expected['type'] == 'C'])
+        return found
+
+    # Sans fusion, le filtre porte sur les séries : aucun contrôle n'est absorbé
+    assert len(controls(merge=False)) > len(controls(merge=True))
+
+
+def test_occurrences_between_empty_window(scheduler):
+    assert scheduler.occurrences_between('2026-03-02', '2026-03-01').empty
+
+
+# ==================== Forme compacte ====================
+def test_compact_schedule_joins_back_to_full(scheduler, matrice):
+    full = scheduler.generate_schedule(matrice, 2026, 2026)
+    compact = scheduler.generate_schedule(matrice, 2026, 2026, compact=True)
+    assert list(compact.columns) == COMPACT_COLUMNS
+    assert compact.memory_usage(deep=True).sum() < full.memory_usage(deep=True).sum()
+
+    joined = with_assets(compact, scheduler.asset_table(matrice))
+    assert list(joined.columns) == SCHEDULE_COLUMNS
+    pd.testing.assert_frame_equal(joined.astype(str), full.astype(str))
+
+
+def test_schedule_cache_compact_load(csv_dir):
+    cache = csv_cache(csv_dir)
+    compact = cache.load(2026, 2026, compact=True)
+    assert list(compact.columns) == COMPACT_COLUMNS
+    pd.testing.assert_frame_equal(with_assets(compact, cache.assets()).astype(str),
+                                  cache.load(2026, 2026).astype(str))
+
+
+# ==================== Génération parallèle ====================
+@pytest.mark.parametrize("compact", [False, True])
+def test_parallel_generation_matches_serial(scheduler, matrice, compact):
+    serial = scheduler.generate_schedule(matrice, 2026, 2027, compact=compact)
+    parallel = scheduler.generate_schedule_parallel(matrice, 2026, 2027, compact=compact, workers=2,
+                                                    shard_size=50)
+    pd.testing.assert_frame_equal(parallel.astype(str), serial.astype(str))
+
+
+# ==================== sort_positions ====================
+def test_sort_positions_orders_categoricals_by_label():
+    df = pd.DataFrame({'engin': pd.Categorical(['Pelle', 'Camion', None, 'Bull'],
+                                               categories=['Pelle', 'Camion', 'Bull'])})
+    assert sort_positions(df, 'engin').tolist() == [3, 1, 0, 2]
+    assert sort_positions(df, 'engin', descending=True).tolist() == [0, 1, 3, 2]
+
+
+def test_sort_positions_is_stable():
+    df = pd.DataFrame({'intervalle_jours': [30, 7, 30, 7]})
+    assert sort_positions(df, 'intervalle_jours').tolist() == [1, 3, 0, 2]
+    assert sort_positions(df, 'intervalle_jours', descending=True).tolist() == [0, 2, 1, 3]
+
+
+# ==================== ScheduleIndex ====================
+def test_schedule_index_evicts_least_recently_requested_years(csv_dir):
+    index = ScheduleIndex(csv_cache(csv_dir), max_years=2)
+    for year in (2026, 2027, 2026, 2028):
+        index.query(f'{year}-01-01', f'{year}-01-31', limit=1)
+    assert list(index._frames) == [2026, 2028]
+
+    # Une requête plus longue que max_years garde toutes ses années
+    total, _ = index.query('2026-01-01', '2028-12-31', limit=1)
+    assert sorted(index._frames) == [2026, 2027, 2028]
+    # Chaque année est ancrée au 1er janvier, comme dans le dashboard
+    assert total == sum(len(csv_cache(csv_dir).load(year, year)) for year in (2026, 2027, 2028))
+
+
+# ==================== NextDueIndex ====================
+def test_next_due_query_sorted_by_date_then_series(csv_dir, today):
+    index = NextDueIndex(csv_cache(csv_dir))
+    total, page = index.query('2026-03-15', '2026-06-30')
+    assert total == len(page) > 0
+    assert (page['date'] >= pd.Timestamp('2026-03-15')).all()
+    assert (page['date'] <= pd.Timestamp('2026-06-30')).all()
+    keys = list(zip(page['date'], page['série']))
+    assert keys == sorted(keys)
+    assert set(page['statut']) <= {'planned', 'overdue'}
+
+
+def test_next_due_cursor_pages_cover_the_window(csv_dir, today):
+    index = NextDueIndex(csv_cache(csv_dir))
+    total, expected = index.query('2026-03-15', '2026-04-30')
+    pages, after = [], None
+    while True:
+        page_total, page = index.query('2026-03-15', '2026-04-30', after=after, limit=50)
+        assert page_total == total
+        if page.empty:
+            break
+        pages.append(page)
+        last = page.iloc[-1]
+        after = (last['date'], last['série'])
+    assert pd.concat(pages)['série'].tolist() == expected['série'].tolist()
+
+
+def test_next_due_merges_like_the_calendar(csv_dir, today):
+    def same_day_duplicates(page):
+        return page.duplicated(['matricule', 'opération', 'date']).sum()
+
+    _, merged = NextDueIndex(csv_cache(csv_dir)).query('2026-03-15', '2026-06-30')
+    _, unmerged = NextDueIndex(csv_cache(csv_dir, merge=False)).query('2026-03-15', '2026-06-30')
+    assert same_day_duplicates(merged) == 0
+    assert same_day_duplicates(unmerged) > 0
+    assert len(merged) == len(unmerged) - same_day_duplicates(unmerged)
+
+
+def test_next_due_filters(csv_dir, today):
+    index = NextDueIndex(csv_cache(csv_dir))
+    _, page = index.query('2026-03-15', '2026-12-31', types=['N'])
+    assert set(page['type']) == {'N'}
+    matricule = page['matricule'].iloc[0]
+    _, page = index.query('2026-03-15', '2026-12-31', matricule=matricule.upper())
+    assert page['matricule'].str.contains(matricule, case=False, regex=False).all()
+
+
+def test_next_due_mark_done_advances_only_matching_series(csv_dir, today):
+    index = NextDueIndex(csv_cache(csv_dir))
+    _, page = index.query('2026-03-15', '2026-12-31', types=['C'])
+    row = page.iloc[0]
+    before = index._state['due'].copy()
+
+    advanced = index.mark_done(row['matricule'], row['opération'], '2026-03-20', type='C')
+    assert advanced
+    for type_, every, due in advanced:
+        assert type_ == 'C'
+        assert due == (pd.Timestamp('2026-03-20') + pd.Timedelta(days=every)).date()
+
+    state = index._state
+    changed = np.flatnonzero(state['due'] != before)
+    assert {state['keys'][p][:3] for p in changed} == {(row['matricule'], row['opération'], 'C')}
+    size = len(state['keys'])
+    np.testing.assert_array_equal(state['sorted'], np.sort(state['due'] * size + np.arange(size)))
+
+
+def test_next_due_mark_done_unknown_series(csv_dir, today):
+    assert NextDueIndex(csv_cache(csv_dir)).mark_done('inconnu', 'Frein', '2026-03-20') == []
+
+
+# ==================== merge_same_day ====================
+def test_merge_same_day_keeps_highest_priority_type():
+    schedule = occurrences([
+        ('A', '2026-01-08', 'Frein', 'C', 7),
+        ('A', '2026-01-08', 'Frein', 'CH', 360),
+        ('A', '2026-01-08', 'Frein', 'N', 30),
+    ])
+    merged = merge_same_day(schedule)
+    assert merged[['type', 'intervalle_jours']].values.tolist() == [['CH', 360]]
+
+
+def test_merge_same_day_prefers_longest_interval_for_same_type():
+    schedule = occurrences([
+        ('A', '2026-01-31', 'Frein', 'C', 7),
+        ('A', '2026-01-31', 'Frein', 'C', 30),
+    ])
+    assert merge_same_day(schedule)['intervalle_jours'].tolist() == [30]
+
+
+def test_merge_same_day_only_merges_same_asset_operation_and_day():
+    schedule = occurrences([
+        ('A', '2026-01-08', 'Frein', 'C', 7),
+        ('A', '2026-01-09', 'Frein', 'C', 7),
+        ('A', '2026-01-08', 'Pneus', 'C', 7),
+        ('B', '2026-01-08', 'Frein', 'C', 7),
+    ])
+    merged = merge_same_day(schedule)
+    pd.testing.assert_frame_equal(merged, schedule)
+
+
+def test_merge_same_day_preserves_row_order():
+    schedule = occurrences([
+        ('B', '2026-01-02', 'Frein', 'C', 7),
+        ('A', '2026-01-08', 'Frein', 'C', 7),
+        ('A', '2026-01-01', 'Pneus', 'C', 7),
+        ('A', '2026-01-08', 'Frein', 'N', 30),
+    ])
+    merged = merge_same_day(schedule)
+    assert merged[['matricule', 'opération', 'type']].values.tolist() == [
+        ['B', 'Frein', 'C'], ['A', 'Pneus', 'C'], ['A', 'Frein', 'N']]
+
+
+def test_merge_same_day_empty():
+    empty = occurrences([])
+    assert merge_same_day(empty).empty
+
+
+# ==================== group_visits ====================
+def test_group_visits_one_row_per_asset_and_day():
+    schedule = occurrences([
+        ('A', '2026-01-08', 'Pneus', 'C', 7),
+        ('A', '2026-01-08', 'Frein', 'CH', 360),
+        ('B', '2026-01-08', 'Frein', 'C', 7),
+        ('A', '2026-01-01', 'Pneus', 'C', 7),
+    ])
+    visits = group_visits(schedule)
+    assert list(visits.columns) == VISIT_COLUMNS
+    assert visits[['matricule', 'type', 'opérations', 'nb_opérations']].values.tolist() == [
+        ['A', 'C', 'Pneus', 1],
+        ['A', 'CH', 'Frein, Pneus', 2],
+        ['B', 'C', 'Frein', 1],
+    ]
+    assert visits['date'].is_monotonic_increasing
+    assert visits['type_nom'].tolist() == ['Contrôle', 'Changement', 'Contrôle']
+
+
+def test_group_visits_empty():
+    visits = group_visits(occurrences([]))
+    assert visits.empty
+    assert list(visits.columns) == VISIT_COLUMNS
+
+
+# ==================== Échéances au compteur ====================
+OIL_CHANGE = "Vidanger le carter moteur"
+
+
+def add_usage_periods(csv_dir, operation, every_km, every_hours):
+    """Ajoute les colonnes every_km / every_hours à la copie de Param.csv"""
+    path = csv_dir / "Param.csv"
+    lines = path.read_bytes().decode('cp1252').splitlines()
+    lines = [lines[0] + ";every_km;every_hours"] + [
+        line + (f";{every_km};{every_hours}" if operation in line else ";;") for line in lines[1:]
+    ]
+    path.write_bytes(("\r\n".join(lines) + "\r\n").encode('cp1252'))
+    shutil.copy(os.path.join("import", "VIDANGE.csv"), csv_dir / "VIDANGE.csv")
+
+
+def usage_scheduler(csv_dir):
+    return MaintenanceScheduler(str(csv_dir / "Param.csv"), str(csv_dir / "MATRICE.csv"),
+                                str(csv_dir / "VIDANGE.csv"))
+
+
+def test_usage_periods_come_from_param_csv(csv_dir):
+    assert MaintenanceScheduler(vidange_csv="import/VIDANGE.csv").usage_periods == {}
+    add_usage_periods(csv_dir, OIL_CHANGE, 10000, "")
+    assert usage_scheduler(csv_dir).usage_periods == {OIL_CHANGE: {'km': 10000, 'h': None}}
+
+
+def test_usage_period_replaces_longer_param_interval(csv_dir, matrice):
+    add_usage_periods(csv_dir, OIL_CHANGE, 10000, 250)
+    scheduler = usage_scheduler(csv_dir)
+    due = scheduler.usage_due()
+    row = due.iloc[0]
+    param_interval = next(rule['interval_days'] for rule in scheduler.rules
+                          if rule['operation'] == row['opération'])
+    assert row['intervalle_jours'] < param_interval
+
+    assets = matrice[matrice['matricule'].str.strip() == row['matricule']]
+    schedule = scheduler.generate_schedule(assets, 2026, 2026)
+    series = schedule[schedule['opération'] == row['opération']]
+    assert (series['intervalle_jours'] == row['intervalle_jours']).all()
+    # Série ancrée sur le dernier relevé de l'engin
+    days = (series['date'] - row['dernier_relevé']).dt.days
+    assert (days % row['intervalle_jours'] == 0).all()
+
+
+def test_complete_schedule_matches_cached_schedule(csv_dir):
+    add_usage_periods(csv_dir, OIL_CHANGE, 10000, 250)
+    paths = [str(csv_dir / name) for name in ("MATRICE.csv", "Param.csv")]
+    direct = create_complete_maintenance_schedule(*paths, 2026, 2027, vidange_csv=str(csv_dir / "VIDANGE.csv"))
+    cached = load_maintenance_schedule(*paths, 2026, 2027, cache_dir=str(csv_dir / "cache"),
+                                       vidange_csv=str(csv_dir / "VIDANGE.csv"))
+    assert keys(direct) == keys(cached)
+    assert (direct['intervalle_jours'] < 90).any()
+
+
+def test_next_due_completion_survives_new_usage_rate(csv_dir, today):
+    add_usage_periods(csv_dir, OIL_CHANGE, 10000, 250)
+    index = NextDueIndex(ScheduleCache(str(csv_dir / "cache"), str(csv_dir / "MATRICE.csv"),
+                                       str(csv_dir / "Param.csv"), vidange_csv=str(csv_dir / "VIDANGE.csv")))
+    usage = index.cache.scheduler().usage_due().iloc[0]
+    index.mark_done(usage['matricule'], OIL_CHANGE, '2026-03-10', type='N')
+
+    # Nouveau relevé, au double du rythme : l'intervalle de la série change
+    days = (pd.Timestamp('2026-03-01') - usage['dernier_relevé']).days
+    reading = usage['dernière_valeur'] + 2 * usage['par_jour'] * days
+    with open(csv_dir / "VIDANGE.csv", "ab") as f:
+        f.write(f";;;;{usage['matricule']};01/03/2026;;{reading:.0f};;;;;;;;;;\r\n".encode('cp1252'))
+    _, page = index.query('2020-01-01', '2030-12-31', matricule=usage['matricule'], types=['N'])
+    series = page[page['opération'] == OIL_CHANGE].iloc[0]
+    assert series['intervalle_jours'] < usage['intervalle_jours']
+    assert series['date'] == pd.Timestamp('2026-03-10') + pd.Timedelta(days=int(series['intervalle_jours']))
+
+
+# ==================== Exports en flux ====================
+def test_iter_schedule_chunks_cover_the_years(csv_dir):
+    cache = csv_cache(csv_dir)
+    chunks = list(iter_schedule_chunks(cache, 2026, 2027, batch_size=50))
+    assert len(chunks) > 2
+    assert all(list(chunk.columns) == SCHEDULE_COLUMNS for chunk in chunks)
+    assert keys(pd.concat(chunks)) == keys(cache.load(2026, 2027))
+
+
+def test_iter_window_chunks_cover_the_window(scheduler):
+    chunks = list(iter_window_chunks(scheduler, '2026-05-01', '2026-06-15', batch_size=40))
+    assert len(chunks) > 2
+    assert keys(pd.concat(chunks)) == keys(scheduler.occurrences_between('2026-05-01', '2026-06-15'))
+
+
+def test_iter_window_chunks_compute_series_once(scheduler, monkeypatch):
+    calls = []
+    series = scheduler.series
+    monkeypatch.setattr(scheduler, 'series', lambda *args, **kwargs: calls.append(1) or series(*args, **kwargs))
+    for merge in (True, False):
+        chunks = list(iter_window_chunks(scheduler, '2026-05-01', '2026-06-15', types=['N'], batch_size=40,
+                                         merge=merge))
+        expected = scheduler.occurrences_between('2026-05-01', '2026-06-15', types=['N'], merge=merge)
+        assert keys(pd.concat(chunks)) == keys(expected)
+    assert len(calls) == 4  # un appel par export, un par calendrier de référence
+
+
+def test_stream_export_csv_writes_header_once(scheduler):
+    chunks = list(iter_window_chunks(scheduler, '2026-05-01', '2026-05-07', batch_size=40))
+    lines = b''.join(stream_export(chunks)).decode().splitlines()
+    assert lines[0] == ';'.join(SCHEDULE_COLUMNS)
+    assert len(lines) == sum(len(chunk) for chunk in chunks) + 1
+    assert {line.split(';')[3] for line in lines[1:]} <= {f'2026-05-0{day}' for day in range(1, 8)}
+
+
+def test_stream_export_csv_without_rows_writes_header():
+    text = b''.join(stream_export(iter([]))).decode()
+    assert text == ';'.join(SCHEDULE_COLUMNS) + '\n'
+
+
+def test_stream_export_parquet_concatenates_chunks(scheduler):
+    pq = pytest.importorskip('pyarrow.parquet')
+    chunks = list(iter_window_chunks(scheduler, '2026-05-01', '2026-05-07', batch_size=40))
+    table = pq.read_table(io.BytesIO(b''.join(stream_export(chunks, fmt='parquet'))))
+    assert table.column_names == SCHEDULE_COLUMNS
+    assert table.num_rows == sum(len(chunk) for chunk in chunks)
+    assert table.column('matricule').to_pylist() == pd.concat(chunks)['matricule'].astype(str).tolist()
+
+
+def test_stream_export_parquet_without_rows_is_valid():
+    pq = pytest.importorskip('pyarrow.parquet')
+    data = b''.join(stream_export(iter([]), fmt='parquet'))
+    table = pq.read_table(io.BytesIO(data))
+    assert table.num_rows == 0
+    assert table.column_names == SCHEDULE_COLUMNS
+
+
+def test_stream_export_unknown_format():
+    with pytest.raises(ValueError):
+        b''.join(stream_export(iter([]), fmt='xlsx'))
@@ -0,0 +1,81 @@
+# ===========================================
+# Mini-GMAO - Tests des index de recherche (search_index.py)
+# ===========================================
+import pandas as pd
+import pytest
+
+from search_index import FullTextIndex, MatriculeIndex, curatif_index, fold_text, tokenize
+
+
+def test_fold_text_and_tokenize():
+    assert fold_text("Défectueuse ŒIL") == "defectueuse oeil"
+    assert tokenize("Fuite d'huile, 2 filtres") == ["fuite", "huile", "2", "filtres"]
+
+
+# ==================== MatriculeIndex ====================
+@pytest.fixture
+def matricule_index():
+    return MatriculeIndex({
+        "MATRICE": pd.DataFrame({"matricule": ["041-01", "041-02", "102-07"]}),
+        "VIDANGE": pd.DataFrame({"matricule": ["102-07", None, " 041-01 ", "102-07"]}),
+        "Param": pd.DataFrame({"operation": ["Frein"]}),
+    })
+
+
+def test_matricule_index_substring(matricule_index):
+    hits = matricule_index.search("1-0")
+    assert hits["MATRICE"].tolist() == [0, 1]
+    assert hits["VIDANGE"].tolist() == [2]
+
+
+def test_matricule_index_prefix(matricule_index):
+    hits = matricule_index.search("102", prefix=True)
+    assert hits["MATRICE"].tolist() == [2]
+    assert hits["VIDANGE"].tolist() == [0, 3]
+    assert matricule_index.search("07", prefix=True) == {}
+
+
+def test_matricule_index_is_case_and_space_insensitive(matricule_index):
+    assert matricule_index.search("  041-01 ")["VIDANGE"].tolist() == [2]
+    assert matricule_index.search("") == {}
+    assert "Param" not in matricule_index.positions
+
+
+# ==================== FullTextIndex ====================
+@pytest.fixture
+def curatif():
+    return pd.DataFrame({
+        "panne_declatee": ["Fuite d'huile moteur", "Frein défectueux", "Fuite circuit hydraulique", None],
+        "pieces": ["Joint, filtre à huile", "Plaquettes", None, "Filtre à air"],
+    })
+
+
+def test_full_text_requires_every_word(curatif):
+    positions, _ = FullTextIndex(curatif, ["panne_declatee", "pieces"]).search("fuite huile")
+    assert positions.tolist() == [0]
+
+
+def test_full_text_prefix_and_accents(curatif):
+    index = FullTextIndex(curatif, ["panne_declatee", "pieces"])
+    assert index.search("DEFECT")[0].tolist() == [1]
+    assert sorted(index.search("filt")[0].tolist()) == [0, 3]
+
+
+def test_full_text_ranks_best_match_first(curatif):
+    positions, scores = FullTextIndex(curatif, ["panne_declatee", "pieces"]).search("huile")
+    assert positions.tolist() == [0]
+    positions, scores = FullTextIndex(curatif, ["panne_declatee", "pieces"]).search("fuite")
+    assert sorted(positions.tolist()) == [0, 2]
+    assert list(scores) == sorted(scores, reverse=True)
+
+
+def test_full_text_no_match_and_limit(curatif):
+    index = FullTextIndex(curatif, ["panne_declatee", "pieces", "absente"])
+    assert index.search("pneu")[0].size == 0
+    assert index.search("d'")[0].size == 0
+    assert len(index.search("fuite", limit=1)[0]) == 1
+
+
+def test_curatif_index_missing_file(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        curatif_index(str(tmp_path / "SUIVI_CURATIF.csv"))
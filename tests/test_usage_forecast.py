@@ -0,0 +1,87 @@
+# ===========================================
+# Mini-GMAO - Tests de la prévision d'usage (usage_forecast.py)
+# ===========================================
+import numpy as np
+import pandas as pd
+
+from usage_forecast import FORECAST_COLUMNS, forecast_fleet, parse_counter, project_due
+
+
+def vidange(rows):
+    return pd.DataFrame(rows, columns=["matricule", "date_entretien", "compteur_km_h"])
+
+
+def test_parse_counter():
+    values = parse_counter(pd.Series(["8147,6", "309 709", "", None, "n/a"]))
+    assert values.iloc[:2].tolist() == [8147.6, 309709.0]
+    assert values.iloc[2:].isna().all()
+
+
+def test_forecast_fleet_fits_daily_rate():
+    forecast = forecast_fleet(vidange([
+        ("A", "01/01/2025", "10000"),
+        ("A", "31/01/2025", "13000"),
+        ("A", "02/03/2025", "16000"),
+    ]))
+    assert list(forecast.columns) == FORECAST_COLUMNS
+    row = forecast.iloc[0]
+    assert row["matricule"] == "A"
+    assert row["unité"] == "km"
+    assert row["relevés"] == 3
+    assert np.isclose(row["par_jour"], 100.0)
+    assert row["dernier_relevé"] == pd.Timestamp("2025-03-02")
+
+
+def test_forecast_fleet_drops_readings_above_a_later_one():
+    # Compteur remplacé en mars : l'historique d'avant est écarté
+    forecast = forecast_fleet(vidange([
+        ("A", "01/01/2025", "90000"),
+        ("A", "01/03/2025", "1000"),
+        ("A", "31/03/2025", "1600"),
+    ]))
+    assert forecast["relevés"].tolist() == [2]
+    assert np.isclose(forecast["par_jour"].iloc[0], 20.0)
+
+
+def test_forecast_fleet_hour_meter_and_omitted_assets():
+    forecast = forecast_fleet(vidange([
+        ("E", "01/01/2025", "1000"),
+        ("E", "31/01/2025", "1240"),
+        ("F", "01/01/2025", "500"),                               # un seul relevé
+        ("G", "01/01/2025", "700"), ("G", "10/01/2025", "800"),  # moins de 30 jours
+    ]), asset_types={"E": "ENGIN DE CHANTIER"})
+    assert forecast["matricule"].tolist() == ["E"]
+    assert forecast["unité"].tolist() == ["h"]
+    assert np.isclose(forecast["par_jour"].iloc[0], 8.0)
+
+
+def test_project_due_converts_period_to_days():
+    forecast = pd.DataFrame({
+        "matricule": ["A", "E", "R"],
+        "unité": ["km", "h", "km"],
+        "par_jour": [100.0, 8.0, 1e6],
+        "relevés": [3, 2, 2],
+        "dernier_relevé": pd.to_datetime(["2025-03-02", "2025-01-31", "2025-01-01"]),
+        "dernière_valeur": [16000.0, 1240.0, 5e6],
+    })
+    due = project_due(forecast, every_km=10000, every_hours=250)
+    # 10 000 km à 100 km/j, 250 h à 8 h/j (31,25 → 32 j), au moins un jour
+    assert due["intervalle_jours"].tolist() == [100, 32, 1]
+    assert due["échéance"].tolist() == [pd.Timestamp("2025-06-10"), pd.Timestamp("2025-03-04"),
+                                        pd.Timestamp("2025-01-02")]
+
+
+def test_project_due_empty_forecast():
+    due = project_due(pd.DataFrame(columns=FORECAST_COLUMNS), every_km=10000, every_hours=250)
+    assert due.empty
+    assert {"intervalle_jours", "échéance"} <= set(due.columns)
+
+
+def test_project_due_without_period_for_a_unit():
+    forecast = pd.DataFrame({
+        "matricule": ["A", "E"], "unité": ["km", "h"], "par_jour": [100.0, 8.0], "relevés": [3, 2],
+        "dernier_relevé": pd.to_datetime(["2025-03-02", "2025-01-31"]), "dernière_valeur": [16000.0, 1240.0],
+    })
+    due = project_due(forecast, every_km=10000)
+    assert due["matricule"].tolist() == ["A"]
+    assert due["intervalle_jours"].tolist() == [100]
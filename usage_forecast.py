@@ -0,0 +1,106 @@
+# ===========================================
+# Mini-GMAO - Prévision d'usage (km / heures) à partir des relevés VIDANGE
+# ===========================================
+import numpy as np
+import pandas as pd
+
+# Au moins deux relevés retenus, couvrant au moins cette durée, pour estimer un rythme
+MIN_READINGS = 2
+MIN_SPAN_DAYS = 30
+# Compteur horaire : valeur plausible pour des heures, sur un engin (comme import_vidange)
+MAX_HOURS = 50000
+
+FORECAST_COLUMNS = ['matricule', 'unité', 'par_jour', 'relevés', 'dernier_relevé', 'dernière_valeur']
+
+
+def parse_counter(values):
+    """Relevés de compteur en nombre : la virgule est décimale (« 8147,6 » heures)"""
+    cleaned = values.fillna('').astype(str).str.replace(' ', '').str.replace(',', '.')
+    return pd.to_numeric(cleaned, errors='coerce')
+
+
+def is_hour_meter(values, asset_types):
+    """Vrai pour un compteur horaire : petite valeur sur un engin"""
+    engin = pd.Series(asset_types).fillna('').astype(str).str.lower().str.contains('engin').to_numpy()
+    return (np.asarray(values, dtype=float) < MAX_HOURS) & engin
+
+
+def counter_readings(vidange_df):
+    """Relevés exploitables (matricule, date, valeur), triés par engin puis date.
+
+    Un relevé est écarté s'il dépasse un relevé plus récent du même engin :
+    saisie erronée, ou compteur remplacé (tout l'historique d'avant tombe).
+    """
+    readings = pd.DataFrame({
+        'matricule': vidange_df['matricule'].fillna('').astype(str).str.strip(),
+        'date': pd.to_datetime(vidange_df['date_entretien'], dayfirst=True, errors='coerce'),
+        'valeur': parse_counter(vidange_df['compteur_km_h']),
+    })
+    readings = readings[(readings['matricule'] != '') & readings['date'].notna()
+                        & (readings['valeur'] > 0)]
+    readings = readings.sort_values(['matricule', 'date'], kind='stable').reset_index(drop=True)
+
+    # Plus petit relevé à venir, par engin (cumul minimum en partant de la fin)
+    later_min = readings[::-1].groupby('matricule', sort=False)['valeur'].cummin()[::-1]
+    return readings[readings['valeur'] <= later_min].reset_index(drop=True)
+
+
+def fit_usage_rates(readings, asset_types=None):
+    """Rythme d'usage de chaque engin, en une passe sur tout le parc.
+
+    Pente des moindres carrés valeur ~ jour, calculée par sommes groupées
+    (n, Σx, Σy, Σxy, Σx²). `asset_types` (matricule → type d'engin) sert à
+    distinguer compteur horaire et kilométrique ; les engins sans rythme
+    positif sur assez d'historique sont omis.
+    """
+    days = (readings['date'] - pd.Timestamp('2000-01-01')).dt.days.to_numpy(dtype=float)
+    groups = readings['matricule']
+    # Centré par engin pour la précision numérique
+    x = days - pd.Series(days).groupby(groups.to_numpy()).transform('mean').to_numpy()
+    y = readings['valeur'].to_numpy(dtype=float)
+    sums = pd.DataFrame({'n': 1, 'x': x, 'y': y, 'xy': x * y, 'xx': x * x,
+                         'jour': days, 'matricule': groups}).groupby('matricule', sort=True)
+    totals = sums[['n', 'x', 'y', 'xy', 'xx']].sum()
+    span = sums['jour'].max() - sums['jour'].min()
+
+    denominator = totals['n'] * totals['xx'] - totals['x'] ** 2
+    slope = (totals['n'] * totals['xy'] - totals['x'] * totals['y']) / denominator.where(denominator > 0)
+    last = readings.groupby('matricule', sort=True).last()
+
+    forecast = pd.DataFrame({
+        'matricule': totals.index,
+        'par_jour': slope.to_numpy(),
+        'relevés': totals['n'].to_numpy(dtype=int),
+        'dernier_relevé': last['date'].to_numpy(),
+        'dernière_valeur': last['valeur'].to_numpy(),
+    })
+    keep = ((forecast['relevés'] >= MIN_READINGS) & (span.to_numpy() >= MIN_SPAN_DAYS)
+            & (forecast['par_jour'] > 0))
+    forecast = forecast[keep.to_numpy()].reset_index(drop=True)
+
+    types = forecast['matricule'].map(asset_types or {})
+    forecast['unité'] = np.where(is_hour_meter(forecast['dernière_valeur'], types), 'h', 'km')
+    return forecast[FORECAST_COLUMNS]
+
+
+def forecast_fleet(vidange_df, asset_types=None):
+    """Rythmes d'usage de tout le parc depuis l'historique complet de VIDANGE.csv"""
+    return fit_usage_rates(counter_readings(vidange_df), asset_types)
+
+
+def project_due(forecast, every_km=None, every_hours=None):
+    """Entretien tous les `every_km` km ou `every_hours` heures, projeté au rythme de chaque engin.
+
+    Ajoute `intervalle_jours` (la période convertie en jours, arrondie au
+    jour supérieur) et `échéance` (dernier relevé + intervalle). Les engins
+    dont l'unité n'a pas de période (None) sont omis.
+    """
+    period = np.where(forecast['unité'] == 'h',
+                      np.nan if every_hours is None else every_hours,
+                      np.nan if every_km is None else every_km).astype(float)
+    forecast = forecast[~np.isnan(period)]
+    period = period[~np.isnan(period)]
+    days = np.maximum(np.ceil(period / forecast['par_jour'].to_numpy(dtype=float)), 1)
+    days = days.astype(np.int64)
+    due = pd.to_datetime(forecast['dernier_relevé']) + pd.to_timedelta(days, unit='D')
+    return forecast.assign(intervalle_jours=days, échéance=due)